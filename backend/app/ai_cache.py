@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+
+from app.metrics import metrics
+
+
+# Scored candidate moves, best first: (uci, centipawns).
+Candidates = list[tuple[str, int]]
+CacheKey = tuple[str, str]
+
+cache_lookups_total = metrics.counter("ai_cache_lookups_total", "AI position cache lookups by tier and result")
+
+
+def _entry_size(key: CacheKey, candidates: Candidates) -> int:
+    size = sys.getsizeof(key) + sum(sys.getsizeof(part) for part in key) + sys.getsizeof(candidates)
+    for uci, score in candidates:
+        size += sys.getsizeof((uci, score)) + sys.getsizeof(uci) + sys.getsizeof(score)
+    return size
+
+
+class PositionCache:
+    """
+    Process-wide LRU of analysed positions shared by every AI game.
+
+    Keys are (FEN without move counters, level) and values the scored
+    candidate moves, so the random blunder can still be applied on top of a
+    hit. An optional SQLite file behind the memory tier is shared by every
+    server process on the host and survives restarts. Entries expire after
+    ttl_seconds, and entries written by another ENGINE_VERSION are ignored.
+    The memory tier is only touched on the event loop; SQLite reads and
+    writes run on one disk thread, so a lookup never blocks the loop and a
+    put never waits for the write.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, engine_version: int, disk_path: str = "") -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.engine_version = engine_version
+        # key -> (stored_at, candidates, approximate bytes)
+        self._entries: OrderedDict[CacheKey, tuple[float, Candidates, int]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._disk: sqlite3.Connection | None = None
+        self._disk_thread: ThreadPoolExecutor | None = None
+        if disk_path:
+            self._disk_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai-cache-disk")
+            self._disk = sqlite3.connect(disk_path, timeout=0.1, isolation_level=None, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute("PRAGMA synchronous=OFF")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS ai_positions ("
+                "epd TEXT NOT NULL, level TEXT NOT NULL, engine_version INTEGER NOT NULL, "
+                "stored_at REAL NOT NULL, candidates TEXT NOT NULL, PRIMARY KEY (epd, level))"
+            )
+
+    @staticmethod
+    def key(board: chess.Board, level: str) -> CacheKey:
+        return board.epd(), level
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._bytes
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def get(self, key: CacheKey) -> Candidates | None:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                cache_lookups_total.inc(tier="memory", result="hit")
+                return entry[1]
+            self._remove(key)
+
+        candidates = None
+        if self._disk is not None:
+            row = await asyncio.get_running_loop().run_in_executor(self._disk_thread, self._disk_get, key)
+            if row is not None and row[0] == self.engine_version and now - row[1] <= self.ttl_seconds:
+                candidates = [(uci, score) for uci, score in json.loads(row[2])]
+                self._store(key, candidates, row[1])
+        if candidates is not None:
+            self.hits += 1
+            cache_lookups_total.inc(tier="disk", result="hit")
+            return candidates
+
+        self.misses += 1
+        cache_lookups_total.inc(tier="memory" if self._disk is None else "disk", result="miss")
+        return None
+
+    def put(self, key: CacheKey, candidates: Candidates, stored_at: float | None = None) -> None:
+        stored_at = time.time() if stored_at is None else stored_at
+        self._store(key, candidates, stored_at)
+        if self._disk is not None:
+            self._disk_thread.submit(self._disk_put, key, candidates, stored_at)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def close(self) -> None:
+        if self._disk is not None:
+            # Let queued writes finish before the connection goes away.
+            self._disk_thread.shutdown(wait=True)
+            self._disk.close()
+            self._disk = None
+            self._disk_thread = None
+
+    def _store(self, key: CacheKey, candidates: Candidates, stored_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        while len(self._entries) >= self.max_entries:
+            self._remove(next(iter(self._entries)))
+        size = _entry_size(key, candidates)
+        self._entries[key] = (stored_at, candidates, size)
+        self._bytes += size
+
+    def _remove(self, key: CacheKey) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _disk_get(self, key: CacheKey) -> tuple[int, float, str] | None:
+        try:
+            return self._disk.execute(
+                "SELECT engine_version, stored_at, candidates FROM ai_positions WHERE epd = ? AND level = ?",
+                key,
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+
+    def _disk_put(self, key: CacheKey, candidates: Candidates, stored_at: float) -> None:
+        try:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO ai_positions VALUES (?, ?, ?, ?, ?)",
+                (key[0], key[1], self.engine_version, stored_at, json.dumps(candidates)),
+            )
+        except sqlite3.Error:
+            pass
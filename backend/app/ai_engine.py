@@ -1,8 +1,13 @@
 from __future__ import annotations
 
 import random
+import time
+from typing import Callable
 
 import chess
+import chess.polyglot
+
+from app.ai_lookup import LookupConfig, PositionLookup
 
 
 PIECE_VALUES = {
@@ -14,84 +19,489 @@ PIECE_VALUES = {
     chess.KING: 0,
 }
 
+# Piece-square tables from White's point of view, indexed by square (a1 = 0, h8 = 63).
+# Black uses the vertically mirrored square (square ^ 56).
+PIECE_SQUARE_TABLES = {
+    chess.PAWN: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ),
+    chess.KNIGHT: (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ),
+    chess.BISHOP: (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ),
+    chess.ROOK: (
+        0, 0, 0, 5, 5, 0, 0, 0,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ),
+    chess.QUEEN: (
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ),
+    chess.KING: (
+        20, 30, 10, 0, 0, 10, 30, 20,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+    ),
+}
+# Centipawns per square attacked by knights, bishops, rooks and queens (pseudo-mobility).
+MOBILITY_WEIGHT = 2
+_MOBILITY_PIECES = (chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN)
+
+MATE_SCORE = 100000
+INFINITY = 10**9
+MAX_PLY = 128
+# Depth cap for levels that are bounded by their time budget instead.
+MAX_SEARCH_DEPTH = 32
+# level -> (max depth, blunder rate, default time limit in seconds).
+AI_LEVEL_PARAMS = {
+    "easy": (1, 0.25, 0.3),
+    "medium": (2, 0.10, 1.0),
+    "hard": (MAX_SEARCH_DEPTH, 0.02, 3.0),
+}
+# Bump whenever search or evaluation changes what the engine plays; cached results of older versions are dropped.
+ENGINE_VERSION = 3
+
+# Move ordering tiers: hash move, then captures (MVV-LVA), then killers, then history.
+_ORDER_TT_MOVE = 10_000_000
+_ORDER_CAPTURE = 1_000_000
+_ORDER_KILLER = 900_000
+
+
+class SearchAborted(Exception):
+    """Raised inside the search when the time budget runs out or the game is cancelled."""
+
+
+class TranspositionTable:
+    """
+    Zobrist-keyed search cache with a hard entry cap.
+
+    When full, the oldest stored entry is evicted (dicts keep insertion
+    order, so this is O(1)). Re-storing a key moves it to the back.
+    """
+
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    def __init__(self, max_entries: int = 200_000) -> None:
+        self.max_entries = max_entries
+        self._entries: dict[int, tuple[int, int, int, chess.Move | None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: int) -> tuple[int, int, int, chess.Move | None] | None:
+        return self._entries.get(key)
+
+    def store(self, key: int, depth: int, score: int, flag: int, move: chess.Move | None) -> None:
+        entries = self._entries
+        if key in entries:
+            del entries[key]
+        elif len(entries) >= self.max_entries:
+            del entries[next(iter(entries))]
+        entries[key] = (depth, score, flag, move)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
 
 class ChessAI:
-    def __init__(self, depth: int, blunder_rate: float) -> None:
+    """
+    Iterative-deepening negamax with alpha-beta, a transposition table,
+    MVV-LVA / killer / history move ordering and a capture-only quiescence
+    search. Each iteration deepens by one ply until `depth` is reached or
+    the time budget runs out; the move from the last completed iteration
+    is played.
+    """
+
+    # Nodes between checks of the deadline and the cancel callback.
+    STOP_CHECK_INTERVAL = 512
+
+    def __init__(
+        self,
+        depth: int,
+        blunder_rate: float,
+        time_limit: float | None = None,
+        tt_entries: int = 200_000,
+        lookup: PositionLookup | None = None,
+    ) -> None:
         self.depth = depth
         self.blunder_rate = blunder_rate
+        self.time_limit = time_limit
+        self.lookup = lookup
+        # "book", "endgame" or "search": where the last choose_move answer came from.
+        self.last_source = "search"
+        self.tt = TranspositionTable(tt_entries)
+        self.nodes = 0
+        # (depth, seconds since search start) for every completed iteration of the last search.
+        self.completed_depths: list[tuple[int, float]] = []
+        # Whether the last search ran to its target depth (or a forced mate) instead of being cut short.
+        self.search_complete = False
+        # Root moves of the last completed iteration with their scores, best first.
+        # Only the best score is exact; the others are upper bounds from alpha-beta.
+        self.root_scores: list[tuple[chess.Move, int]] = []
+        self._iteration_scores: list[tuple[chess.Move, int]] = []
+        self._deadline: float | None = None
+        self._should_stop: Callable[[], bool] | None = None
+        self._killers: list[list[chess.Move | None]] = []
+        self._history: dict[tuple[bool, int, int], int] = {}
+        # Material + piece-square score of the searched position, White's point of view,
+        # kept up to date by _push/_pop instead of being recounted at every leaf.
+        self._material_score = 0
+
+    def choose_move(
+        self,
+        board: chess.Board,
+        time_limit: float | None = None,
+        should_stop: Callable[[], bool] | None = None,
+    ) -> chess.Move | None:
+        """
+        Pick a move for the side to move.
 
-    def choose_move(self, board: chess.Board) -> chess.Move | None:
+        time_limit (seconds, defaulting to the engine's own) and should_stop
+        end the search early; the best move of the deepest completed
+        iteration is returned. Book and endgame-table hits skip the search.
+        """
         legal_moves = list(board.legal_moves)
         if not legal_moves:
             return None
 
+        move = self._probe_lookup(board)
+        if move is not None:
+            return move
+
         # Keep AI imperfect: occasionally choose a random legal move.
         if random.random() < self.blunder_rate:
             return random.choice(legal_moves)
 
-        maximizing = board.turn == chess.WHITE
-        best_score = float("-inf") if maximizing else float("inf")
-        best_move: chess.Move | None = None
+        return self.search(board, time_limit, should_stop) or legal_moves[0]
 
-        for move in legal_moves:
-            board.push(move)
-            score = self._minimax(board, self.depth - 1, float("-inf"), float("inf"), not maximizing)
-            board.pop()
+    def analyse(
+        self,
+        board: chess.Board,
+        time_limit: float | None = None,
+        should_stop: Callable[[], bool] | None = None,
+        on_depth: Callable[[chess.Move], None] | None = None,
+    ) -> list[tuple[chess.Move, int]]:
+        """
+        Scored candidate moves for the side to move, best first, without the
+        random blunder (callers that cache the result apply it themselves).
+        A book or endgame-table hit yields a single candidate scored 0.
+        on_depth is passed to search().
+        """
+        legal_moves = list(board.legal_moves)
+        if not legal_moves:
+            return []
 
-            if maximizing and score > best_score:
-                best_score = score
-                best_move = move
-            if not maximizing and score < best_score:
-                best_score = score
-                best_move = move
+        move = self._probe_lookup(board)
+        if move is not None:
+            return [(move, 0)]
 
-        return best_move
+        if self.search(board, time_limit, should_stop, on_depth) is None:
+            return [(legal_moves[0], 0)]
+        return self.root_scores
+
+    def _probe_lookup(self, board: chess.Board) -> chess.Move | None:
+        self.last_source = "search"
+        if self.lookup is None:
+            return None
+        move, source = self.lookup.probe(board)
+        if move is not None:
+            self.last_source = source
+        return move
+
+    def search(
+        self,
+        board: chess.Board,
+        time_limit: float | None = None,
+        should_stop: Callable[[], bool] | None = None,
+        on_depth: Callable[[chess.Move], None] | None = None,
+    ) -> chess.Move | None:
+        """Iterative deepening; on_depth gets the best move of each completed iteration."""
+        started = time.monotonic()
+        time_limit = time_limit if time_limit is not None else self.time_limit
+        self._deadline = started + time_limit if time_limit is not None else None
+        self._should_stop = should_stop
+        self._killers = [[None, None] for _ in range(MAX_PLY)]
+        self._history = {}
+        self.nodes = 0
+        self.completed_depths = []
+        self.root_scores = []
+        self.search_complete = False
+        self._material_score = material_and_position(board)
 
-    def _minimax(self, board: chess.Board, depth: int, alpha: float, beta: float, maximizing: bool) -> float:
-        if depth == 0 or board.is_game_over(claim_draw=True):
-            return self._evaluate(board)
-
-        if maximizing:
-            value = float("-inf")
-            for move in board.legal_moves:
-                board.push(move)
-                value = max(value, self._minimax(board, depth - 1, alpha, beta, False))
-                board.pop()
-                alpha = max(alpha, value)
-                if beta <= alpha:
-                    break
-            return value
-
-        value = float("inf")
-        for move in board.legal_moves:
-            board.push(move)
-            value = min(value, self._minimax(board, depth - 1, alpha, beta, True))
-            board.pop()
-            beta = min(beta, value)
-            if beta <= alpha:
+        best_move: chess.Move | None = None
+        for depth in range(1, self.depth + 1):
+            try:
+                score, move = self._search_root(board, depth)
+            except SearchAborted:
+                return best_move
+            best_move = move
+            self.root_scores = sorted(self._iteration_scores, key=lambda item: item[1], reverse=True)
+            if on_depth is not None and move is not None:
+                on_depth(move)
+            self.completed_depths.append((depth, time.monotonic() - started))
+            if abs(score) >= MATE_SCORE - MAX_PLY:
                 break
-        return value
+        self.search_complete = True
+        return best_move
+
+    def _check_stop(self) -> None:
+        self.nodes += 1
+        if self.nodes % self.STOP_CHECK_INTERVAL:
+            return
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            raise SearchAborted()
+        if self._should_stop is not None and self._should_stop():
+            raise SearchAborted()
 
-    def _evaluate(self, board: chess.Board) -> float:
-        if board.is_checkmate():
-            return -99999 if board.turn == chess.WHITE else 99999
-        if board.is_stalemate() or board.is_insufficient_material() or board.can_claim_draw():
+    def _search_root(self, board: chess.Board, depth: int) -> tuple[int, chess.Move | None]:
+        key = chess.polyglot.zobrist_hash(board)
+        entry = self.tt.get(key)
+        tt_move = entry[3] if entry else None
+
+        alpha, beta = -INFINITY, INFINITY
+        best_score, best_move = -INFINITY, None
+        self._iteration_scores = []
+        for move in self._ordered_moves(board, list(board.legal_moves), tt_move, 0):
+            delta = self._push(board, move)
+            try:
+                score = -self._negamax(board, depth - 1, -beta, -alpha, 1)
+            finally:
+                self._pop(board, delta)
+            self._iteration_scores.append((move, score))
+            if score > best_score:
+                best_score, best_move = score, move
+            alpha = max(alpha, score)
+
+        self.tt.store(key, depth, best_score, TranspositionTable.EXACT, best_move)
+        return best_score, best_move
+
+    def _negamax(self, board: chess.Board, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self._check_stop()
+        if board.halfmove_clock >= 100 or board.is_insufficient_material() or board.is_repetition(2):
             return 0
 
-        score = 0
-        for piece_type, value in PIECE_VALUES.items():
-            score += len(board.pieces(piece_type, chess.WHITE)) * value
-            score -= len(board.pieces(piece_type, chess.BLACK)) * value
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return self._quiescence(board, alpha, beta, ply)
+
+        alpha_orig = alpha
+        key = chess.polyglot.zobrist_hash(board)
+        entry = self.tt.get(key)
+        tt_move = None
+        if entry is not None:
+            entry_depth, entry_score, entry_flag, tt_move = entry
+            if entry_depth >= depth:
+                if entry_flag == TranspositionTable.EXACT:
+                    return entry_score
+                if entry_flag == TranspositionTable.LOWER:
+                    alpha = max(alpha, entry_score)
+                elif entry_flag == TranspositionTable.UPPER:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+
+        legal_moves = list(board.legal_moves)
+        if not legal_moves:
+            return -MATE_SCORE + ply if board.is_check() else 0
+
+        best_score, best_move = -INFINITY, None
+        for move in self._ordered_moves(board, legal_moves, tt_move, ply):
+            is_capture = board.is_capture(move)
+            delta = self._push(board, move)
+            try:
+                score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                self._pop(board, delta)
+
+            if score > best_score:
+                best_score, best_move = score, move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                if not is_capture:
+                    self._remember_quiet_cutoff(board, move, depth, ply)
+                break
+
+        if best_score <= alpha_orig:
+            flag = TranspositionTable.UPPER
+        elif best_score >= beta:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+        self.tt.store(key, depth, best_score, flag, best_move)
+        return best_score
+
+    def _quiescence(self, board: chess.Board, alpha: int, beta: int, ply: int) -> int:
+        self._check_stop()
+        stand_pat = self._evaluate_relative(board)
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        captures = list(board.generate_legal_captures())
+        for move in self._ordered_moves(board, captures, None, ply):
+            delta = self._push(board, move)
+            try:
+                score = -self._quiescence(board, -beta, -alpha, ply + 1)
+            finally:
+                self._pop(board, delta)
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def _ordered_moves(
+        self,
+        board: chess.Board,
+        moves: list[chess.Move],
+        tt_move: chess.Move | None,
+        ply: int,
+    ) -> list[chess.Move]:
+        killers = self._killers[ply] if ply < MAX_PLY else (None, None)
+        turn = board.turn
+
+        def order_key(move: chess.Move) -> int:
+            if move == tt_move:
+                return _ORDER_TT_MOVE
+            if board.is_capture(move):
+                victim = board.piece_type_at(move.to_square) or chess.PAWN  # en passant
+                attacker = board.piece_type_at(move.from_square) or chess.PAWN
+                return _ORDER_CAPTURE + victim * 10 - attacker
+            if move.promotion:
+                return _ORDER_CAPTURE + move.promotion * 10
+            if move == killers[0]:
+                return _ORDER_KILLER
+            if move == killers[1]:
+                return _ORDER_KILLER - 1
+            return self._history.get((turn, move.from_square, move.to_square), 0)
+
+        return sorted(moves, key=order_key, reverse=True)
+
+    def _remember_quiet_cutoff(self, board: chess.Board, move: chess.Move, depth: int, ply: int) -> None:
+        killers = self._killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        history_key = (board.turn, move.from_square, move.to_square)
+        self._history[history_key] = min(self._history.get(history_key, 0) + depth * depth, _ORDER_KILLER - 2)
+
+    def _push(self, board: chess.Board, move: chess.Move) -> int:
+        delta = material_delta(board, move)
+        self._material_score += delta
+        board.push(move)
+        return delta
+
+    def _pop(self, board: chess.Board, delta: int) -> None:
+        board.pop()
+        self._material_score -= delta
+
+    def _evaluate_relative(self, board: chess.Board) -> int:
+        score = self._material_score + mobility(board)
+        return score if board.turn == chess.WHITE else -score
+
+    def _evaluate(self, board: chess.Board) -> int:
+        """Static evaluation from White's point of view, recomputed from scratch."""
+        return material_and_position(board) + mobility(board)
+
+
+def _square_value(piece_type: chess.PieceType, color: chess.Color, square: chess.Square) -> int:
+    table_square = square if color == chess.WHITE else square ^ 56
+    return PIECE_VALUES[piece_type] + PIECE_SQUARE_TABLES[piece_type][table_square]
+
+
+def material_and_position(board: chess.Board) -> int:
+    """Material plus piece-square score from White's point of view."""
+    score = 0
+    for square, piece in board.piece_map().items():
+        value = _square_value(piece.piece_type, piece.color, square)
+        score += value if piece.color == chess.WHITE else -value
+    return score
+
+
+def material_delta(board: chess.Board, move: chess.Move) -> int:
+    """Change of material_and_position(board) caused by move, computed before it is pushed."""
+    mover = board.piece_at(move.from_square)
+    if mover is None:
+        # Null move.
+        return 0
+    color = mover.color
+    placed_type = move.promotion or mover.piece_type
+    delta = _square_value(placed_type, color, move.to_square) - _square_value(mover.piece_type, color, move.from_square)
+
+    if board.is_en_passant(move):
+        captured_square = move.to_square - 8 if color == chess.WHITE else move.to_square + 8
+        delta += _square_value(chess.PAWN, not color, captured_square)
+    else:
+        captured_type = board.piece_type_at(move.to_square)
+        if captured_type is not None:
+            delta += _square_value(captured_type, not color, move.to_square)
+
+    if mover.piece_type == chess.KING and board.is_castling(move):
+        rank = 0 if color == chess.WHITE else 7
+        if board.is_kingside_castling(move):
+            rook_from, rook_to = chess.square(7, rank), chess.square(5, rank)
+        else:
+            rook_from, rook_to = chess.square(0, rank), chess.square(3, rank)
+        delta += _square_value(chess.ROOK, color, rook_to) - _square_value(chess.ROOK, color, rook_from)
+
+    return delta if color == chess.WHITE else -delta
+
 
-        # Small mobility bonus.
-        score += 0.1 * len(list(board.legal_moves)) * (1 if board.turn == chess.WHITE else -1)
-        return score
+def mobility(board: chess.Board) -> int:
+    """Attacked-square count difference for minor and major pieces, from White's point of view."""
+    score = 0
+    for color, sign in ((chess.WHITE, MOBILITY_WEIGHT), (chess.BLACK, -MOBILITY_WEIGHT)):
+        not_own = ~board.occupied_co[color]
+        for piece_type in _MOBILITY_PIECES:
+            for square in board.pieces(piece_type, color):
+                score += sign * chess.popcount(board.attacks_mask(square) & not_own)
+    return score
 
 
-def ai_for_level(level: str) -> ChessAI:
+def ai_for_level(level: str, lookup_config: LookupConfig | None = None) -> ChessAI:
     normalized = (level or "medium").lower()
-    if normalized == "easy":
-        return ChessAI(depth=1, blunder_rate=0.25)
-    if normalized == "hard":
-        return ChessAI(depth=3, blunder_rate=0.02)
-    return ChessAI(depth=2, blunder_rate=0.10)
+    if normalized not in AI_LEVEL_PARAMS:
+        normalized = "medium"
+    depth, blunder_rate, time_limit = AI_LEVEL_PARAMS[normalized]
+    lookup = PositionLookup.for_level(normalized, lookup_config) if lookup_config is not None else None
+    return ChessAI(depth=depth, blunder_rate=blunder_rate, time_limit=time_limit, lookup=lookup)
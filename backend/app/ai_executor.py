@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import random
+from array import array
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import chess
+
+from app.ai_cache import Candidates, PositionCache
+from app.ai_engine import AI_LEVEL_PARAMS, ChessAI, ai_for_level, material_delta
+from app.ai_lookup import LookupConfig
+from app.metrics import metrics
+
+
+AI_LEVELS = ("easy", "medium", "hard")
+# Concurrent searches that can be cancelled individually; extra searches just run to their budget.
+CANCEL_SLOTS = 4096
+# Extra wall-clock time granted past a level's budget before the game falls back to the
+# search's deepest completed move (or a 1-ply material pick when it has none).
+SEARCH_GRACE_SECONDS = 2.0
+
+# Book / endgame-table hits vs searches, counted in the parent from what the workers report.
+ai_moves_total = metrics.counter(
+    "ai_moves_total", "AI replies by source (book, endgame, search, cache, timeout_depth, timeout_material)"
+)
+
+# Worker-side state, filled once per process by _init_worker.
+_worker_engines: dict[str, ChessAI] = {}
+_worker_cancel_flags = None
+_worker_best_moves = None
+
+
+def _init_worker(cancel_flags, best_moves, lookup_config: LookupConfig | None = None) -> None:
+    global _worker_cancel_flags, _worker_best_moves
+    _worker_cancel_flags = cancel_flags
+    _worker_best_moves = best_moves
+    for level in AI_LEVELS:
+        _worker_engines[level] = ai_for_level(level, lookup_config)
+
+
+def _encode_move(move: chess.Move) -> int:
+    # 0 is "no move yet": a1a1 is never legal.
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def _decode_move(code: int) -> chess.Move | None:
+    if code == 0:
+        return None
+    return chess.Move(code & 63, code >> 6 & 63, code >> 12 or None)
+
+
+def _material_pick(board: chess.Board) -> chess.Move | None:
+    """Best legal move by 1-ply material and piece-square gain, ties broken at random."""
+    legal_moves = list(board.legal_moves)
+    if not legal_moves:
+        return None
+    sign = 1 if board.turn == chess.WHITE else -1
+    random.shuffle(legal_moves)
+    return max(legal_moves, key=lambda move: sign * material_delta(board, move))
+
+
+def _search(level: str, board: chess.Board, slot: int, time_limit: float) -> tuple[Candidates, str, bool]:
+    """
+    Returns (scored candidates, source, whether they are final): false when
+    the search was cancelled or ran out of time before the level's depth.
+    """
+    engine = _worker_engines.get(level) or _worker_engines["medium"]
+    flags = _worker_cancel_flags
+    best_moves = _worker_best_moves
+
+    def should_stop() -> bool:
+        return slot >= 0 and flags[slot] != 0
+
+    def on_depth(move: chess.Move) -> None:
+        # Read by the parent if it stops waiting before the search returns.
+        if slot >= 0:
+            best_moves[slot] = _encode_move(move)
+
+    scored = engine.analyse(board, time_limit=time_limit, should_stop=should_stop, on_depth=on_depth)
+    final = engine.last_source != "search" or engine.search_complete
+    return [(move.uci(), score) for move, score in scored], engine.last_source, final
+
+
+class AIExecutor:
+    """
+    Runs AI searches off the event loop.
+
+    With workers > 0 the searches run in a process pool whose workers build
+    their engines once, so pure-Python search no longer competes with the
+    WebSocket handlers for the GIL. workers == 0 keeps everything in-process
+    on a single search thread (handy for local runs). Each level gets a
+    wall-clock budget, and a running search can be cancelled by game id.
+    lookup_config enables the opening book / endgame tables in every worker.
+
+    Searched positions go into the shared PositionCache, if one is given;
+    the level's blunder rate is applied here, on top of searched and cached
+    candidates alike.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        budgets_ms: dict[str, int],
+        lookup_config: LookupConfig | None = None,
+        cache: PositionCache | None = None,
+    ) -> None:
+        self._workers = workers
+        self._budgets_ms = budgets_ms
+        self._lookup_config = lookup_config
+        self.cache = cache
+        self._executor: Executor | None = None
+        self._cancel_flags = None
+        # slot -> _encode_move of the deepest completed iteration of the search using it.
+        self._best_moves = None
+        self._free_slots = list(range(CANCEL_SLOTS))
+        self._active: dict[int, int] = {}
+
+    def time_limit(self, level: str) -> float:
+        budget_ms = self._budgets_ms.get(level, self._budgets_ms.get("medium", 1000))
+        return budget_ms / 1000
+
+    def _ensure_started(self) -> None:
+        if self._cancel_flags is not None:
+            return
+
+        if self._workers <= 0:
+            # Engines keep per-search state (tt, killers, root_scores), so one
+            # thread runs every search, as each pool process does.
+            self._cancel_flags = bytearray(CANCEL_SLOTS)
+            self._best_moves = array("i", bytes(4 * CANCEL_SLOTS))
+            _init_worker(self._cancel_flags, self._best_moves, self._lookup_config)
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ai-search")
+            return
+
+        # spawn: forking a process that runs an event loop and DB pool threads is not safe.
+        context = multiprocessing.get_context("spawn")
+        self._cancel_flags = context.RawArray("b", CANCEL_SLOTS)
+        self._best_moves = context.RawArray("i", CANCEL_SLOTS)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self._workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._cancel_flags, self._best_moves, self._lookup_config),
+        )
+
+    async def choose_move(self, game_id: int, board: chess.Board, level: str) -> chess.Move | None:
+        level = level if level in AI_LEVEL_PARAMS else "medium"
+        cache_key = PositionCache.key(board, level) if self.cache is not None else None
+        if cache_key is not None:
+            candidates = await self.cache.get(cache_key)
+            if candidates is not None:
+                ai_moves_total.inc(source="cache")
+                return self._pick(board, level, candidates)
+
+        self._ensure_started()
+        time_limit = self.time_limit(level)
+        slot = self._free_slots.pop() if self._free_slots else -1
+        if slot >= 0:
+            self._cancel_flags[slot] = 0
+            self._best_moves[slot] = 0
+            self._active[game_id] = slot
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, _search, level, board, slot, time_limit)
+        future.add_done_callback(lambda _: self._release(game_id, slot))
+
+        done, _ = await asyncio.wait({future}, timeout=time_limit + SEARCH_GRACE_SECONDS)
+        if not done:
+            # Pool saturated or worker stuck: stop waiting, let the search wind down on its own.
+            # The slot stays ours until the future completes, so its best move is this search's.
+            move = _decode_move(self._best_moves[slot]) if slot >= 0 else None
+            self.cancel(game_id)
+            if move is not None and board.is_legal(move):
+                ai_moves_total.inc(source="timeout_depth")
+                return move
+            ai_moves_total.inc(source="timeout_material")
+            return _material_pick(board)
+
+        candidates, source, final = future.result()
+        ai_moves_total.inc(source=source)
+        if not candidates:
+            return None
+        # Book replies stay uncached (and unblundered) so the per-level book variety survives.
+        if source == "book":
+            return chess.Move.from_uci(candidates[0][0])
+        # Partial searches (and the fallback when not even depth 1 finished) stay uncached.
+        if cache_key is not None and final:
+            self.cache.put(cache_key, candidates)
+        return self._pick(board, level, candidates)
+
+    @staticmethod
+    def _pick(board: chess.Board, level: str, candidates: Candidates) -> chess.Move:
+        # Keep AI imperfect: occasionally choose a random legal move.
+        blunder_rate = AI_LEVEL_PARAMS[level][1]
+        if random.random() < blunder_rate:
+            return random.choice(list(board.legal_moves))
+        return chess.Move.from_uci(candidates[0][0])
+
+    def cancel(self, game_id: int) -> None:
+        """Ask the search running for this game to stop at its next check."""
+        slot = self._active.get(game_id)
+        if slot is not None:
+            self._cancel_flags[slot] = 1
+
+    def _release(self, game_id: int, slot: int) -> None:
+        if slot < 0:
+            return
+        if self._active.get(game_id) == slot:
+            self._active.pop(game_id, None)
+        self._free_slots.append(slot)
+
+    def shutdown(self) -> None:
+        for slot in self._active.values():
+            self._cancel_flags[slot] = 1
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self.cache is not None:
+            self.cache.close()
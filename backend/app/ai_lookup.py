@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import os
+import random
+from dataclasses import dataclass, field
+
+import chess
+import chess.polyglot
+import chess.syzygy
+
+
+# Readers are opened at most once per process (each AI worker has its own) and kept for its lifetime.
+_books: dict[str, chess.polyglot.MemoryMappedReader | None] = {}
+_tablebases: dict[str, chess.syzygy.Tablebase | None] = {}
+
+
+@dataclass(frozen=True)
+class LookupConfig:
+    """Where the opening book / endgame tables live and how each level uses them."""
+
+    book_path: str = ""
+    syzygy_dir: str = ""
+    endgame_max_pieces: int = 5
+    # Plies from the start of the game during which the book is consulted.
+    book_plies: dict[str, int] = field(default_factory=dict)
+    # Chance of a weight-proportional book pick instead of the main line (0 = always the main line).
+    book_variety: dict[str, float] = field(default_factory=dict)
+
+
+def open_book(path: str) -> chess.polyglot.MemoryMappedReader | None:
+    """Memory-map a Polyglot .bin book; None when no book is configured or the file is missing."""
+    if not path:
+        return None
+    if path not in _books:
+        try:
+            _books[path] = chess.polyglot.open_reader(path)
+        except (OSError, ValueError):
+            _books[path] = None
+    return _books[path]
+
+
+def open_tablebase(directory: str) -> chess.syzygy.Tablebase | None:
+    """Open the Syzygy tables in a directory; None when none is configured or it holds no tables."""
+    if not directory:
+        return None
+    if directory not in _tablebases:
+        tablebase = None
+        if os.path.isdir(directory):
+            tablebase = chess.syzygy.Tablebase()
+            if not tablebase.add_directory(directory):
+                tablebase.close()
+                tablebase = None
+        _tablebases[directory] = tablebase
+    return _tablebases[directory]
+
+
+def book_move(
+    book: chess.polyglot.MemoryMappedReader,
+    board: chess.Board,
+    variety: float,
+    rng: random.Random | None = None,
+) -> chess.Move | None:
+    rng = rng or random
+    try:
+        if variety > 0 and rng.random() < variety:
+            entry = book.weighted_choice(board, random=rng)
+        else:
+            entry = book.find(board)
+    except IndexError:
+        return None
+    return entry.move
+
+
+def endgame_move(tablebase: chess.syzygy.Tablebase, board: chess.Board, max_pieces: int) -> chess.Move | None:
+    """
+    Best move by the tables: win > draw > loss, then the shortest distance
+    to a zeroing move when winning and the longest when losing.
+    """
+    if chess.popcount(board.occupied) > max_pieces or board.castling_rights:
+        return None
+    if tablebase.get_wdl(board) is None:
+        return None
+
+    best_move: chess.Move | None = None
+    best_key: tuple[int, int] | None = None
+    for move in board.legal_moves:
+        board.push(move)
+        try:
+            # Values are from the opponent's point of view after the move.
+            wdl = tablebase.get_wdl(board)
+            dtz = tablebase.get_dtz(board)
+        finally:
+            board.pop()
+        if wdl is None or dtz is None:
+            return None
+        key = (-wdl, dtz)
+        if best_key is None or key > best_key:
+            best_move, best_key = move, key
+    return best_move
+
+
+class PositionLookup:
+    """
+    Answers a position without searching: the opening book while the game
+    is young enough, then the endgame tables once few pieces remain.
+    """
+
+    def __init__(
+        self,
+        book: chess.polyglot.MemoryMappedReader | None = None,
+        book_plies: int = 0,
+        book_variety: float = 0.0,
+        tablebase: chess.syzygy.Tablebase | None = None,
+        endgame_max_pieces: int = 5,
+    ) -> None:
+        self.book = book
+        self.book_plies = book_plies
+        self.book_variety = book_variety
+        self.tablebase = tablebase
+        self.endgame_max_pieces = endgame_max_pieces
+
+    @classmethod
+    def for_level(cls, level: str, config: LookupConfig) -> PositionLookup:
+        return cls(
+            book=open_book(config.book_path),
+            book_plies=config.book_plies.get(level, 0),
+            book_variety=config.book_variety.get(level, 0.0),
+            tablebase=open_tablebase(config.syzygy_dir),
+            endgame_max_pieces=config.endgame_max_pieces,
+        )
+
+    def probe(self, board: chess.Board) -> tuple[chess.Move | None, str]:
+        """Return (move, source) with source "book" or "endgame", or (None, "search") on a miss."""
+        if self.book is not None and board.ply() < self.book_plies:
+            move = book_move(self.book, board, self.book_variety)
+            if move is not None and board.is_legal(move):
+                return move, "book"
+
+        if self.tablebase is not None:
+            move = endgame_move(self.tablebase, board, self.endgame_max_pieces)
+            if move is not None:
+                return move, "endgame"
+
+        return None, "search"
@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+from collections import deque
+from typing import Callable
+from urllib.parse import urlparse
+
+from app.metrics import metrics
+
+
+MessageHandler = Callable[[bytes], None]
+
+broker_messages_total = metrics.counter("broker_messages_total", "Messages through the pub/sub broker")
+broker_reconnects_total = metrics.counter("broker_reconnects_total", "Reconnects to the network broker")
+broker_handler_errors_total = metrics.counter("broker_handler_errors_total", "Messages whose channel handler raised")
+
+logger = logging.getLogger(__name__)
+
+
+class BrokerError(Exception):
+    pass
+
+
+def _deliver(handler: MessageHandler, channel: str, message: bytes) -> None:
+    # A handler that raises loses its message, never the subscription.
+    try:
+        handler(message)
+    except Exception:
+        broker_handler_errors_total.inc(channel=channel)
+        logger.exception("broker handler for %r failed", channel)
+
+
+class Broker:
+    """
+    Channel pub/sub plus expiring keys, shared by every worker of the app.
+
+    Handlers run on the event loop, one message at a time and in publish
+    order per channel; they must not block (hand work to a queue or a task).
+    A handler that raises is logged and loses that message only.
+    Keys back room ownership records: claim() is set-if-absent with a TTL.
+    """
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        raise NotImplementedError
+
+    async def unsubscribe(self, channel: str) -> None:
+        raise NotImplementedError
+
+    async def claim(self, key: str, value: str, ttl_ms: int) -> str:
+        """Set key to value unless it is held; returns the holder after the attempt."""
+        raise NotImplementedError
+
+    async def renew(self, key: str, value: str, ttl_ms: int) -> bool:
+        """Extend a key held by value; False when it expired or someone else holds it."""
+        raise NotImplementedError
+
+    async def release(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    async def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+
+class InProcessBroker(Broker):
+    """Single-process broker: the default when no broker_url is configured."""
+
+    def __init__(self) -> None:
+        self._handlers: dict[str, MessageHandler] = {}
+        # key -> (value, expires_at loop time)
+        self._keys: dict[str, tuple[str, float]] = {}
+        # (expires_at, key) for every claim and renew; claim() and renew() pop the
+        # expired ones, so keys nobody reads again (finished games) still go.
+        self._expiry: list[tuple[float, str]] = []
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        handler = self._handlers.get(channel)
+        if handler is not None:
+            broker_messages_total.inc(direction="in")
+            # call_soon keeps publish order and never re-enters the publisher.
+            asyncio.get_running_loop().call_soon(_deliver, handler, channel, message)
+        broker_messages_total.inc(direction="out")
+
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        self._handlers[channel] = handler
+
+    async def unsubscribe(self, channel: str) -> None:
+        self._handlers.pop(channel, None)
+
+    def _live(self, key: str) -> str | None:
+        entry = self._keys.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= asyncio.get_running_loop().time():
+            del self._keys[key]
+            return None
+        return value
+
+    def _set(self, key: str, value: str, ttl_ms: int) -> None:
+        now = asyncio.get_running_loop().time()
+        while self._expiry and self._expiry[0][0] <= now:
+            _, expired = heapq.heappop(self._expiry)
+            entry = self._keys.get(expired)
+            # Entries left by a renew or an earlier holder point past their key's expiry.
+            if entry is not None and entry[1] <= now:
+                del self._keys[expired]
+        expires_at = now + ttl_ms / 1000
+        self._keys[key] = (value, expires_at)
+        heapq.heappush(self._expiry, (expires_at, key))
+
+    async def claim(self, key: str, value: str, ttl_ms: int) -> str:
+        holder = self._live(key)
+        if holder is None:
+            self._set(key, value, ttl_ms)
+            return value
+        return holder
+
+    async def renew(self, key: str, value: str, ttl_ms: int) -> bool:
+        if self._live(key) != value:
+            return False
+        self._set(key, value, ttl_ms)
+        return True
+
+    async def release(self, key: str, value: str) -> None:
+        if self._live(key) == value:
+            del self._keys[key]
+
+    async def get(self, key: str) -> str | None:
+        return self._live(key)
+
+
+def encode_command(*args: bytes | str | int) -> bytes:
+    """A RESP array of bulk strings."""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif isinstance(arg, int):
+            arg = b"%d" % arg
+        parts.append(b"$%d\r\n" % len(arg))
+        parts.append(arg)
+        parts.append(b"\r\n")
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """One RESP reply; error replies come back as BrokerError instances, not raised."""
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("broker connection closed")
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b"+":
+        return rest.decode()
+    if prefix == b"-":
+        return BrokerError(rest.decode())
+    if prefix == b":":
+        return int(rest)
+    if prefix == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise BrokerError(f"unexpected reply {line!r}")
+
+
+class RespBroker(Broker):
+    """
+    Broker speaking the Redis protocol (RESP2) over two plain TCP connections.
+
+    Commands are pipelined on one connection and matched to replies in
+    order; the other connection only subscribes. Only PUBLISH, SUBSCRIBE,
+    UNSUBSCRIBE, SET (NX/XX/PX), GET and DEL are used, so Redis, Valkey,
+    KeyDB or the stand-in in benchmarks/resp_server.py all work. After a
+    dropped connection the broker reconnects and subscribes again; messages
+    published meanwhile are lost, like any Redis pub/sub subscriber.
+    """
+
+    def __init__(self, url: str, reconnect_seconds: float = 0.5) -> None:
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self._reconnect_seconds = reconnect_seconds
+        self._handlers: dict[str, MessageHandler] = {}
+        self._writer: asyncio.StreamWriter | None = None
+        self._sub_writer: asyncio.StreamWriter | None = None
+        self._pending: deque[asyncio.Future] = deque()
+        self._connected = asyncio.Event()
+        self._subscriber_ready = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._closing = False
+
+    async def start(self) -> None:
+        self._closing = False
+        self._tasks = [
+            asyncio.create_task(self._run_commands()),
+            asyncio.create_task(self._run_subscriber()),
+        ]
+        await asyncio.wait_for(asyncio.gather(self._connected.wait(), self._subscriber_ready.wait()), 10)
+
+    async def close(self) -> None:
+        self._closing = True
+        for task in self._tasks:
+            task.cancel()
+        for writer in (self._writer, self._sub_writer):
+            if writer is not None:
+                writer.close()
+        self._writer = self._sub_writer = None
+        self._connected.clear()
+        self._fail_pending(ConnectionError("broker closed"))
+
+    async def _open(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(encode_command("AUTH", self.password))
+            reply = await read_reply(reader)
+            if isinstance(reply, BrokerError):
+                writer.close()
+                raise reply
+        return reader, writer
+
+    def _fail_pending(self, error: Exception) -> None:
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    async def _run_commands(self) -> None:
+        while not self._closing:
+            try:
+                reader, writer = await self._open()
+                if self.db:
+                    writer.write(encode_command("SELECT", self.db))
+                    await read_reply(reader)
+                self._writer = writer
+                self._connected.set()
+                while True:
+                    reply = await read_reply(reader)
+                    future = self._pending.popleft()
+                    if not future.done():
+                        future.set_result(reply)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, BrokerError):
+                pass
+            self._connected.clear()
+            self._writer = None
+            self._fail_pending(ConnectionError("broker connection lost"))
+            if not self._closing:
+                broker_reconnects_total.inc()
+                await asyncio.sleep(self._reconnect_seconds)
+
+    async def _run_subscriber(self) -> None:
+        while not self._closing:
+            try:
+                reader, writer = await self._open()
+                self._sub_writer = writer
+                if self._handlers:
+                    writer.write(encode_command("SUBSCRIBE", *self._handlers))
+                self._subscriber_ready.set()
+                while True:
+                    reply = await read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        channel = reply[1].decode()
+                        handler = self._handlers.get(channel)
+                        if handler is not None:
+                            broker_messages_total.inc(direction="in")
+                            _deliver(handler, channel, reply[2])
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, BrokerError):
+                pass
+            self._sub_writer = None
+            self._subscriber_ready.clear()
+            if not self._closing:
+                broker_reconnects_total.inc()
+                await asyncio.sleep(self._reconnect_seconds)
+
+    async def _command(self, *args: bytes | str | int):
+        if self._closing:
+            raise ConnectionError("broker closed")
+        if self._writer is None:
+            try:
+                await asyncio.wait_for(self._connected.wait(), self._reconnect_seconds * 4)
+            except asyncio.TimeoutError:
+                raise ConnectionError("broker unavailable") from None
+        future = asyncio.get_running_loop().create_future()
+        # write() never yields, so request order on the socket matches _pending.
+        self._pending.append(future)
+        self._writer.write(encode_command(*args))
+        reply = await future
+        if isinstance(reply, BrokerError):
+            raise reply
+        return reply
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self._command("PUBLISH", channel, message)
+        broker_messages_total.inc(direction="out")
+
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        self._handlers[channel] = handler
+        if self._sub_writer is not None:
+            self._sub_writer.write(encode_command("SUBSCRIBE", channel))
+
+    async def unsubscribe(self, channel: str) -> None:
+        if self._handlers.pop(channel, None) is not None and self._sub_writer is not None:
+            self._sub_writer.write(encode_command("UNSUBSCRIBE", channel))
+
+    async def claim(self, key: str, value: str, ttl_ms: int) -> str:
+        if await self._command("SET", key, value, "NX", "PX", ttl_ms) == "OK":
+            return value
+        holder = await self._command("GET", key)
+        if holder is None:
+            # Expired between the two commands.
+            return await self.claim(key, value, ttl_ms)
+        return holder.decode()
+
+    async def renew(self, key: str, value: str, ttl_ms: int) -> bool:
+        # GET then SET XX is not atomic; the window only matters once the key
+        # already ran out, which renewing well inside the TTL avoids.
+        if await self.get(key) != value:
+            return False
+        return await self._command("SET", key, value, "XX", "PX", ttl_ms) == "OK"
+
+    async def release(self, key: str, value: str) -> None:
+        if await self.get(key) == value:
+            await self._command("DEL", key)
+
+    async def get(self, key: str) -> str | None:
+        value = await self._command("GET", key)
+        return None if value is None else value.decode()
+
+
+def create_broker(url: str) -> Broker:
+    """redis:// (or resp://) URL -> RespBroker; empty -> InProcessBroker."""
+    if not url:
+        return InProcessBroker()
+    scheme = urlparse(url).scheme
+    if scheme in {"redis", "resp", "tcp"}:
+        return RespBroker(url)
+    raise ValueError(f"Unsupported broker URL scheme: {scheme}")
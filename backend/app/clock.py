@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+from typing import Awaitable, Callable
+
+from app.realtime import RoomState
+
+
+class ClockScheduler:
+    """
+    One clock driver per process.
+
+    Every running room has a single entry in a timer heap keyed by the moment
+    its side-to-move flag falls. The scheduler sleeps until either that
+    deadline or the next display tick, whichever comes first. Game status is
+    read from the in-memory RoomState, so Postgres is only touched by the
+    on_flag callback when a flag actually falls. That callback runs in its
+    own task, so a slow commit never delays the other rooms' deadlines and
+    ticks.
+    """
+
+    def __init__(
+        self,
+        get_room: Callable[[int], RoomState | None],
+        on_tick: Callable[[RoomState], Awaitable[None]],
+        on_flag: Callable[[RoomState], Awaitable[None]],
+        tick_seconds: float = 1.0,
+    ) -> None:
+        self._get_room = get_room
+        self._on_tick = on_tick
+        self._on_flag = on_flag
+        self._tick_seconds = tick_seconds
+        # game_id -> (deadline, version) of the only live heap entry for that room.
+        self._deadlines: dict[int, tuple[float, int]] = {}
+        self._heap: list[tuple[float, int, int]] = []
+        self._version = 0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        # game_id -> on_flag task still running for that room.
+        self._flagging: dict[int, asyncio.Task] = {}
+
+    @property
+    def running_count(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, game_id: int) -> None:
+        """(Re)arm the flag deadline of a room after its clocks or turn changed."""
+        room = self._get_room(game_id)
+        if room is None or room.finished:
+            self.cancel(game_id)
+            return
+
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        self._push(game_id, loop.time() + room.clock_remaining_ms() / 1000)
+
+    def cancel(self, game_id: int) -> None:
+        self._deadlines.pop(game_id, None)
+
+    def _push(self, game_id: int, deadline: float) -> None:
+        self._version += 1
+        self._deadlines[game_id] = (deadline, self._version)
+        heapq.heappush(self._heap, (deadline, self._version, game_id))
+
+        # Superseded entries stay in the heap until popped; compact when they pile up.
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, v, gid) for gid, (d, v) in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+        if self._heap[0][2] == game_id:
+            self._wakeup.set()
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + self._tick_seconds
+        while True:
+            wake_at = min(next_tick, self._heap[0][0]) if self._heap else next_tick
+            timeout = wake_at - loop.time()
+            if timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+            now = loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, version, game_id = heapq.heappop(self._heap)
+                current = self._deadlines.get(game_id)
+                if current is None or current[1] != version:
+                    continue
+                self._fire_deadline(game_id)
+
+            if now >= next_tick:
+                next_tick = now + self._tick_seconds
+                await self._tick_all()
+
+    def _fire_deadline(self, game_id: int) -> None:
+        self._deadlines.pop(game_id, None)
+        room = self._get_room(game_id)
+        if room is None or room.finished or game_id in self._flagging:
+            return
+
+        room.settle_clock()
+        if room.white_ms > 0 and room.black_ms > 0:
+            # Clock was topped up or the turn changed without a reschedule.
+            self.schedule(game_id)
+            return
+
+        task = asyncio.create_task(self._flag(game_id, room))
+        self._flagging[game_id] = task
+        task.add_done_callback(lambda _: self._flagging.pop(game_id, None))
+
+    async def _flag(self, game_id: int, room: RoomState) -> None:
+        try:
+            await self._on_flag(room)
+        except Exception:
+            # Transient DB pressure: retry on the next tick.
+            if not room.finished:
+                self._push(game_id, asyncio.get_running_loop().time() + self._tick_seconds)
+
+    async def _tick_all(self) -> None:
+        for game_id in list(self._deadlines):
+            room = self._get_room(game_id)
+            if room is None or room.finished:
+                self.cancel(game_id)
+                continue
+
+            room.settle_clock()
+            try:
+                await self._on_tick(room)
+            except Exception:
+                pass
@@ -0,0 +1,552 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import bisect
+import itertools
+import json
+import os
+import socket
+import zlib
+from typing import Awaitable, Callable
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketDisconnect
+
+from app.broker import Broker
+from app.json_codec import default_encoder
+from app.metrics import metrics
+from app.realtime import (
+    SEND_QUEUE_LIMIT,
+    SEND_TIMEOUT_SECONDS,
+    SERVICE_RESTART_CLOSE_CODE,
+    SLOW_CONSUMER_CLOSE_CODE,
+    RealtimeManager,
+    RoomState,
+)
+from app.room_snapshot import decode_room, encode_room
+
+
+# serve(game_id, user_id, websocket, protocol): the owner-side game handler.
+ServeGame = Callable[[int, int, WebSocket, int], Awaitable[None]]
+# room_state(game_id): STATE_SYNC payload of a room this worker owns, loading it if needed.
+RoomStateLookup = Callable[[int], Awaitable[dict | None]]
+
+MEMBERS_CHANNEL = "cluster:members"
+
+# Close code when the owner of a room cannot be reached; clients retry.
+OWNER_UNAVAILABLE_CLOSE_CODE = 1013
+
+relayed_connections = metrics.counter("cluster_relayed_connections_total", "Game sockets relayed to another worker")
+room_leases_lost = metrics.counter("cluster_room_leases_lost_total", "Room ownership leases that expired under their owner")
+rooms_handed_off = metrics.counter("cluster_rooms_handed_off_total", "Live rooms passed to a successor on shutdown")
+cluster_members = metrics.gauge("cluster_members", "Workers on the ownership ring")
+malformed_messages = metrics.counter("cluster_malformed_messages_total", "Cluster messages dropped for a bad payload")
+
+# Fields each op on a worker channel carries; a message missing any of them is dropped.
+_MESSAGE_FIELDS = {
+    "handoff": ("room", "recorded_plies"),
+    "state_req": ("req", "reply", "game_id"),
+    "state": ("req",),
+    "join": ("conn", "edge", "game_id", "user_id", "protocol"),
+    "event": ("conn", "data"),
+    "leave": ("conn",),
+    "accept": ("conn",),
+    "frame": ("conn", "frame"),
+    "close": ("conn",),
+}
+
+
+def _decode_message(data: bytes, fields: dict[str, tuple[str, ...]]) -> dict | None:
+    try:
+        message = json.loads(data)
+        required = fields[message["op"]]
+    except (ValueError, KeyError, TypeError):
+        required = None
+    if required is None or any(field not in message for field in required):
+        malformed_messages.inc()
+        return None
+    return message
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def owner_key(game_id: int) -> str:
+    return f"room-owner:{game_id}"
+
+
+def worker_channel(worker_id: str) -> str:
+    return f"worker:{worker_id}"
+
+
+class RemoteSocket:
+    """
+    Owner-side stand-in for a WebSocket accepted by another worker.
+
+    It has the WebSocket methods the game handler and Connection use, so a
+    relayed player joins the room like a local one: broadcasts enqueue on
+    its Connection and the writer task publishes each frame to the worker
+    holding the real socket.
+    """
+
+    def __init__(self, cluster: Cluster, conn_id: str, edge: str) -> None:
+        self._cluster = cluster
+        self.conn_id = conn_id
+        self.edge = edge
+        self.closed = False
+        # Client events in arrival order; None once the client left.
+        self._inbox: asyncio.Queue[dict | None] = asyncio.Queue()
+
+    def feed(self, event: dict | None) -> None:
+        self._inbox.put_nowait(event)
+
+    async def _send(self, message: dict) -> None:
+        try:
+            await self._cluster.send_to(self.edge, message)
+        except ConnectionError:
+            raise WebSocketDisconnect(code=OWNER_UNAVAILABLE_CLOSE_CODE) from None
+
+    async def accept(self) -> None:
+        await self._send({"op": "accept", "conn": self.conn_id})
+
+    async def receive_json(self) -> dict:
+        event = await self._inbox.get()
+        if event is None:
+            raise WebSocketDisconnect(code=1000)
+        return event
+
+    async def send_text(self, frame: str) -> None:
+        if self.closed:
+            raise RuntimeError("Relayed socket is closed")
+        await self._send({"op": "frame", "conn": self.conn_id, "frame": frame})
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        await self._send({"op": "close", "conn": self.conn_id, "code": code, "reason": reason})
+
+
+class _EdgeLink:
+    """Edge-side end of a relayed socket: frames from the owner waiting to be written."""
+
+    def __init__(self, websocket: WebSocket, limit: int) -> None:
+        self.websocket = websocket
+        self.limit = limit
+        self.messages: asyncio.Queue[dict] = asyncio.Queue()
+
+    def stop(self) -> None:
+        # A message rather than only cancel(): on 3.11 wait_for can swallow a cancel that races a finished send.
+        self.messages.put_nowait({"op": "stop"})
+
+    def deliver(self, message: dict) -> None:
+        if message["op"] == "frame" and self.messages.qsize() >= self.limit:
+            # Same rule as Connection: a client this far behind reconnects and resyncs.
+            while not self.messages.empty():
+                self.messages.get_nowait()
+            message = {"op": "close", "code": SLOW_CONSUMER_CLOSE_CODE, "reason": None}
+        self.messages.put_nowait(message)
+
+
+class HashRing:
+    """Consistent hashing of game ids onto worker ids, with virtual nodes for an even spread."""
+
+    def __init__(self, workers: list[str] | tuple[str, ...] = (), replicas: int = 64) -> None:
+        self.replicas = replicas
+        self.workers = tuple(sorted(workers))
+        points = sorted(
+            (zlib.crc32(f"{worker}#{replica}".encode()), worker)
+            for worker in self.workers
+            for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [worker for _, worker in points]
+
+    def node_for(self, game_id: int) -> str | None:
+        if not self._owners:
+            return None
+        index = bisect.bisect(self._hashes, zlib.crc32(b"game:%d" % game_id)) % len(self._hashes)
+        return self._owners[index]
+
+    def without(self, worker_id: str) -> HashRing:
+        return HashRing([worker for worker in self.workers if worker != worker_id], self.replicas)
+
+
+class Cluster:
+    """
+    Routes game sockets and state lookups to the single worker that owns each room.
+
+    Workers announce themselves on a shared channel and place game ids on a
+    consistent-hash ring of the live workers. The owner of a game is
+    recorded in an expiring lease key: the first lookup claims it for the
+    game's ring node and the owner renews it while the room is in play, so
+    a room stays put when workers join, and moves after the lease lapses
+    if its owner died. A worker that loses a lease drops its copy of the
+    room and closes its sockets, so moves for a game are only ever applied
+    in one process.
+
+    A socket that lands on another worker stays open there (the edge) and
+    is relayed: its events go to the owner's channel and the owner's frames
+    come back on the edge's channel. On shutdown the owner hands every live
+    room to its successor on the ring (full RoomState, as in the snapshot
+    file) before moving the lease and closing the sockets, which reconnect
+    to the new owner. With the in-process broker this worker is the only
+    ring node and nothing is relayed.
+    """
+
+    def __init__(
+        self,
+        broker: Broker,
+        realtime: RealtimeManager,
+        worker_id: str | None = None,
+        lease_seconds: float = 15.0,
+        relay_timeout: float = 10.0,
+        send_timeout: float = SEND_TIMEOUT_SECONDS,
+        send_queue_limit: int = SEND_QUEUE_LIMIT,
+    ) -> None:
+        self.broker = broker
+        self.realtime = realtime
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_ms = int(lease_seconds * 1000)
+        self.relay_timeout = relay_timeout
+        self.send_timeout = send_timeout
+        self.send_queue_limit = send_queue_limit
+        self._encode = default_encoder()
+        self._serve: ServeGame | None = None
+        self._room_state: RoomStateLookup | None = None
+        self._on_adopt: Callable[[RoomState], None] | None = None
+        self._ids = itertools.count(1)
+        # worker_id -> loop time of its last heartbeat.
+        self._members: dict[str, float] = {}
+        self.ring = HashRing([self.worker_id])
+        # Owner side: relayed sockets by connection id.
+        self._remote: dict[str, RemoteSocket] = {}
+        # Edge side: sockets this worker accepted for rooms owned elsewhere.
+        self._links: dict[str, _EdgeLink] = {}
+        # Pending state lookups sent to other owners.
+        self._requests: dict[str, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._background: list[asyncio.Task] = []
+        # Set once close() starts handing rooms off; new joins are turned away.
+        self._leaving = False
+
+    @property
+    def relayed_count(self) -> int:
+        return len(self._links)
+
+    @property
+    def heartbeat_seconds(self) -> float:
+        return self.lease_ms / 3000
+
+    async def start(
+        self,
+        serve: ServeGame,
+        room_state: RoomStateLookup,
+        on_adopt: Callable[[RoomState], None] | None = None,
+    ) -> None:
+        self._serve = serve
+        self._room_state = room_state
+        self._on_adopt = on_adopt
+        await self.broker.start()
+        await self.broker.subscribe(worker_channel(self.worker_id), self._on_message)
+        await self.broker.subscribe(MEMBERS_CHANNEL, self._on_member)
+        self._members[self.worker_id] = asyncio.get_running_loop().time()
+        await self._announce("alive")
+        self._background = [
+            asyncio.create_task(self._heartbeat()),
+            asyncio.create_task(self._renew_leases()),
+        ]
+
+    async def close(self) -> None:
+        """Hand live rooms to their successors, then leave the ring."""
+        self._leaving = True
+        for task in self._background:
+            task.cancel()
+        for link in list(self._links.values()):
+            link.deliver({"op": "close", "code": SERVICE_RESTART_CLOSE_CODE, "reason": None})
+        try:
+            await self._announce("gone")
+            await self._hand_off()
+        except ConnectionError:
+            pass
+        await self.broker.unsubscribe(MEMBERS_CHANNEL)
+        await self.broker.unsubscribe(worker_channel(self.worker_id))
+        await self.broker.close()
+
+    async def owner_of(self, game_id: int) -> str:
+        """The worker owning a room; claims the lease for the game's ring node when nobody holds it."""
+        preferred = self.ring.node_for(game_id) or self.worker_id
+        return await self.broker.claim(owner_key(game_id), preferred, self.lease_ms)
+
+    async def send_to(self, worker_id: str, message: dict) -> None:
+        await self.broker.publish(worker_channel(worker_id), self._encode(message).encode())
+
+    async def request_state(self, owner: str, game_id: int) -> dict | None:
+        """STATE_SYNC payload of a room from its owner's memory; None when the game does not exist."""
+        request_id = f"{self.worker_id}/r{next(self._ids)}"
+        future = asyncio.get_running_loop().create_future()
+        self._requests[request_id] = future
+        try:
+            await self.send_to(owner, {"op": "state_req", "req": request_id, "reply": self.worker_id, "game_id": game_id})
+            return await asyncio.wait_for(future, self.relay_timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError("room owner did not answer") from None
+        finally:
+            self._requests.pop(request_id, None)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _announce(self, op: str) -> None:
+        await self.broker.publish(MEMBERS_CHANNEL, self._encode({"op": op, "worker": self.worker_id}).encode())
+
+    def _on_member(self, data: bytes) -> None:
+        message = _decode_message(data, {"alive": ("worker",), "gone": ("worker",)})
+        if message is None:
+            return
+        worker = message["worker"]
+        known = worker in self._members
+        if message["op"] == "gone":
+            if worker != self.worker_id:
+                self._members.pop(worker, None)
+                self._drop_edge(worker)
+        else:
+            self._members[worker] = asyncio.get_running_loop().time()
+            if not known and worker != self.worker_id:
+                # Let a newcomer learn about this worker without waiting a heartbeat.
+                self._spawn(self._announce("alive"))
+        self._rebuild_ring()
+
+    def _drop_edge(self, worker: str) -> None:
+        """End the relayed sockets of a worker that left; their clients reconnect elsewhere."""
+        for remote in list(self._remote.values()):
+            if remote.edge == worker:
+                remote.closed = True
+                remote.feed(None)
+
+    def _rebuild_ring(self) -> None:
+        workers = sorted(self._members)
+        if tuple(workers) != self.ring.workers:
+            self.ring = HashRing(workers, self.ring.replicas)
+            cluster_members.set(len(workers))
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            now = asyncio.get_running_loop().time()
+            self._members[self.worker_id] = now
+            for worker, seen in list(self._members.items()):
+                if now - seen > 3 * self.heartbeat_seconds:
+                    del self._members[worker]
+                    self._drop_edge(worker)
+            self._rebuild_ring()
+            try:
+                await self._announce("alive")
+            except ConnectionError:
+                pass
+
+    async def _renew_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            for room in self.realtime.rooms():
+                if room.finished:
+                    continue
+                key = owner_key(room.game_id)
+                try:
+                    if await self.broker.renew(key, self.worker_id, self.lease_ms):
+                        continue
+                    if await self.broker.claim(key, self.worker_id, self.lease_ms) != self.worker_id:
+                        # Someone else serves this game now; never apply moves to a second copy.
+                        room_leases_lost.inc()
+                        self.realtime.release_room(room.game_id)
+                        await self.realtime.close_room(room.game_id)
+                except ConnectionError:
+                    break
+
+    async def _hand_off(self) -> None:
+        successors = self.ring.without(self.worker_id)
+        moves: list[tuple[RoomState, str]] = []
+        for room in self.realtime.rooms():
+            successor = successors.node_for(room.game_id)
+            if successor is None:
+                # Last worker standing: the snapshot file and game_records cover the restart.
+                return
+            if not room.finished:
+                moves.append((room, successor))
+
+        # Released before encoding, so no move can land on a copy that was already sent.
+        for room, _ in moves:
+            self.realtime.release_room(room.game_id)
+            # Every unfinished room's clock runs (the scheduler charges it the same way).
+            room.settle_clock()
+        await asyncio.gather(
+            *(
+                self.send_to(
+                    successor,
+                    {
+                        "op": "handoff",
+                        "game_id": room.game_id,
+                        "room": base64.b64encode(encode_room(room)).decode(),
+                        "recorded_plies": room.recorded_plies,
+                    },
+                )
+                for room, successor in moves
+            )
+        )
+        # Leases move only after the successor has the rooms queued, so a reconnect finds them there.
+        await asyncio.gather(*(self._move_lease(room.game_id, successor) for room, successor in moves))
+        await asyncio.gather(*(self.realtime.close_room(room.game_id) for room, _ in moves))
+        rooms_handed_off.inc(len(moves))
+
+    async def _move_lease(self, game_id: int, successor: str) -> None:
+        key = owner_key(game_id)
+        await self.broker.release(key, self.worker_id)
+        await self.broker.claim(key, successor, self.lease_ms)
+
+    def _adopt(self, message: dict) -> None:
+        room = decode_room(base64.b64decode(message["room"]))
+        room.recorded_plies = message["recorded_plies"]
+        self.realtime.adopt_room(room)
+        if self._on_adopt is not None:
+            self._on_adopt(room)
+
+    async def _answer_state(self, message: dict) -> None:
+        reply = {"op": "state", "req": message["req"], "state": None}
+        if self._leaving:
+            reply["moved"] = True
+        else:
+            try:
+                reply["state"] = await self._room_state(message["game_id"])
+            except Exception:
+                reply["moved"] = True
+        await self.send_to(message["reply"], reply)
+
+    def _on_message(self, data: bytes) -> None:
+        message = _decode_message(data, _MESSAGE_FIELDS)
+        if message is None:
+            return
+        op = message["op"]
+
+        if op == "handoff":
+            self._adopt(message)
+            return
+        if op == "state_req":
+            self._spawn(self._answer_state(message))
+            return
+        if op == "state":
+            future = self._requests.get(message["req"])
+            if future is not None and not future.done():
+                if message.get("moved"):
+                    future.set_exception(ConnectionError("room owner is shutting down"))
+                else:
+                    future.set_result(message.get("state"))
+            return
+
+        conn_id = message["conn"]
+        if op == "join":
+            remote = RemoteSocket(self, conn_id, message["edge"])
+            if self._leaving:
+                # The room is on its way to another worker; the client retries there.
+                self._spawn(remote.close(code=SERVICE_RESTART_CLOSE_CODE))
+                return
+            self._remote[conn_id] = remote
+            self._spawn(self._serve_remote(remote, message["game_id"], message["user_id"], message["protocol"]))
+        elif op == "event":
+            remote = self._remote.get(conn_id)
+            if remote is not None:
+                remote.feed(message["data"])
+        elif op == "leave":
+            remote = self._remote.get(conn_id)
+            if remote is not None:
+                remote.closed = True
+                remote.feed(None)
+        else:
+            link = self._links.get(conn_id)
+            if link is not None:
+                link.deliver(message)
+
+    async def _serve_remote(self, remote: RemoteSocket, game_id: int, user_id: int, protocol: int) -> None:
+        try:
+            await self._serve(game_id, user_id, remote, protocol)
+        finally:
+            self._remote.pop(remote.conn_id, None)
+            try:
+                await remote.close(code=1011)
+            except WebSocketDisconnect:
+                pass
+
+    async def relay(self, owner: str, game_id: int, user_id: int, websocket: WebSocket, protocol: int) -> None:
+        """Serve a socket for a room owned by another worker until either side closes it."""
+        conn_id = f"{self.worker_id}/{next(self._ids)}"
+        link = _EdgeLink(websocket, self.send_queue_limit)
+        self._links[conn_id] = link
+        relayed_connections.inc()
+        joined = False
+        try:
+            await self.send_to(
+                owner,
+                {
+                    "op": "join",
+                    "conn": conn_id,
+                    "edge": self.worker_id,
+                    "game_id": game_id,
+                    "user_id": user_id,
+                    "protocol": protocol,
+                },
+            )
+            joined = True
+            first = await asyncio.wait_for(link.messages.get(), self.relay_timeout)
+            if first["op"] != "accept":
+                # Rejected before the handshake (bad game, not a player, ...).
+                await websocket.close(code=first.get("code", 1000), reason=first.get("reason"))
+                return
+
+            await websocket.accept()
+            writer = asyncio.create_task(self._write_frames(link))
+            try:
+                while not writer.done():
+                    try:
+                        incoming = await websocket.receive_json()
+                    except RuntimeError:
+                        break
+                    await self.send_to(owner, {"op": "event", "conn": conn_id, "data": incoming})
+            except WebSocketDisconnect:
+                pass
+            finally:
+                link.stop()
+                writer.cancel()
+        except (asyncio.TimeoutError, ConnectionError):
+            await self._close_quietly(websocket, OWNER_UNAVAILABLE_CLOSE_CODE, "Room owner unavailable")
+        finally:
+            self._links.pop(conn_id, None)
+            if joined:
+                try:
+                    await self.send_to(owner, {"op": "leave", "conn": conn_id})
+                except ConnectionError:
+                    pass
+
+    async def _write_frames(self, link: _EdgeLink) -> None:
+        while True:
+            message = await link.messages.get()
+            if message["op"] == "stop":
+                return
+            if message["op"] == "close":
+                await self._close_quietly(link.websocket, message.get("code", 1000), message.get("reason"))
+                return
+            try:
+                await asyncio.wait_for(link.websocket.send_text(message["frame"]), self.send_timeout)
+            except asyncio.TimeoutError:
+                await self._close_quietly(link.websocket, SLOW_CONSUMER_CLOSE_CODE, None)
+                return
+            except (WebSocketDisconnect, RuntimeError):
+                return
+
+    async def _close_quietly(self, websocket: WebSocket, code: int, reason: str | None) -> None:
+        try:
+            await asyncio.wait_for(websocket.close(code=code, reason=reason), self.send_timeout)
+        except Exception:
+            pass
@@ -7,6 +7,46 @@ class Settings(BaseSettings):
     jwt_algorithm: str
     access_token_expire_minutes: int
     refresh_token_expire_minutes: int
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout_seconds: float = 5.0
+    db_pool_recycle_seconds: int = 1800
+    db_connect_timeout_seconds: int = 5
+    db_statement_timeout_ms: int = 5000
+    ai_workers: int = 2
+    ai_budget_easy_ms: int = 300
+    ai_budget_medium_ms: int = 1000
+    ai_budget_hard_ms: int = 3000
+    ai_book_path: str = ""
+    ai_syzygy_dir: str = ""
+    ai_endgame_max_pieces: int = 5
+    ai_book_plies_easy: int = 6
+    ai_book_plies_medium: int = 10
+    ai_book_plies_hard: int = 16
+    ai_book_variety_easy: float = 1.0
+    ai_book_variety_medium: float = 0.5
+    ai_book_variety_hard: float = 0.0
+    ai_cache_entries: int = 50_000
+    ai_cache_ttl_seconds: int = 86_400
+    ai_cache_path: str = ""
+    game_flush_interval_ms: int = 250
+    game_flush_max_dirty: int = 256
+    room_snapshot_path: str = ""
+    room_snapshot_interval_seconds: float = 5.0
+    broker_url: str = ""
+    worker_id: str = ""
+    room_lease_seconds: float = 15.0
+    room_finished_ttl_seconds: float = 60.0
+    room_idle_ttl_seconds: float = 3600.0
+    room_max_resident: int = 20_000
+    room_sweep_interval_seconds: float = 10.0
+    matchmaking_active_game_ttl_seconds: float = 30.0
+    matchmaking_max_wait_seconds: float = 25.0
+    matchmaking_elo_window_base: int = 50
+    matchmaking_elo_window_per_second: float = 10.0
+    matchmaking_elo_window_max: int = 400
+    matchmaking_pass_interval_seconds: float = 1.0
+    friend_graph_cache_size: int = 50_000
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -1,12 +1,108 @@
-from sqlalchemy import create_engine
+from __future__ import annotations
+
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.core_config import settings
+from app.metrics import metrics
+
+
+DB_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+db_query_seconds = metrics.histogram("db_query_seconds", "Statement round-trip time by engine", DB_LATENCY_BUCKETS)
+db_pool_checkout_seconds = metrics.histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled connection (async engine)", DB_LATENCY_BUCKETS
+)
+
+
+def _instrument(target: Engine, label: str) -> None:
+    # The start lives on the statement's execution context, not the pooled connection,
+    # so a statement that fails (no after_cursor_execute) leaves nothing behind.
+    @event.listens_for(target, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is not None:
+            db_query_seconds.observe(time.perf_counter() - started, engine=label)
+
+
+class _TimedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited for a free connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_seconds.observe(time.perf_counter() - started)
+
+
+def _async_database_url(url: str) -> str:
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+def _async_connect_args(url: str) -> dict:
+    if not url.startswith("postgresql"):
+        return {}
+    return {
+        "connect_timeout": settings.db_connect_timeout_seconds,
+        "options": f"-c statement_timeout={settings.db_statement_timeout_ms}",
+    }
 
 
 engine = create_engine(settings.database_url, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+_instrument(engine, "sync")
+
+# Built on first use so tools that only need the sync engine do not require an async driver.
+_async_engine: AsyncEngine | None = None
+_async_sessionmaker: async_sessionmaker[AsyncSession] | None = None
+
+
+def get_async_engine() -> AsyncEngine:
+    """The engine used by the WebSocket handlers, the clock and async routes."""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        url = _async_database_url(settings.database_url)
+        _async_engine = create_async_engine(
+            url,
+            poolclass=_TimedQueuePool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout_seconds,
+            pool_recycle=settings.db_pool_recycle_seconds,
+            pool_pre_ping=True,
+            connect_args=_async_connect_args(url),
+        )
+        _instrument(_async_engine.sync_engine, "async")
+        # expire_on_commit=False: handlers keep reading game/user attributes after committing.
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+def async_session() -> AsyncSession:
+    get_async_engine()
+    return _async_sessionmaker()
+
+
+async def dispose_async_engine() -> None:
+    if _async_engine is not None:
+        await _async_engine.dispose()
 
 
 def get_db():
@@ -15,3 +111,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with async_session() as db:
+        yield db
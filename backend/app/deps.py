@@ -3,14 +3,14 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from app.auth import decode_token
-from app.db import get_db
+from app.db import SessionLocal, get_db
 from app.models import User
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+def _token_user_id(token: str) -> int:
     try:
         payload = decode_token(token)
     except ValueError:
@@ -22,8 +22,24 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     user_id_str = payload.get("sub")
     if not user_id_str or not user_id_str.isdigit():
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token subject")
+    return int(user_id_str)
+
 
-    user = db.get(User, int(user_id_str))
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    user = db.get(User, _token_user_id(token))
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
+
+
+def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
+    """
+    Id of the authenticated user, for routes that need nothing else. The
+    session is closed before the route runs, so a long poll holds no pooled
+    connection (get_current_user's get_db session lives until the response).
+    """
+    user_id = _token_user_id(token)
+    with SessionLocal() as db:
+        if db.get(User, user_id) is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    return user_id
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+
+import anyio
+from sqlalchemy import select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.broker import Broker
+from app.models import Friendship
+
+
+FRIEND_GRAPH_CHANNEL = "friend_graph"
+
+
+def _friends_statement(user_id: int):
+    # Two lookups, one per indexed column, instead of an OR over both.
+    return union_all(
+        select(Friendship.addressee_id).where(Friendship.requester_id == user_id, Friendship.status == "accepted"),
+        select(Friendship.requester_id).where(Friendship.addressee_id == user_id, Friendship.status == "accepted"),
+    )
+
+
+class FriendGraph:
+    """
+    user id -> ids of their accepted friends.
+
+    Serves the friends list and the presence fan-out without querying
+    friendships each time. A miss loads one user's friends; the entry is
+    kept until a friendship of theirs is accepted or removed (on any worker,
+    through the broker) or it falls out of the `size` most recently used.
+    Sync endpoints read it from worker threads, hence the lock. A load that
+    overlaps an invalidation is returned but not cached.
+    """
+
+    def __init__(self, size: int = 50_000) -> None:
+        self.size = size
+        self.broker: Broker | None = None
+        self._friends: OrderedDict[int, frozenset[int]] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._friends)
+
+    def cached(self, user_id: int) -> frozenset[int] | None:
+        with self._lock:
+            friends = self._friends.get(user_id)
+            if friends is not None:
+                self._friends.move_to_end(user_id)
+            return friends
+
+    def _store(self, user_id: int, friends: frozenset[int], generation: int) -> frozenset[int]:
+        with self._lock:
+            if generation == self._generation:
+                self._friends[user_id] = friends
+                while len(self._friends) > self.size:
+                    self._friends.popitem(last=False)
+        return friends
+
+    def friends(self, db: Session, user_id: int) -> frozenset[int]:
+        friends = self.cached(user_id)
+        if friends is None:
+            generation = self._generation
+            friends = self._store(user_id, frozenset(db.scalars(_friends_statement(user_id))), generation)
+        return friends
+
+    async def friends_async(self, db: AsyncSession, user_id: int) -> frozenset[int]:
+        friends = self.cached(user_id)
+        if friends is None:
+            generation = self._generation
+            friends = self._store(user_id, frozenset(await db.scalars(_friends_statement(user_id))), generation)
+        return friends
+
+    def invalidate(self, *user_ids: int) -> None:
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._friends.pop(user_id, None)
+
+    def apply(self, message: bytes) -> None:
+        """Broker handler for FRIEND_GRAPH_CHANNEL."""
+        try:
+            user_ids = json.loads(message)
+        except ValueError:
+            return
+        self.invalidate(*user_ids)
+
+    def publish(self, *user_ids: int) -> None:
+        """
+        Drop the entries of both ends of a committed accept or remove on every
+        worker (this one included). Called from sync endpoints, which run in a
+        worker thread.
+        """
+        self.invalidate(*user_ids)
+        if self.broker is not None:
+            try:
+                anyio.from_thread.run(self.broker.publish, FRIEND_GRAPH_CHANNEL, json.dumps(user_ids).encode())
+            except Exception:
+                pass
+
+
+friend_graph = FriendGraph()
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import struct
+
+import chess
+
+
+# One ply = 16-bit move (from | to << 6 | promotion << 12) + 16-bit mover clock in deciseconds.
+PLY_STRUCT = struct.Struct(">HH")
+PLY_SIZE = PLY_STRUCT.size
+MAX_CLOCK_DS = 0xFFFF
+
+
+def encode_move(move: chess.Move) -> int:
+    promotion = move.promotion - 1 if move.promotion else 0
+    return move.from_square | (move.to_square << 6) | (promotion << 12)
+
+
+def decode_move(value: int) -> chess.Move:
+    promotion = (value >> 12) & 0x7
+    return chess.Move(value & 0x3F, (value >> 6) & 0x3F, promotion + 1 if promotion else None)
+
+
+def pack_plies(moves: list[chess.Move], clocks_ms: list[int]) -> bytes:
+    out = bytearray(PLY_SIZE * len(moves))
+    for index, (move, clock_ms) in enumerate(zip(moves, clocks_ms)):
+        PLY_STRUCT.pack_into(out, index * PLY_SIZE, encode_move(move), min(MAX_CLOCK_DS, max(0, clock_ms) // 100))
+    return bytes(out)
+
+
+def decode_record(start_fen: str | None, data: bytes) -> tuple[chess.Board, list[int]]:
+    """Replay a packed record onto its start position: the board keeps its full move stack."""
+    board = chess.Board(start_fen) if start_fen else chess.Board()
+    clocks_ms: list[int] = []
+    for move_value, clock_ds in PLY_STRUCT.iter_unpack(data):
+        board.push(decode_move(move_value))
+        clocks_ms.append(clock_ds * 100)
+    return board, clocks_ms
+
+
+def pending_chunk(room) -> dict | None:
+    """Bind parameters for the plies of a room not yet in its record, or None when up to date."""
+    plies = len(room.board.move_stack)
+    start = room.recorded_plies
+    if plies <= start:
+        return None
+
+    return {
+        "b_id": room.game_id,
+        "b_start_fen": room.start_fen,
+        "b_data": pack_plies(room.board.move_stack[start:], room.move_clocks[start:]),
+        "b_from": start,
+        "b_to": plies,
+    }
+
+
+def split_chunks(chunks: list[dict]) -> tuple[list[dict], list[dict]]:
+    """(chunks that create a record, chunks appended to an existing one)."""
+    inserts = [chunk for chunk in chunks if chunk["b_from"] == 0]
+    appends = [chunk for chunk in chunks if chunk["b_from"] > 0]
+    return inserts, appends
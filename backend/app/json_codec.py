@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JsonEncoder = Callable[[Any], str]
+
+
+def encode_stdlib(payload: Any) -> str:
+    # Same output as Starlette's WebSocket.send_json.
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode_orjson(payload: Any) -> str:
+    return orjson.dumps(payload).decode("utf-8")
+
+
+def default_encoder() -> JsonEncoder:
+    """Fastest available encoder: orjson when installed, the stdlib otherwise."""
+    return encode_orjson if orjson is not None else encode_stdlib
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from itertools import islice
+from typing import Iterable, Iterator
+
+import anyio
+
+from app.broker import Broker
+from app.json_codec import default_encoder
+from app.rank_index import RatingIndex
+
+
+LEADERBOARD_CHANNEL = "leaderboard"
+
+_encode = default_encoder()
+
+
+def encode_ratings(rows: Iterable[tuple[int, str, str | None, int | None]]) -> bytes:
+    """Broker message for apply(): (id, username, display_name, elo) of rated players, elo None for a rename."""
+    return json.dumps([list(row) for row in rows], separators=(",", ":")).encode()
+
+
+def body_etag(body: str) -> str:
+    return '"' + hashlib.blake2b(body.encode(), digest_size=12).hexdigest() + '"'
+
+
+def _without(entries: Iterator[tuple[int, int]], user_id: int) -> Iterator[tuple[int, int]]:
+    return (entry for entry in entries if entry[0] != user_id)
+
+
+class Leaderboard:
+    """
+    Every player's Elo in memory, ordered by a RatingIndex.
+
+    Built once at startup from users ordered by elo, then kept current from
+    registrations, renames and the ratings _apply_elo commits (through the
+    broker, so every worker sees them). Top N, a player's rank (1 + players rated higher) and the players
+    around them are O(log n) each instead of an ORDER BY or a COUNT(*).
+    The first `top_size` rows are cached as encoded JSON with an ETag and
+    only re-rendered when a rating change or rename reaches them; players
+    sharing a rating are listed by id at load, and after later arrivals.
+    """
+
+    def __init__(self, top_size: int = 100) -> None:
+        self.top_size = top_size
+        self._index = RatingIndex()
+        self._names: dict[int, tuple[str, str | None]] = {}
+        # limit -> (etag, body) of top(limit), dropped whenever the top rows change.
+        self._top: dict[int, tuple[str, str]] = {}
+        self.broker: Broker | None = None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def load(self, rows: Iterable[tuple[int, str, str | None, int]]) -> None:
+        """Replace the board with (id, username, display_name, elo) rows, highest elo first."""
+        self._index = RatingIndex()
+        self._names = {}
+        for user_id, username, display_name, elo in rows:
+            self._index.add(user_id, elo)
+            self._names[user_id] = (username, display_name)
+        self._top.clear()
+
+    def _in_top(self, elo: int | None) -> bool:
+        return elo is not None and self._index.count_above(elo) < self.top_size
+
+    def set(self, user_id: int, username: str, display_name: str | None, elo: int) -> None:
+        old = self._index.rating(user_id)
+        if old != elo or self._names.get(user_id) != (username, display_name):
+            touches_top = self._in_top(old)
+            if old != elo:
+                self._index.add(user_id, elo)
+            self._names[user_id] = (username, display_name)
+            if touches_top or self._in_top(elo):
+                self._top.clear()
+
+    def rename(self, user_id: int, display_name: str) -> None:
+        names = self._names.get(user_id)
+        if names is not None:
+            self.set(user_id, names[0], display_name, self._index.rating(user_id))
+
+    def apply(self, message: bytes) -> None:
+        """Broker handler for LEADERBOARD_CHANNEL."""
+        try:
+            rows = json.loads(message)
+        except ValueError:
+            return
+        for user_id, username, display_name, elo in rows:
+            if elo is None:
+                self.rename(user_id, display_name)
+            else:
+                self.set(user_id, username, display_name, elo)
+
+    def publish(self, user_id: int, username: str, display_name: str | None, elo: int | None = None) -> None:
+        """
+        Add a committed registration, or a rename when `elo` is None (the
+        rating is left as the board has it), on every worker (this one
+        included). Called from sync endpoints, which run in a worker thread.
+        """
+        message = encode_ratings([(user_id, username, display_name, elo)])
+        if self.broker is not None:
+            try:
+                anyio.from_thread.run(self.broker.publish, LEADERBOARD_CHANNEL, message)
+                return
+            except Exception:
+                pass
+        self.apply(message)
+
+    def rank(self, elo: int) -> int:
+        """Rank a player rated `elo` has, or would have: 1 + players rated higher."""
+        return self._index.count_above(elo) + 1
+
+    def _rows(self, entries: Iterable[tuple[int, int]]) -> list[dict]:
+        rows = []
+        rank = previous = None
+        for user_id, elo in entries:
+            if elo != previous:
+                rank, previous = self.rank(elo), elo
+            username, display_name = self._names[user_id]
+            rows.append({"id": user_id, "username": username, "display_name": display_name, "elo": elo, "rank": rank})
+        return rows
+
+    def top(self, limit: int) -> tuple[str, str]:
+        """(etag, JSON body) of the `limit` highest rated players."""
+        cached = self._top.get(limit)
+        if cached is None:
+            body = _encode(self._rows(islice(self._index.descending(), limit)))
+            cached = self._top[limit] = (body_etag(body), body)
+        return cached
+
+    def around(self, user_id: int, username: str, display_name: str | None, elo: int, span: int) -> list[dict]:
+        """The `span` players just above a player rated `elo`, the player, then `span` below."""
+        above = self._index.count_above(elo)
+        higher = self._rows(islice(_without(self._index.descending(max(0, above - span)), user_id), min(span, above)))
+        lower = self._rows(islice(_without(self._index.descending(above), user_id), span))
+        me = {"id": user_id, "username": username, "display_name": display_name, "elo": elo, "rank": above + 1}
+        return [*higher, me, *lower]
+
+
+leaderboard = Leaderboard()
@@ -7,15 +7,32 @@ import chess
 from fastapi import FastAPI
 from fastapi import Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth import decode_token
-from app.db import Base, engine
-from app.db import SessionLocal
-from app.models import Game, User
-from app.ai_engine import ai_for_level
-from app.presence import set_offline, set_online
-from app.realtime import realtime_manager
+from app.core_config import settings
+from app.db import Base, async_session, dispose_async_engine, engine
+from app.metrics import metrics
+from app.models import Friendship, Game, GameRecord, User
+from app.persistence import GameStateWriter, write_final_record
+from app.ai_cache import PositionCache
+from app.ai_engine import ENGINE_VERSION
+from app.ai_executor import AIExecutor
+from app.ai_lookup import LookupConfig
+from app.broker import create_broker
+from app.clock import ClockScheduler
+from app.cluster import OWNER_UNAVAILABLE_CLOSE_CODE, Cluster
+from app.friend_graph import FRIEND_GRAPH_CHANNEL, friend_graph
+from app.leaderboard import LEADERBOARD_CHANNEL, encode_ratings, leaderboard
+from app.matchmaking import active_games, matchmaking_engine
+from app.presence import PRESENCE_CHANNEL, presence_hub
+from app.room_lifecycle import RoomReaper
+from app.room_snapshot import RoomSnapshotStore
+from app.user_search import USER_SEARCH_CHANNEL, user_search
+from app.realtime import PROTOCOL_DELTA, PROTOCOL_FULL_SYNC, SERVICE_RESTART_CLOSE_CODE, realtime_manager
 from app.routers import auth, friends, games, matchmaking, users
 
 
@@ -36,9 +53,119 @@ app.add_middleware(
 )
 
 
+ai_cache = None
+if settings.ai_cache_entries > 0 or settings.ai_cache_path:
+    ai_cache = PositionCache(
+        max_entries=settings.ai_cache_entries,
+        ttl_seconds=settings.ai_cache_ttl_seconds,
+        engine_version=ENGINE_VERSION,
+        disk_path=settings.ai_cache_path,
+    )
+    metrics.gauge("ai_cache_entries", "Positions held in the in-memory AI cache", lambda: len(ai_cache))
+    metrics.gauge("ai_cache_memory_bytes", "Approximate size of the in-memory AI cache", lambda: ai_cache.memory_bytes)
+    metrics.gauge("ai_cache_hit_ratio", "AI position cache hits / lookups", lambda: ai_cache.hit_rate)
+
+ai_executor = AIExecutor(
+    workers=settings.ai_workers,
+    budgets_ms={
+        "easy": settings.ai_budget_easy_ms,
+        "medium": settings.ai_budget_medium_ms,
+        "hard": settings.ai_budget_hard_ms,
+    },
+    lookup_config=LookupConfig(
+        book_path=settings.ai_book_path,
+        syzygy_dir=settings.ai_syzygy_dir,
+        endgame_max_pieces=settings.ai_endgame_max_pieces,
+        book_plies={
+            "easy": settings.ai_book_plies_easy,
+            "medium": settings.ai_book_plies_medium,
+            "hard": settings.ai_book_plies_hard,
+        },
+        book_variety={
+            "easy": settings.ai_book_variety_easy,
+            "medium": settings.ai_book_variety_medium,
+            "hard": settings.ai_book_variety_hard,
+        },
+    ),
+    cache=ai_cache,
+)
+
+
+game_writer = GameStateWriter(
+    engine,
+    flush_interval=settings.game_flush_interval_ms / 1000,
+    max_dirty=settings.game_flush_max_dirty,
+)
+
+
+room_snapshots = None
+if settings.room_snapshot_path:
+    room_snapshots = RoomSnapshotStore(settings.room_snapshot_path, interval=settings.room_snapshot_interval_seconds)
+    realtime_manager.snapshots = room_snapshots
+
+
+cluster = Cluster(
+    create_broker(settings.broker_url),
+    realtime_manager,
+    worker_id=settings.worker_id or None,
+    lease_seconds=settings.room_lease_seconds,
+)
+realtime_manager.cluster = cluster
+leaderboard.broker = cluster.broker
+user_search.broker = cluster.broker
+friend_graph.broker = cluster.broker
+friend_graph.size = settings.friend_graph_cache_size
+presence_hub.cluster = cluster
+active_games.ttl = settings.matchmaking_active_game_ttl_seconds
+matchmaking_engine.window_base = settings.matchmaking_elo_window_base
+matchmaking_engine.window_per_second = settings.matchmaking_elo_window_per_second
+matchmaking_engine.window_max = settings.matchmaking_elo_window_max
+matchmaking_engine.interval = settings.matchmaking_pass_interval_seconds
+
+
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that exist; indexes added to them later are created here.
+    for index in (*User.__table__.indexes, *Friendship.__table__.indexes):
+        index.create(bind=engine, checkfirst=True)
+    if room_snapshots is not None:
+        room_snapshots.load()
+        room_snapshots.start(realtime_manager.rooms)
+    await cluster.start(_serve_game, _room_state, on_adopt=_on_room_adopted)
+    async with async_session() as db:
+        result = await db.execute(
+            select(User.id, User.username, User.display_name, User.elo).order_by(User.elo.desc(), User.id)
+        )
+        leaderboard.load(result.all())
+        result = await db.execute(
+            select(User.id, User.username, User.display_name).where(User.is_active.is_(True)).order_by(User.id)
+        )
+        user_search.load(result.all())
+    await cluster.broker.subscribe(LEADERBOARD_CHANNEL, leaderboard.apply)
+    await cluster.broker.subscribe(USER_SEARCH_CHANNEL, user_search.apply)
+    await cluster.broker.subscribe(FRIEND_GRAPH_CHANNEL, friend_graph.apply)
+    await cluster.broker.subscribe(PRESENCE_CHANNEL, presence_hub.apply)
+    await presence_hub.request_sync()
+    room_reaper.start()
+    matchmaking_engine.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    matchmaking_engine.close()
+    room_reaper.close()
+    await cluster.broker.unsubscribe(LEADERBOARD_CHANNEL)
+    await cluster.broker.unsubscribe(USER_SEARCH_CHANNEL)
+    await cluster.broker.unsubscribe(FRIEND_GRAPH_CHANNEL)
+    await cluster.broker.unsubscribe(PRESENCE_CHANNEL)
+    if room_snapshots is not None:
+        room_snapshots.snapshot_all(realtime_manager.rooms())
+    await game_writer.close()
+    # Rooms are handed to their next owner once their state is written.
+    await cluster.close()
+    ai_executor.shutdown()
+    await dispose_async_engine()
 
 
 @app.get("/health")
@@ -46,6 +173,12 @@ def healthcheck():
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    # On the loop, not the threadpool: gauge callbacks walk rooms and sockets the loop mutates.
+    return metrics.render()
+
+
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(users.router, prefix="/api/v1")
 app.include_router(friends.router, prefix="/api/v1")
@@ -60,8 +193,9 @@ async def websocket_presence(websocket: WebSocket, token: str | None = Query(def
     Global presence heartbeat.
     The frontend opens this socket as soon as the user is authenticated and
     keeps it open for the entire session. No game logic happens here – it
-    only drives set_online / set_offline so the Friends list reflects the
-    real app-level presence rather than just in-game presence.
+    registers the socket with presence_hub, which reports the user online
+    while any of their presence sockets is open and pushes online/offline
+    changes of their friends down this socket.
     """
     if not token:
         await websocket.close(code=1008, reason="Missing token")
@@ -77,7 +211,9 @@ async def websocket_presence(websocket: WebSocket, token: str | None = Query(def
         return
 
     await websocket.accept()
-    set_online(user_id)
+    async with async_session() as db:
+        friends = await friend_graph.friends_async(db, user_id)
+    await presence_hub.connect(user_id, websocket, friends)
     try:
         while True:
             try:
@@ -88,7 +224,14 @@ async def websocket_presence(websocket: WebSocket, token: str | None = Query(def
             except (WebSocketDisconnect, RuntimeError):
                 break
     finally:
-        set_offline(user_id)
+        # Re-read: friendships accepted or removed meanwhile dropped the cached set.
+        try:
+            async with async_session() as db:
+                friends = await friend_graph.friends_async(db, user_id)
+        except Exception:
+            # The socket is released regardless; the friends read at connect hear the change.
+            pass
+        await presence_hub.disconnect(user_id, websocket, friends)
 
 
 DISCONNECT_GRACE_SECONDS = 30
@@ -163,16 +306,17 @@ def _expected_score(rating_a: int, rating_b: int) -> float:
     return 1.0 / (1.0 + math.pow(10, (rating_b - rating_a) / 400.0))
 
 
-def _apply_elo(db, game: Game, result: str) -> None:
+async def _apply_elo(db: AsyncSession, game: Game, result: str) -> tuple[User, ...]:
+    """Update both players' Elo in the session; returns the rated users (none for AI or incomplete games)."""
     if _is_ai_mode(game):
-        return
+        return ()
 
     if game.white_id is None:
-        return
+        return ()
 
-    white = db.get(User, game.white_id)
+    white = await db.get(User, game.white_id)
     if white is None:
-        return
+        return ()
 
     k_factor = 32
     if result == "white_win":
@@ -183,11 +327,11 @@ def _apply_elo(db, game: Game, result: str) -> None:
         score_white = 0.5
 
     if game.black_id is None:
-        return
+        return ()
 
-    black = db.get(User, game.black_id)
+    black = await db.get(User, game.black_id)
     if black is None:
-        return
+        return ()
 
     expected_white = _expected_score(white.elo, black.elo)
     expected_black = _expected_score(black.elo, white.elo)
@@ -197,22 +341,41 @@ def _apply_elo(db, game: Game, result: str) -> None:
     black.elo = max(100, int(round(black.elo + k_factor * (score_black - expected_black))))
     db.add(white)
     db.add(black)
+    return white, black
 
 
-def _finish_game(db, game: Game, room, result: str, reason: str) -> dict:
+async def _publish_ratings(users: tuple[User, ...]) -> None:
+    """Send committed ratings to the leaderboard of every worker (this one included)."""
+    message = encode_ratings((user.id, user.username, user.display_name, user.elo) for user in users)
+    try:
+        await cluster.broker.publish(LEADERBOARD_CHANNEL, message)
+    except Exception:
+        leaderboard.apply(message)
+
+
+async def _finish_game(db: AsyncSession, game: Game, room, result: str, reason: str) -> dict:
     room.finished = True
+    ai_executor.cancel(game.id)
+    game_writer.discard(game.id)
     game.status = "finished"
     game.result = result
     game.ended_at = datetime.utcnow()
     game.final_fen = room.board.fen()
     game.move_count = len(room.board.move_stack)
-    _apply_elo(db, game, result)
+    rated = await _apply_elo(db, game, result)
     db.add(game)
-    db.commit()
+    async with game_writer.lock:
+        recorded = await write_final_record(db, room)
+        await db.commit()
+        if recorded is not None:
+            room.recorded_plies = recorded
+    active_games.finished(game)
+    if rated:
+        await _publish_ratings(rated)
 
     winner = None
     if result == "white_win" and game.white_id is not None:
-        white = db.get(User, game.white_id)
+        white = await db.get(User, game.white_id)
         winner = {
             "id": game.white_id,
             "username": white.username if white else "unknown",
@@ -221,7 +384,7 @@ def _finish_game(db, game: Game, room, result: str, reason: str) -> dict:
         if game.black_id is None and _is_ai_mode(game):
             winner = {"id": None, "username": "ai"}
         elif game.black_id is not None:
-            black = db.get(User, game.black_id)
+            black = await db.get(User, game.black_id)
             winner = {
                 "id": game.black_id,
                 "username": black.username if black else "unknown",
@@ -236,52 +399,42 @@ def _finish_game(db, game: Game, room, result: str, reason: str) -> dict:
     }
 
 
-async def _clock_loop(game_id: int):
-    while True:
-        await asyncio.sleep(CLOCK_TICK_SECONDS)
-        room = realtime_manager.get_room(game_id)
-        if room is None:
-            return
-
-        db = SessionLocal()
-        try:
-            game = db.get(Game, game_id)
-            if game is None or game.status == "finished":
-                if room:
-                    room.finished = True
-                return
+async def _on_clock_tick(room) -> None:
+    if realtime_manager.get_connected_count(room.game_id) == 0:
+        return
+    await realtime_manager.broadcast(
+        room.game_id,
+        {"type": "CLOCK_TICK", "clocks": room.clocks_payload()},
+        delta=room.clock_delta(),
+    )
 
-            now = datetime.utcnow()
-            elapsed_ms = int((now - room.last_clock_ts).total_seconds() * 1000)
-            room.last_clock_ts = now
 
-            if elapsed_ms <= 0:
-                continue
+async def _on_clock_flag(room) -> None:
+    game_id = room.game_id
+    async with async_session() as db:
+        game = await db.get(Game, game_id)
+        if game is None or game.status == "finished":
+            room.finished = True
+            return
 
-            if room.board.turn == chess.WHITE:
-                room.white_ms = max(0, room.white_ms - elapsed_ms)
-            else:
-                room.black_ms = max(0, room.black_ms - elapsed_ms)
+        await realtime_manager.broadcast(
+            game_id,
+            {"type": "CLOCK_TICK", "clocks": room.clocks_payload()},
+            delta=room.clock_delta(),
+        )
+        result = "black_win" if room.white_ms <= 0 else "white_win"
+        game_over_payload = await _finish_game(db, game, room, result, "timeout")
 
-            if room.finished:
-                return
+    await realtime_manager.broadcast(game_id, {"type": "STATE_SYNC", "state": room.to_payload()})
+    await realtime_manager.broadcast(game_id, game_over_payload)
 
-            await realtime_manager.broadcast(game_id, {"type": "CLOCK_TICK", "clocks": room.to_payload()["clocks"]})
 
-            if room.white_ms <= 0 or room.black_ms <= 0:
-                result = "black_win" if room.white_ms <= 0 else "white_win"
-                game_over_payload = _finish_game(db, game, room, result, "timeout")
-                await realtime_manager.broadcast(game_id, {"type": "STATE_SYNC", "state": room.to_payload()})
-                await realtime_manager.broadcast(game_id, game_over_payload)
-                return
-        except Exception:
-            # Prevent unhandled task exceptions from crashing noisy rooms during transient DB pressure.
-            return
-        finally:
-            try:
-                db.close()
-            except Exception:
-                pass
+clock_scheduler = ClockScheduler(
+    realtime_manager.get_room,
+    on_tick=_on_clock_tick,
+    on_flag=_on_clock_flag,
+    tick_seconds=CLOCK_TICK_SECONDS,
+)
 
 
 async def _forfeit_if_not_reconnected(game_id: int, disconnected_user_id: int):
@@ -293,9 +446,8 @@ async def _forfeit_if_not_reconnected(game_id: int, disconnected_user_id: int):
     if room is None:
         return
 
-    db = SessionLocal()
-    try:
-        game = db.get(Game, game_id)
+    async with async_session() as db:
+        game = await db.get(Game, game_id)
         if game is None or game.status == "finished":
             return
 
@@ -303,14 +455,9 @@ async def _forfeit_if_not_reconnected(game_id: int, disconnected_user_id: int):
             return
 
         result = "black_win" if disconnected_user_id == game.white_id else "white_win"
-        game_over_payload = _finish_game(db, game, room, result, "disconnect_forfeit")
-        await realtime_manager.broadcast(game_id, {"type": "STATE_SYNC", "state": room.to_payload()})
-        await realtime_manager.broadcast(game_id, game_over_payload)
-    finally:
-        try:
-            db.close()
-        except Exception:
-            pass
+        game_over_payload = await _finish_game(db, game, room, result, "disconnect_forfeit")
+    await realtime_manager.broadcast(game_id, {"type": "STATE_SYNC", "state": room.to_payload()})
+    await realtime_manager.broadcast(game_id, game_over_payload)
 
 
 async def _process_ai_move(game_id: int, game_mode: str):
@@ -319,9 +466,8 @@ async def _process_ai_move(game_id: int, game_mode: str):
         return
         
     think_start = perf_counter()
-    ai = ai_for_level(_ai_level_from_mode(game_mode))
     board_copy = room.board.copy()
-    ai_move = await asyncio.to_thread(ai.choose_move, board_copy)
+    ai_move = await ai_executor.choose_move(game_id, board_copy, _ai_level_from_mode(game_mode))
 
     if room.finished:
         return
@@ -343,16 +489,10 @@ async def _process_ai_move(game_id: int, game_mode: str):
 
     if room.black_ms <= 0:
         game_over_payload = None
-        event_db = SessionLocal()
-        try:
-            game = event_db.get(Game, game_id)
+        async with async_session() as event_db:
+            game = await event_db.get(Game, game_id)
             if game and game.status != "finished":
-                game_over_payload = _finish_game(event_db, game, room, "white_win", "timeout")
-        finally:
-            try:
-                event_db.close()
-            except Exception:
-                pass
+                game_over_payload = await _finish_game(event_db, game, room, "white_win", "timeout")
 
         await realtime_manager.broadcast(game_id, {"type": "STATE_SYNC", "state": room.to_payload()})
         if game_over_payload:
@@ -360,39 +500,70 @@ async def _process_ai_move(game_id: int, game_mode: str):
         return
 
     if ai_move is not None:
-        room.board.push(ai_move)
+        room.push_move(ai_move)
         room.last_clock_ts = datetime.utcnow()
-        next_fen = room.board.fen()
-        next_move_count = len(room.board.move_stack)
-        
+        clock_scheduler.schedule(game_id)
+
         game_over_payload = None
-        event_db = SessionLocal()
-        try:
-            game = event_db.get(Game, game_id)
-            if game and game.status != "finished":
-                game.status = "playing"
-                game.final_fen = next_fen
-                game.move_count = next_move_count
-                
-                if room.board.is_game_over(claim_draw=True):
+        if room.board.is_game_over(claim_draw=True):
+            async with async_session() as event_db:
+                game = await event_db.get(Game, game_id)
+                if game and game.status != "finished":
                     result, reason = _game_result_from_board(room.board)
-                    game_over_payload = _finish_game(event_db, game, room, result, reason)
-                else:
-                    event_db.add(game)
-                    event_db.commit()
-        finally:
-            try:
-                event_db.close()
-            except Exception:
-                pass
-                
-        await realtime_manager.broadcast(game_id, {"type": "STATE_SYNC", "state": room.to_payload()})
+                    game_over_payload = await _finish_game(event_db, game, room, result, reason)
+        else:
+            game_writer.mark_dirty(room)
+
+        await realtime_manager.broadcast(
+            game_id,
+            {"type": "STATE_SYNC", "state": room.to_payload()},
+            delta=room.move_delta(),
+        )
         if game_over_payload:
             await realtime_manager.broadcast(game_id, game_over_payload)
 
 
+async def _room_state(game_id: int) -> dict | None:
+    async with async_session() as db:
+        game = await db.get(Game, game_id)
+        if game is None:
+            return None
+        return await games.load_room_state(db, game)
+
+
+def _on_room_adopted(room) -> None:
+    clock_scheduler.schedule(room.game_id)
+    # Plies the previous owner had not written yet.
+    game_writer.mark_dirty(room)
+
+
+def _on_room_evicted(room) -> None:
+    clock_scheduler.cancel(room.game_id)
+    ai_executor.cancel(room.game_id)
+    if room_snapshots is not None:
+        room_snapshots.forget(room.game_id)
+
+
+room_reaper = RoomReaper(
+    realtime_manager,
+    finished_ttl=settings.room_finished_ttl_seconds,
+    idle_ttl=settings.room_idle_ttl_seconds,
+    max_rooms=settings.room_max_resident,
+    interval=settings.room_sweep_interval_seconds,
+    # Unwritten plies would be lost with the room.
+    pinned=lambda room: game_writer.is_pending(room.game_id),
+    on_evict=_on_room_evicted,
+)
+metrics.gauge("realtime_room_bytes", "Approximate heap bytes per resident room (sampled)", room_reaper.average_room_bytes)
+
+
 @app.websocket("/ws/{game_id}")
-async def websocket_game(game_id: int, websocket: WebSocket, token: str | None = Query(default=None)):
+async def websocket_game(
+    game_id: int,
+    websocket: WebSocket,
+    token: str | None = Query(default=None),
+    protocol: int = Query(default=PROTOCOL_FULL_SYNC),
+):
     if not token:
         await websocket.close(code=1008, reason="Missing token")
         return
@@ -406,9 +577,27 @@ async def websocket_game(game_id: int, websocket: WebSocket, token: str | None =
         await websocket.close(code=1008, reason="Invalid token")
         return
 
-    init_db = SessionLocal()
     try:
-        game = init_db.get(Game, game_id)
+        owner = await cluster.owner_of(game_id)
+    except ConnectionError:
+        await websocket.close(code=OWNER_UNAVAILABLE_CLOSE_CODE, reason="Room owner unavailable")
+        return
+
+    if owner != cluster.worker_id:
+        await cluster.relay(owner, game_id, user_id, websocket, protocol)
+        return
+    await _serve_game(game_id, user_id, websocket, protocol)
+
+
+async def _serve_game(game_id: int, user_id: int, websocket: WebSocket, protocol: int):
+    """
+    Run one player's socket in a room this worker owns.
+
+    websocket is either the player's own socket or a RemoteSocket relaying
+    one accepted by another worker.
+    """
+    async with async_session() as init_db:
+        game = await init_db.get(Game, game_id)
         if not game:
             await websocket.close(code=1008, reason="Game not found")
             return
@@ -427,8 +616,8 @@ async def websocket_game(game_id: int, websocket: WebSocket, token: str | None =
         game_finished = game.status == "finished"
         final_fen = game.final_fen
 
-        white_user = init_db.get(User, white_id) if white_id else None
-        black_user = init_db.get(User, black_id) if black_id else None
+        white_user = await init_db.get(User, white_id) if white_id else None
+        black_user = await init_db.get(User, black_id) if black_id else None
 
         def _player_info(u: User | None):
             return {"id": u.id, "username": u.username, "display_name": u.display_name} if u else None
@@ -438,34 +627,42 @@ async def websocket_game(game_id: int, websocket: WebSocket, token: str | None =
         if _is_ai_mode(game) and black_id is None:
             difficulty = _ai_level_from_mode(game_mode)
             black_info = {"id": None, "username": "ai", "display_name": f"AI ({difficulty.capitalize()})"}
-    finally:
-        try:
-            init_db.close()
-        except Exception:
-            pass
+
+        # Both players of a room that is not live often arrive together (reconnect storm): the first
+        # loads it, the second waits on the room's lock and finds it live. Other rooms are not held up.
+        async with realtime_manager.room_lock(game_id):
+            record = None
+            if not realtime_manager.restore_room(game_id, game.move_count):
+                game_record = await init_db.get(GameRecord, game_id)
+                if game_record is not None:
+                    record = (game_record.start_fen, game_record.moves)
+
+            minutes = _time_minutes_from_mode(game_mode)
+            room = realtime_manager.get_or_create_room(
+                game_id,
+                white_id,
+                black_id,
+                final_fen,
+                white_info=white_info,
+                black_info=black_info,
+                initial_ms=minutes * 60 * 1000,
+                time_control_minutes=minutes,
+                is_ai=bool(game_mode and game_mode.startswith("ai:")),
+                finished=game_finished,
+                record=record,
+            )
 
     try:
 
-        was_reconnecting = await realtime_manager.connect(game_id, user_id, websocket)
-        set_online(user_id)
+        protocol = PROTOCOL_DELTA if protocol >= PROTOCOL_DELTA else PROTOCOL_FULL_SYNC
+        was_reconnecting = await realtime_manager.connect(game_id, user_id, websocket, protocol)
+        if realtime_manager.get_room(game_id) is not room:
+            # Handed off or evicted while the socket was being accepted; the client reconnects.
+            await websocket.close(code=SERVICE_RESTART_CLOSE_CODE)
+            return
 
-        minutes = _time_minutes_from_mode(game_mode)
-        room = realtime_manager.get_or_create_room(
-            game_id,
-            white_id,
-            black_id,
-            final_fen,
-            white_info=white_info,
-            black_info=black_info,
-            initial_ms=minutes * 60 * 1000,
-            time_control_minutes=minutes,
-            is_ai=bool(game_mode and game_mode.startswith("ai:")),
-            finished=game_finished,
-        )
         room.last_clock_ts = datetime.utcnow()
-
-        if room.clock_task is None or room.clock_task.done():
-            room.clock_task = asyncio.create_task(_clock_loop(game_id))
+        clock_scheduler.schedule(game_id)
 
         await realtime_manager.send_personal(websocket, {"type": "STATE_SYNC", "state": room.to_payload()})
         await realtime_manager.broadcast(game_id, {"type": "PRESENCE", "user_id": user_id, "online": True})
@@ -487,6 +684,11 @@ async def websocket_game(game_id: int, websocket: WebSocket, token: str | None =
                 # Starlette can raise RuntimeError on abrupt disconnects before WebSocketDisconnect.
                 break
 
+            if realtime_manager.get_room(game_id) is not room:
+                # The room moved to another worker; the client reconnects to it.
+                await websocket.close(code=SERVICE_RESTART_CLOSE_CODE)
+                break
+
             event_type = incoming.get("type")
 
             if event_type == "STATE_SYNC_REQ":
@@ -494,9 +696,8 @@ async def websocket_game(game_id: int, websocket: WebSocket, token: str | None =
                 continue
 
             if event_type == "RESIGN":
-                event_db = SessionLocal()
-                try:
-                    game = event_db.get(Game, game_id)
+                async with async_session() as event_db:
+                    game = await event_db.get(Game, game_id)
                     if not game or game.status == "finished" or room.finished:
                         room.finished = True
                         continue
@@ -505,12 +706,7 @@ async def websocket_game(game_id: int, websocket: WebSocket, token: str | None =
                         result = "black_win"
                     else:
                         result = "white_win"
-                    game_over_payload = _finish_game(event_db, game, room, result, "resign")
-                finally:
-                    try:
-                        event_db.close()
-                    except Exception:
-                        pass
+                    game_over_payload = await _finish_game(event_db, game, room, result, "resign")
 
                 await realtime_manager.broadcast(game_id, {"type": "STATE_SYNC", "state": room.to_payload()})
                 await realtime_manager.broadcast(game_id, game_over_payload)
@@ -537,9 +733,7 @@ async def websocket_game(game_id: int, websocket: WebSocket, token: str | None =
                     "message": text,
                     "at": datetime.utcnow().isoformat() + "Z",
                 }
-                room.chat_messages.append(message)
-                if len(room.chat_messages) > 100:
-                    room.chat_messages = room.chat_messages[-100:]
+                room.add_chat_message(message)
                 await realtime_manager.broadcast(game_id, {"type": "CHAT_MESSAGE", "payload": message})
                 continue
 
@@ -547,32 +741,34 @@ async def websocket_game(game_id: int, websocket: WebSocket, token: str | None =
                 if room.is_ai:
                     await realtime_manager.send_personal(websocket, {"type": "ERROR", "message": "Cannot offer draw to AI"})
                     continue
-                room.draw_offered_by = user_id
-                await realtime_manager.broadcast(game_id, {"type": "STATE_SYNC", "state": room.to_payload()})
+                room.set_draw_offer(user_id)
+                await realtime_manager.broadcast(
+                    game_id,
+                    {"type": "STATE_SYNC", "state": room.to_payload()},
+                    delta=room.draw_delta(),
+                )
                 continue
 
             if event_type == "DRAW_ACCEPT":
                 if room.draw_offered_by and room.draw_offered_by != user_id:
-                    event_db = SessionLocal()
-                    try:
-                        game = event_db.get(Game, game_id)
+                    async with async_session() as event_db:
+                        game = await event_db.get(Game, game_id)
                         if not game or game.status == "finished" or room.finished:
                             room.finished = True
                             continue
-                        game_over_payload = _finish_game(event_db, game, room, "draw", "mutual_agreement")
-                    finally:
-                        try:
-                            event_db.close()
-                        except Exception:
-                            pass
+                        game_over_payload = await _finish_game(event_db, game, room, "draw", "mutual_agreement")
                     await realtime_manager.broadcast(game_id, {"type": "STATE_SYNC", "state": room.to_payload()})
                     await realtime_manager.broadcast(game_id, game_over_payload)
                 continue
 
             if event_type == "DRAW_DECLINE":
                 if room.draw_offered_by and room.draw_offered_by != user_id:
-                    room.draw_offered_by = None
-                    await realtime_manager.broadcast(game_id, {"type": "STATE_SYNC", "state": room.to_payload()})
+                    room.set_draw_offer(None)
+                    await realtime_manager.broadcast(
+                        game_id,
+                        {"type": "STATE_SYNC", "state": room.to_payload()},
+                        delta=room.draw_delta(),
+                    )
                 continue
 
             if event_type != "MOVE_SUBMIT":
@@ -612,11 +808,10 @@ async def websocket_game(game_id: int, websocket: WebSocket, token: str | None =
                 await realtime_manager.send_personal(websocket, {"type": "MOVE_REJECTED", "reason": "Illegal move"})
                 continue
 
-            room.board.push(move)
+            room.settle_clock()
+            room.push_move(move)
             room.draw_offered_by = None
-            room.last_clock_ts = datetime.utcnow()
-            next_fen = room.board.fen()
-            next_move_count = len(room.board.move_stack)
+            clock_scheduler.schedule(game_id)
 
             should_sync_before_ai = room.is_ai and not room.finished and room.board.turn == chess.BLACK
             if should_sync_before_ai:
@@ -626,45 +821,39 @@ async def websocket_game(game_id: int, websocket: WebSocket, token: str | None =
                         "type": "STATE_SYNC",
                         "state": room.to_payload(),
                     },
+                    delta=room.move_delta(),
                 )
 
             if should_sync_before_ai:
                 asyncio.create_task(_process_ai_move(game_id, game_mode))
 
+            # The room is authoritative while it is live: in-progress state is written behind,
+            # only a game-ending move commits synchronously.
             game_over_payload = None
-            event_db = SessionLocal()
-            try:
-                game = event_db.get(Game, game_id)
-                if not game or game.status == "finished":
-                    room.finished = True
-                    await realtime_manager.send_personal(
-                        websocket,
-                        {"type": "MOVE_REJECTED", "reason": "Game finished"},
-                    )
-                    continue
-
-                game.status = "playing"
-                game.final_fen = next_fen
-                game.move_count = next_move_count
+            if room.board.is_game_over(claim_draw=True):
+                async with async_session() as event_db:
+                    game = await event_db.get(Game, game_id)
+                    if not game or game.status == "finished":
+                        room.finished = True
+                        await realtime_manager.send_personal(
+                            websocket,
+                            {"type": "MOVE_REJECTED", "reason": "Game finished"},
+                        )
+                        continue
 
-                if room.board.is_game_over(claim_draw=True):
                     result, reason = _game_result_from_board(room.board)
-                    game_over_payload = _finish_game(event_db, game, room, result, reason)
-                else:
-                    event_db.add(game)
-                    event_db.commit()
-            finally:
-                try:
-                    event_db.close()
-                except Exception:
-                    pass
+                    game_over_payload = await _finish_game(event_db, game, room, result, reason)
+            else:
+                game_writer.mark_dirty(room)
 
+            # Protocol 2 clients already saw this seq before the AI started thinking; they drop duplicates.
             await realtime_manager.broadcast(
                 game_id,
                 {
                     "type": "STATE_SYNC",
                     "state": room.to_payload(),
                 },
+                delta=room.move_delta(),
             )
 
             if game_over_payload:
@@ -692,5 +881,4 @@ async def websocket_game(game_id: int, websocket: WebSocket, token: str | None =
             )
             room = realtime_manager.get_room(game_id)
             if room:
-                room.disconnect_started_at[user_id] = datetime.utcnow()
-                room.disconnect_tasks[user_id] = asyncio.create_task(_forfeit_if_not_reconnected(game_id, user_id))
+                room.start_disconnect_grace(user_id, asyncio.create_task(_forfeit_if_not_reconnected(game_id, user_id)))
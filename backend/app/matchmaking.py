@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from random import shuffle
+from typing import Awaitable, Callable
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import async_session
+from app.metrics import metrics
+from app.models import Game
+from app.rank_index import RatingIndex
+
+
+TIME_CONTROLS = (5, 10, 30)
+
+matches_formed = metrics.counter("matchmaking_matches_total", "1v1 games created by matchmaking")
+queue_wait_seconds = metrics.histogram(
+    "matchmaking_wait_seconds",
+    "Time a player spent queued before being matched",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+rating_spread = metrics.histogram(
+    "matchmaking_rating_spread",
+    "Elo difference between the two players of a match",
+    buckets=(10, 25, 50, 100, 200, 400, 800),
+)
+
+
+class _Ticket:
+    __slots__ = ("user_id", "minutes", "rating", "seq", "queued_at")
+
+    def __init__(self, user_id: int, minutes: int, rating: int, seq: int, queued_at: float) -> None:
+        self.user_id = user_id
+        self.minutes = minutes
+        self.rating = rating
+        # 0 for a player paired on join, who never waited in the queue;
+        # negative for one put back at the head by unpair().
+        self.seq = seq
+        self.queued_at = queued_at
+
+
+class ActiveGameCache:
+    """
+    user id -> id of the game the user is still playing, or None.
+
+    Answers the "already have an active game" check of the lobby without a
+    query per request. Entries expire after `ttl` seconds so games created
+    or finished on another worker are picked up. A cached game id is always
+    re-checked against Postgres, so a stale entry can only cost a query,
+    never block a player whose game already ended.
+    """
+
+    def __init__(self, ttl: float = 30.0) -> None:
+        self.ttl = ttl
+        self._entries: dict[int, tuple[int | None, float]] = {}
+        self._next_prune = time.monotonic() + ttl
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def set(self, user_id: int | None, game_id: int | None) -> None:
+        if user_id is not None:
+            self._entries[user_id] = (game_id, time.monotonic() + self.ttl)
+
+    def started(self, game: Game) -> None:
+        self.set(game.white_id, game.id)
+        self.set(game.black_id, game.id)
+
+    def finished(self, game: Game) -> None:
+        self.set(game.white_id, None)
+        self.set(game.black_id, None)
+
+    async def get(self, db: AsyncSession, user_id: int) -> int | None:
+        now = time.monotonic()
+        if now >= self._next_prune:
+            self._prune(now)
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[1] > now and entry[0] is None:
+            return None
+
+        game_id = await db.scalar(
+            select(Game.id)
+            .where(or_(Game.white_id == user_id, Game.black_id == user_id), Game.status != "finished")
+            .limit(1)
+        )
+        self.set(user_id, game_id)
+        return game_id
+
+    def _prune(self, now: float) -> None:
+        self._next_prune = now + self.ttl
+        for user_id in [user_id for user_id, (_, expires) in self._entries.items() if expires <= now]:
+            del self._entries[user_id]
+
+
+class MatchmakingEngine:
+    """
+    In-process 1v1 queues, one per time control, matched by Elo.
+
+    Each queue is an OrderedDict (hash index over a linked list) in arrival
+    order, plus a RatingIndex over the same players; a sorted list of ticket
+    sequence numbers gives the queue position by bisection. A player is
+    matched with the nearest rated opponent whose distance fits the
+    acceptable window of the longer waiting of the two; windows start at
+    window_base and widen by window_per_second of waiting up to window_max.
+    A join is matched on the spot if such an opponent is queued, and
+    otherwise by match_pass(), which runs every `interval` seconds over the
+    queue oldest first at O(log n) per player.
+
+    Every method except start_game() runs to completion on the event loop
+    without awaiting, which is what keeps the queues consistent; between a
+    pairing and matched()/unpair() the two players are held in a pairing
+    state while create_game writes the row. Players waiting in wait() are
+    woken as soon as their status changes instead of polling for it.
+    """
+
+    def __init__(
+        self,
+        time_controls: tuple[int, ...] = TIME_CONTROLS,
+        *,
+        window_base: int = 50,
+        window_per_second: float = 10.0,
+        window_max: int = 400,
+        interval: float = 1.0,
+        create_game: Callable[[int, int, int], Awaitable[int]] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.window_base = window_base
+        self.window_per_second = window_per_second
+        self.window_max = window_max
+        self.interval = interval
+        self.create_game = create_game
+        self._clock = clock
+        self._queues: dict[int, OrderedDict[int, _Ticket]] = {minutes: OrderedDict() for minutes in time_controls}
+        self._ratings: dict[int, RatingIndex] = {minutes: RatingIndex() for minutes in time_controls}
+        self._positions: dict[int, list[int]] = {minutes: [] for minutes in time_controls}
+        self._tickets: dict[int, _Ticket] = {}
+        self._pairing: dict[int, _Ticket] = {}
+        self._matched: dict[int, int] = {}
+        self._waiters: dict[int, list[asyncio.Future]] = {}
+        self._seq = 0
+        # Decremented for each player put back at the head, so it never reaches 0.
+        self._head_seq = 0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def queued_count(self) -> int:
+        return len(self._tickets)
+
+    def queue_length(self, minutes: int) -> int:
+        return len(self._queues[minutes])
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                pairs = self.match_pass()
+            except Exception:
+                continue
+            if pairs:
+                await asyncio.gather(*(self._start_quietly(*pair) for pair in pairs))
+
+    async def _start_quietly(self, user_id: int, opponent_id: int, minutes: int) -> None:
+        try:
+            await self.start_game(user_id, opponent_id, minutes)
+        except Exception:
+            pass
+
+    def status(self, user_id: int) -> dict:
+        """Current lobby status; a match is handed out (and forgotten) once."""
+        game_id = self._matched.pop(user_id, None)
+        if game_id is not None:
+            return {"status": "matched", "game_id": game_id}
+
+        ticket = self._tickets.get(user_id)
+        if ticket is not None:
+            position = bisect_left(self._positions[ticket.minutes], ticket.seq) + 1
+            return {"status": "waiting", "position": position, "time_minutes": ticket.minutes}
+
+        ticket = self._pairing.get(user_id)
+        if ticket is not None:
+            return {"status": "waiting", "position": 1, "time_minutes": ticket.minutes}
+        return {"status": "idle"}
+
+    def window(self, ticket: _Ticket, now: float) -> float:
+        """Largest Elo difference `ticket` accepts after waiting until `now`."""
+        waited = now - ticket.queued_at if ticket.seq else 0.0
+        return min(self.window_max, self.window_base + self.window_per_second * waited)
+
+    def _opponent_for(self, ticket: _Ticket, now: float) -> _Ticket | None:
+        opponent_id = self._ratings[ticket.minutes].nearest(ticket.rating, exclude=ticket.user_id)
+        if opponent_id is None:
+            return None
+        opponent = self._tickets[opponent_id]
+        if abs(opponent.rating - ticket.rating) > max(self.window(ticket, now), self.window(opponent, now)):
+            return None
+        return opponent
+
+    def _hold(self, ticket: _Ticket, opponent: _Ticket) -> None:
+        for held in (ticket, opponent):
+            if held.seq:
+                self._remove(held)
+            self._pairing[held.user_id] = held
+        rating_spread.observe(abs(ticket.rating - opponent.rating))
+
+    def pair(self, user_id: int, minutes: int, rating: int) -> int | None:
+        """
+        Take the nearest rated opponent for `minutes` within the window, or queue user_id.
+
+        Returns the opponent id; both players stay in the pairing state until
+        matched() or unpair(). Returns None when the user was queued (or
+        already was, or is already being paired).
+        """
+        if user_id in self._pairing:
+            return None
+        ticket = self._tickets.get(user_id)
+        if ticket is not None:
+            if ticket.minutes == minutes:
+                return None
+            self._remove(ticket)
+
+        now = self._clock()
+        ticket = _Ticket(user_id, minutes, rating, 0, now)
+        opponent = self._opponent_for(ticket, now)
+        if opponent is not None:
+            self._hold(ticket, opponent)
+            return opponent.user_id
+
+        self._seq += 1
+        ticket.seq = self._seq
+        self._add(ticket)
+        return None
+
+    def match_pass(self, now: float | None = None) -> list[tuple[int, int, int]]:
+        """
+        Pair every queued player, oldest first, whose nearest rated opponent
+        now fits the window; returns (user_id, opponent_id, minutes) for
+        start_game(), both players held in the pairing state.
+        """
+        now = self._clock() if now is None else now
+        pairs = []
+        for minutes, queue in self._queues.items():
+            if len(queue) < 2:
+                continue
+            for ticket in list(queue.values()):
+                if self._tickets.get(ticket.user_id) is not ticket:
+                    continue
+                opponent = self._opponent_for(ticket, now)
+                if opponent is not None:
+                    self._hold(ticket, opponent)
+                    pairs.append((ticket.user_id, opponent.user_id, minutes))
+        return pairs
+
+    async def start_game(self, user_id: int, opponent_id: int, minutes: int) -> int:
+        """Write the game of a pairing with create_game, then hand it to the players."""
+        players = [user_id, opponent_id]
+        shuffle(players)
+        try:
+            game_id = await self.create_game(players[0], players[1], minutes)
+        except BaseException:
+            self.unpair(user_id, opponent_id)
+            raise
+        self.matched(user_id, opponent_id, game_id)
+        return game_id
+
+    def matched(self, user_id: int, opponent_id: int, game_id: int) -> None:
+        """The game of a pairing is written: hand it to the players that were waiting for it."""
+        now = self._clock()
+        for player_id in (user_id, opponent_id):
+            ticket = self._pairing.pop(player_id, None)
+            if ticket is not None and ticket.seq:
+                queue_wait_seconds.observe(now - ticket.queued_at)
+                self._matched[player_id] = game_id
+                self._wake(player_id)
+        matches_formed.inc()
+
+    def unpair(self, user_id: int, opponent_id: int) -> None:
+        """The game of a pairing could not be written: put the queued players back at the head."""
+        # user_id is the one that waited longer, so it goes back in front.
+        for player_id in (opponent_id, user_id):
+            ticket = self._pairing.pop(player_id, None)
+            if ticket is None or not ticket.seq or player_id in self._tickets:
+                continue
+            self._head_seq -= 1
+            ticket.seq = self._head_seq
+            self._add(ticket)
+            self._queues[ticket.minutes].move_to_end(player_id, last=False)
+
+    def leave(self, user_id: int) -> None:
+        ticket = self._tickets.get(user_id)
+        if ticket is not None:
+            self._remove(ticket)
+        self._matched.pop(user_id, None)
+        self._wake(user_id)
+
+    async def wait(self, user_id: int, timeout: float) -> dict:
+        """status(), once it is no longer "waiting" or after `timeout` seconds."""
+        if timeout > 0 and user_id not in self._matched and (user_id in self._tickets or user_id in self._pairing):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(user_id, []).append(waiter)
+            try:
+                await asyncio.wait((waiter,), timeout=timeout)
+            finally:
+                waiters = self._waiters.get(user_id)
+                if waiters is not None:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._waiters[user_id]
+        return self.status(user_id)
+
+    def _add(self, ticket: _Ticket) -> None:
+        self._tickets[ticket.user_id] = ticket
+        self._queues[ticket.minutes][ticket.user_id] = ticket
+        self._ratings[ticket.minutes].add(ticket.user_id, ticket.rating)
+        positions = self._positions[ticket.minutes]
+        if not positions or ticket.seq > positions[-1]:
+            positions.append(ticket.seq)
+        else:
+            positions.insert(bisect_left(positions, ticket.seq), ticket.seq)
+
+    def _remove(self, ticket: _Ticket) -> None:
+        del self._tickets[ticket.user_id]
+        del self._queues[ticket.minutes][ticket.user_id]
+        self._ratings[ticket.minutes].remove(ticket.user_id)
+        positions = self._positions[ticket.minutes]
+        del positions[bisect_left(positions, ticket.seq)]
+
+    def _wake(self, user_id: int) -> None:
+        for waiter in self._waiters.get(user_id, ()):
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+async def create_match_game(white_id: int, black_id: int, minutes: int) -> int:
+    async with async_session() as db:
+        game = Game(mode=f"1v1:{minutes}", white_id=white_id, black_id=black_id, status="playing")
+        db.add(game)
+        await db.commit()
+    active_games.started(game)
+    return game.id
+
+
+matchmaking_engine = MatchmakingEngine(create_game=create_match_game)
+active_games = ActiveGameCache()
+
+metrics.gauge("matchmaking_queued", "Players waiting in a matchmaking queue", lambda: matchmaking_engine.queued_count)
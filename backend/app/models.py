@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, LargeBinary, String, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db import Base
@@ -15,7 +15,7 @@ class User(Base):
     password_hash: Mapped[str] = mapped_column(String(255), nullable=False)
     display_name: Mapped[str] = mapped_column(String(120), nullable=False)
     avatar_url: Mapped[str | None] = mapped_column(String(255), nullable=True)
-    elo: Mapped[int] = mapped_column(Integer, default=1200, nullable=False)
+    elo: Mapped[int] = mapped_column(Integer, default=1200, nullable=False, index=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
@@ -26,7 +26,8 @@ class Friendship(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     requester_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    addressee_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # requester_id lookups use uq_friend_pair, which leads with it.
+    addressee_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     status: Mapped[str] = mapped_column(String(20), default="accepted", nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
@@ -46,6 +47,17 @@ class Game(Base):
     ended_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
 
+class GameRecord(Base):
+    """Full move list of a game: 4 bytes per ply (packed move + mover clock), see app/game_record.py."""
+
+    __tablename__ = "game_records"
+
+    game_id: Mapped[int] = mapped_column(ForeignKey("games.id", ondelete="CASCADE"), primary_key=True)
+    start_fen: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    moves: Mapped[bytes] = mapped_column(LargeBinary, default=b"", nullable=False)
+    ply_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
 class UserAchievement(Base):
     __tablename__ = "user_achievements"
     __table_args__ = (UniqueConstraint("user_id", "achievement_id", name="uq_user_achievement"),)
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from sqlalchemy import LargeBinary, bindparam, cast, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.game_record import pending_chunk, split_chunks
+from app.metrics import metrics
+from app.models import Game, GameRecord
+from app.realtime import RoomState
+
+
+games_flushed_total = metrics.counter("game_writes_flushed_total", "Dirty game rows written by the write-behind flusher")
+flush_seconds = metrics.histogram("game_write_flush_seconds", "Duration of one write-behind batch UPDATE")
+record_append_misses_total = metrics.counter(
+    "game_record_append_misses_total", "Record chunks whose ply_count guard matched no row; re-sent from the stored length"
+)
+
+_BATCH_UPDATE = (
+    update(Game.__table__)
+    .where(
+        Game.__table__.c.id == bindparam("b_id"),
+        Game.__table__.c.status != "finished",
+        # A worker that lost a room to another owner can never move the game backwards.
+        Game.__table__.c.move_count <= bindparam("b_moves"),
+    )
+    .values(status="playing", final_fen=bindparam("b_fen"), move_count=bindparam("b_moves"))
+)
+
+_records = GameRecord.__table__
+INSERT_RECORD = insert(_records).values(
+    game_id=bindparam("b_id"),
+    start_fen=bindparam("b_start_fen"),
+    moves=bindparam("b_data"),
+    ply_count=bindparam("b_to"),
+)
+# Appends only onto the expected length, so a chunk can never be written twice.
+APPEND_RECORD = (
+    update(_records)
+    .where(_records.c.game_id == bindparam("b_id"), _records.c.ply_count == bindparam("b_from"))
+    # The cast is a no-op on Postgres (bytea || bytea) and keeps SQLite's || from yielding text.
+    .values(moves=cast(_records.c.moves.concat(bindparam("b_data")), LargeBinary), ply_count=bindparam("b_to"))
+)
+
+
+def record_statement(chunk: dict):
+    """INSERT_RECORD for a game's first chunk, APPEND_RECORD afterwards."""
+    return INSERT_RECORD if chunk["b_from"] == 0 else APPEND_RECORD
+
+
+async def write_final_record(db: AsyncSession, room: RoomState) -> int | None:
+    """
+    Write the plies of a finishing room that its record lacks, in db's
+    transaction (the caller commits under GameStateWriter.lock, then sets
+    room.recorded_plies to the result). Returns the record's ply count, or
+    None when there was nothing to write. An append whose guard matches no
+    row is re-sent once from the length the record actually has.
+    """
+    chunk = pending_chunk(room)
+    if chunk is None:
+        return None
+    if (await db.execute(record_statement(chunk), chunk)).rowcount == 1:
+        return chunk["b_to"]
+
+    record_append_misses_total.inc()
+    stored = await db.scalar(select(_records.c.ply_count).where(_records.c.game_id == room.game_id))
+    room.recorded_plies = stored or 0
+    chunk = pending_chunk(room)
+    if chunk is None:
+        return room.recorded_plies
+    if (await db.execute(record_statement(chunk), chunk)).rowcount != 1:
+        raise RuntimeError(f"record of game {room.game_id} changed while its final plies were written")
+    return chunk["b_to"]
+
+
+class GameStateWriter:
+    """
+    Write-behind for in-progress games.
+
+    Moves only mark their room dirty; a background task turns every dirty
+    room into one row of a single executemany UPDATE, every flush_interval
+    seconds or as soon as max_dirty rooms are waiting, and runs it in a
+    worker thread so the event loop never waits on Postgres. Rows of
+    finished games are never overwritten: _finish_game commits the final
+    state itself and calls discard(), and the UPDATE skips finished rows.
+
+    The same transaction appends each room's new plies to its GameRecord.
+    Hold `lock` while writing a record chunk outside the flusher, so the
+    two never append the same plies.
+    """
+
+    def __init__(self, engine: Engine, flush_interval: float = 0.25, max_dirty: int = 256) -> None:
+        self._engine = engine
+        self._flush_interval = flush_interval
+        self._max_dirty = max_dirty
+        self._dirty: dict[int, RoomState] = {}
+        self.lock = asyncio.Lock()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._dirty)
+
+    def mark_dirty(self, room: RoomState) -> None:
+        self._dirty[room.game_id] = room
+        self._ensure_started()
+        if len(self._dirty) >= self._max_dirty:
+            self._wakeup.set()
+
+    def is_pending(self, game_id: int) -> bool:
+        return game_id in self._dirty
+
+    def discard(self, game_id: int) -> None:
+        self._dirty.pop(game_id, None)
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self.lock:
+            rooms, rows, chunks = self._take_batch()
+            if not rows:
+                return
+            try:
+                missed = await asyncio.to_thread(self._write, rows, [chunk for _, chunk in chunks])
+            except Exception:
+                # Keep the rooms for the next round; they are re-read then, so nothing goes stale.
+                for room in rooms:
+                    if not room.finished:
+                        self._dirty.setdefault(room.game_id, room)
+                return
+            self._mark_recorded(chunks, missed)
+
+    async def close(self) -> None:
+        """Stop the flusher and write everything still pending (shutdown)."""
+        task, self._task = self._task, None
+        if task is not None:
+            # Under the lock no batch is in flight, so cancelling never strands a write.
+            async with self.lock:
+                task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def _take_batch(self) -> tuple[list[RoomState], list[dict], list[tuple[RoomState, dict]]]:
+        rooms = list(self._dirty.values())
+        self._dirty = {}
+        rows = [
+            {"b_id": room.game_id, "b_fen": room.board.fen(), "b_moves": len(room.board.move_stack)}
+            for room in rooms
+        ]
+        chunks = [(room, chunk) for room in rooms if (chunk := pending_chunk(room)) is not None]
+        return rooms, rows, chunks
+
+    def _mark_recorded(self, chunks: list[tuple[RoomState, dict]], missed: dict[int, int]) -> None:
+        for room, chunk in chunks:
+            if room.recorded_plies != chunk["b_from"]:
+                continue
+            stored = missed.get(room.game_id)
+            if stored is None:
+                room.recorded_plies = chunk["b_to"]
+            else:
+                # The record holds `stored` plies (0: no row yet); the next flush sends the rest from there.
+                record_append_misses_total.inc()
+                room.recorded_plies = stored
+                if not room.finished:
+                    self._dirty.setdefault(room.game_id, room)
+
+    def _write(self, rows: list[dict], chunks: list[dict]) -> dict[int, int]:
+        """Runs the batch; returns game id -> stored ply_count for appends whose guard matched no row."""
+        started = time.perf_counter()
+        inserts, appends = split_chunks(chunks)
+        with self._engine.begin() as connection:
+            connection.execute(_BATCH_UPDATE, rows)
+            if inserts:
+                connection.execute(INSERT_RECORD, inserts)
+            missed = {}
+            if appends:
+                result = connection.execute(APPEND_RECORD, appends)
+                # Drivers without a per-batch rowcount report -1; check the rows then too.
+                if result.rowcount != len(appends):
+                    missed = self._missed_appends(connection, appends)
+        flush_seconds.observe(time.perf_counter() - started)
+        games_flushed_total.inc(len(rows))
+        return missed
+
+    @staticmethod
+    def _missed_appends(connection, appends: list[dict]) -> dict[int, int]:
+        stored = dict(
+            connection.execute(
+                select(_records.c.game_id, _records.c.ply_count).where(
+                    _records.c.game_id.in_([chunk["b_id"] for chunk in appends])
+                )
+            ).all()
+        )
+        return {
+            chunk["b_id"]: stored.get(chunk["b_id"], 0)
+            for chunk in appends
+            if stored.get(chunk["b_id"]) != chunk["b_to"]
+        }
@@ -1,13 +1,152 @@
-ONLINE_USERS: set[int] = set()
+from __future__ import annotations
 
+import asyncio
+import json
+from typing import TYPE_CHECKING, Iterable
 
-def set_online(user_id: int) -> None:
-    ONLINE_USERS.add(user_id)
+from fastapi import WebSocket, WebSocketDisconnect
 
+from app.metrics import metrics
 
-def set_offline(user_id: int) -> None:
-    ONLINE_USERS.discard(user_id)
+if TYPE_CHECKING:
+    from app.cluster import Cluster
+
+
+PRESENCE_CHANNEL = "presence"
+
+presence_pushes_total = metrics.counter("presence_pushes_total", "Presence changes pushed to friends' sockets")
 
 
 def is_online(user_id: int) -> bool:
-    return user_id in ONLINE_USERS
+    return presence_hub.is_online(user_id)
+
+
+class PresenceHub:
+    """
+    /ws/presence sockets, and the online state of every user across workers.
+
+    A user is online while they have a presence socket open on any worker.
+    Each worker counts its own sockets and announces a user's first one
+    opening and last one closing on the broker, along with the user's
+    friends (FriendGraph). Every worker records the change and pushes
+    {"type": "PRESENCE", "user_id", "online"} to the sockets it holds for
+    those friends, so only online friends hear about it and nobody polls
+    /friends for status. A new socket gets {"type": "PRESENCE_SYNC",
+    "online": [friend ids]} first. Users reported by a worker that left the
+    ring count as offline. A worker that starts (or restarts) asks the others
+    for the users they hold with request_sync(); each answers with all of its
+    local users, which replaces what is recorded for it.
+    """
+
+    def __init__(self) -> None:
+        self.cluster: Cluster | None = None
+        self._sockets: dict[int, set[WebSocket]] = {}
+        # user id -> other workers holding a presence socket for them.
+        self._remote: dict[int, set[str]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def worker_id(self) -> str:
+        return self.cluster.worker_id if self.cluster is not None else "local"
+
+    def is_online(self, user_id: int) -> bool:
+        if user_id in self._sockets:
+            return True
+        workers = self._remote.get(user_id)
+        if not workers:
+            return False
+        live = self.cluster.ring.workers if self.cluster is not None else ()
+        return any(worker in live for worker in workers)
+
+    async def connect(self, user_id: int, websocket: WebSocket, friends: Iterable[int]) -> None:
+        friends = list(friends)
+        sockets = self._sockets.setdefault(user_id, set())
+        first = not sockets
+        sockets.add(websocket)
+        await _send(websocket, {"type": "PRESENCE_SYNC", "online": [friend for friend in friends if self.is_online(friend)]})
+        if first:
+            await self._announce(user_id, True, friends)
+
+    async def disconnect(self, user_id: int, websocket: WebSocket, friends: Iterable[int]) -> None:
+        sockets = self._sockets.get(user_id)
+        if sockets is None:
+            return
+        sockets.discard(websocket)
+        if not sockets:
+            del self._sockets[user_id]
+            await self._announce(user_id, False, list(friends))
+
+    async def request_sync(self) -> None:
+        """Ask the other workers for the users they hold; called once subscribed to PRESENCE_CHANNEL."""
+        await self._publish({"worker": self.worker_id, "sync": True})
+
+    async def _announce(self, user_id: int, online: bool, friends: list[int]) -> None:
+        await self._publish({"worker": self.worker_id, "user_id": user_id, "online": online, "friends": friends})
+
+    async def _publish(self, data: dict) -> None:
+        message = json.dumps(data, separators=(",", ":")).encode()
+        if self.cluster is not None:
+            try:
+                await self.cluster.broker.publish(PRESENCE_CHANNEL, message)
+                return
+            except Exception:
+                pass
+        self.apply(message)
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _replace_remote(self, worker: str, user_ids: set[int]) -> None:
+        for user_id in [user_id for user_id, workers in self._remote.items() if worker in workers]:
+            if user_id not in user_ids:
+                self._remote[user_id].discard(worker)
+                if not self._remote[user_id]:
+                    del self._remote[user_id]
+        for user_id in user_ids:
+            self._remote.setdefault(user_id, set()).add(worker)
+
+    def apply(self, message: bytes) -> None:
+        """Broker handler for PRESENCE_CHANNEL."""
+        try:
+            data = json.loads(message)
+            worker = data["worker"]
+            if data.get("sync"):
+                if worker != self.worker_id:
+                    self._spawn(self._publish({"worker": self.worker_id, "users": list(self._sockets)}))
+                return
+            if "users" in data:
+                if worker != self.worker_id:
+                    self._replace_remote(worker, set(data["users"]))
+                return
+            user_id, online, friends = data["user_id"], data["online"], data["friends"]
+        except (ValueError, KeyError, TypeError):
+            return
+        if worker != self.worker_id:
+            workers = self._remote.setdefault(user_id, set())
+            if online:
+                workers.add(worker)
+            else:
+                workers.discard(worker)
+                if not workers:
+                    del self._remote[user_id]
+
+        targets = [socket for friend in friends for socket in self._sockets.get(friend, ())]
+        if targets:
+            payload = {"type": "PRESENCE", "user_id": user_id, "online": self.is_online(user_id)}
+            self._spawn(self._push(targets, payload))
+
+    async def _push(self, sockets: list[WebSocket], payload: dict) -> None:
+        presence_pushes_total.inc(len(sockets))
+        await asyncio.gather(*(_send(socket, payload) for socket in sockets))
+
+
+async def _send(websocket: WebSocket, payload: dict) -> None:
+    try:
+        await websocket.send_json(payload)
+    except (WebSocketDisconnect, RuntimeError):
+        return
+
+
+presence_hub = PresenceHub()
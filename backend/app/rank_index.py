@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from itertools import islice
+from typing import Iterator
+
+
+class RatingIndex:
+    """
+    Ids ordered by an integer rating, with order statistics.
+
+    A Fenwick tree over the rating range counts the ids at each rating, so
+    adding or removing an id, counting the ids rated below a value and
+    finding the k-th lowest rating are O(log range) however many ids there
+    are. Ids sharing a rating sit in one insertion-ordered bucket. Ratings
+    outside [0, size) are kept as given but ordered as the nearest bound.
+    """
+
+    def __init__(self, size: int = 4096) -> None:
+        self._size = 1 << max(0, size - 1).bit_length()
+        self._tree = [0] * (self._size + 1)
+        self._buckets: dict[int, dict[int, None]] = {}
+        self._ratings: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ratings)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._ratings
+
+    def rating(self, key: int) -> int | None:
+        return self._ratings.get(key)
+
+    def _slot(self, rating: int) -> int:
+        return min(max(rating, 0), self._size - 1)
+
+    def _update(self, slot: int, delta: int) -> None:
+        index = slot + 1
+        while index <= self._size:
+            self._tree[index] += delta
+            index += index & -index
+
+    def add(self, key: int, rating: int) -> None:
+        if key in self._ratings:
+            self.remove(key)
+        slot = self._slot(rating)
+        self._ratings[key] = rating
+        self._buckets.setdefault(slot, {})[key] = None
+        self._update(slot, 1)
+
+    def remove(self, key: int) -> bool:
+        rating = self._ratings.pop(key, None)
+        if rating is None:
+            return False
+        slot = self._slot(rating)
+        bucket = self._buckets[slot]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[slot]
+        self._update(slot, -1)
+        return True
+
+    def count_below(self, rating: int) -> int:
+        """Number of ids rated strictly below `rating`."""
+        index = self._slot(rating)
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def count_above(self, rating: int) -> int:
+        """Number of ids rated strictly above `rating`."""
+        return len(self._ratings) - self.count_below(rating) - len(self._buckets.get(self._slot(rating), ()))
+
+    def kth(self, k: int) -> int:
+        """Rating slot of the k-th lowest id (1-based); k must be in [1, len]."""
+        position = 0
+        step = self._size
+        while step:
+            following = position + step
+            if following <= self._size and self._tree[following] < k:
+                position = following
+                k -= self._tree[following]
+            step >>= 1
+        return position
+
+    def nearest(self, rating: int, exclude: int | None = None) -> int | None:
+        """
+        The id rated closest to `rating` (ties: the lower rating, then the
+        earliest added). `exclude`, if given, is skipped and must be rated
+        `rating` or not indexed.
+        """
+        slot = self._slot(rating)
+        for key in self._buckets.get(slot, ()):
+            if key != exclude:
+                return key
+
+        below = self.count_below(rating)
+        at_or_below = below + len(self._buckets.get(slot, ()))
+        lower = self.kth(below) if below else None
+        upper = self.kth(at_or_below + 1) if at_or_below < len(self._ratings) else None
+        if lower is None and upper is None:
+            return None
+        if upper is None or (lower is not None and slot - lower <= upper - slot):
+            return next(iter(self._buckets[lower]))
+        return next(iter(self._buckets[upper]))
+
+    def descending(self, start: int = 0) -> Iterator[tuple[int, int]]:
+        """
+        (id, rating) from the highest rated down, skipping the first `start`
+        ids. Consume it before changing the index.
+        """
+        remaining = len(self._ratings) - start
+        if remaining <= 0:
+            return
+        slot = self.kth(remaining)
+        # Ids of the first (partially skipped) bucket: the ones rated higher come first.
+        skip = self.count_below(slot) + len(self._buckets[slot]) - remaining
+        while True:
+            bucket = self._buckets[slot]
+            size = len(bucket)
+            for key in islice(bucket, skip, None):
+                yield key, self._ratings[key]
+            remaining -= size - skip
+            if remaining <= 0:
+                return
+            skip = 0
+            slot = self.kth(remaining)
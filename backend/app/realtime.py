@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import asyncio
-from collections import defaultdict
+import time
+import weakref
+import zlib
+from collections import defaultdict, deque
 from dataclasses import dataclass, field
 from datetime import datetime
 
@@ -9,122 +12,474 @@ import chess
 from fastapi import WebSocket
 from starlette.websockets import WebSocketDisconnect
 
+from app.game_record import decode_record
+from app.json_codec import JsonEncoder, default_encoder
+from app.metrics import metrics
 
-@dataclass
+
+# Protocol 1 clients get a full STATE_SYNC after every change; protocol 2 clients
+# opt in (``/ws/{game_id}?protocol=2``) to small MOVE_APPLIED / CLOCK_DELTA /
+# DRAW_STATE events and only receive STATE_SYNC on connect or on request.
+PROTOCOL_FULL_SYNC = 1
+PROTOCOL_DELTA = 2
+
+# A socket that cannot take a frame within this window is dropped from the room.
+SEND_TIMEOUT_SECONDS = 2.0
+# Frames waiting per socket before it counts as a slow consumer and is evicted.
+SEND_QUEUE_LIMIT = 64
+# Close code for evicted slow consumers; clients reconnect and get a fresh STATE_SYNC.
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# Close code when a room moves to another worker; clients reconnect and are routed to it.
+SERVICE_RESTART_CLOSE_CODE = 1012
+
+# A queued frame with the same key is superseded by a newer one (only the latest clock matters).
+COALESCE_KEYS = {
+    "CLOCK_TICK": "clock",
+    "CLOCK_DELTA": "clock",
+    "STATE_SYNC": "state",
+}
+
+# Chat lines a room keeps; older ones fall off the ring buffer.
+CHAT_HISTORY_LIMIT = 100
+
+frames_dropped = metrics.counter("ws_frames_dropped_total", "Outbound frames discarded before delivery")
+slow_consumers_evicted = metrics.counter("ws_slow_consumers_evicted_total", "Sockets closed for falling behind")
+
+
+class PlayerInfo(dict):
+    """Read-only players entry of the payload, shared by every room the same player info appears in."""
+
+    __slots__ = ("__weakref__",)
+
+
+# Keyed by user id (the AI entry by its display name): a player in several rooms, or rejoining, shares one entry.
+_player_infos: weakref.WeakValueDictionary[int | str, PlayerInfo] = weakref.WeakValueDictionary()
+
+
+def intern_player_info(info: dict | None) -> PlayerInfo | None:
+    if info is None or isinstance(info, PlayerInfo):
+        return info
+    key = info.get("id")
+    if key is None:
+        key = info.get("display_name") or ""
+    shared = _player_infos.get(key)
+    if shared is None or shared != info:
+        shared = PlayerInfo(info)
+        _player_infos[key] = shared
+    return shared
+
+
+@dataclass(slots=True)
 class RoomState:
     game_id: int
     white_id: int | None
     black_id: int | None
-    white_info: dict | None = None
-    black_info: dict | None = None
+    white_info: PlayerInfo | None = None
+    black_info: PlayerInfo | None = None
     board: chess.Board = field(default_factory=chess.Board)
     white_ms: int = 10 * 60 * 1000
     black_ms: int = 10 * 60 * 1000
     time_control_minutes: int = 10
     is_ai: bool = False
     finished: bool = False
-    chat_messages: list[dict] = field(default_factory=list)
+    # Ring buffer of the last CHAT_HISTORY_LIMIT lines: grows to the limit, then
+    # chat_head marks the oldest slot. None until the first line.
+    chat_messages: list[dict] | None = None
+    chat_head: int = field(default=0, repr=False)
     draw_offered_by: int | None = None
     last_clock_ts: datetime = field(default_factory=datetime.utcnow)
     clock_started: bool = False
-    clock_task: asyncio.Task | None = None
-    disconnect_tasks: dict[int, asyncio.Task] = field(default_factory=dict)
-    disconnect_started_at: dict[int, datetime] = field(default_factory=dict)
-    created_at: datetime = field(default_factory=datetime.utcnow)
+    # user_id -> (forfeit task, started at) while a player's disconnect grace runs; None when empty.
+    disconnect_tasks: dict[int, tuple[asyncio.Task, datetime]] | None = field(default=None, repr=False)
+    chat_version: int = field(default=0, repr=False)
+    state_seq: int = 0
+    # Mover's remaining ms after each ply, parallel to board.move_stack.
+    move_clocks: list[int] = field(default_factory=list, repr=False)
+    # Plies already stored in the game's GameRecord, and the position the record starts from.
+    recorded_plies: int = 0
+    start_fen: str | None = None
+    # time.monotonic() of the last move, chat, draw offer or join; the reaper evicts by it.
+    last_active: float = field(default_factory=time.monotonic, repr=False)
+    _last_move_san: tuple[int, str | None] = field(default=(0, None), repr=False)
+    _position_cache: tuple[tuple, dict] | None = field(default=None, repr=False)
+    _players_cache: tuple[tuple, dict] | None = field(default=None, repr=False)
+
+    def __post_init__(self) -> None:
+        self.white_info = intern_player_info(self.white_info)
+        self.black_info = intern_player_info(self.black_info)
+
+    def start_disconnect_grace(self, user_id: int, task: asyncio.Task) -> None:
+        if self.disconnect_tasks is None:
+            self.disconnect_tasks = {}
+        self.disconnect_tasks[user_id] = (task, datetime.utcnow())
+
+    def cancel_disconnect_grace(self, user_id: int | None = None) -> bool:
+        """Cancel one player's grace (every player's when user_id is None); True if one was pending."""
+        if not self.disconnect_tasks:
+            return False
+        user_ids = list(self.disconnect_tasks) if user_id is None else [user_id]
+        cancelled = False
+        for uid in user_ids:
+            entry = self.disconnect_tasks.pop(uid, None)
+            if entry is not None:
+                entry[0].cancel()
+                cancelled = True
+        if not self.disconnect_tasks:
+            self.disconnect_tasks = None
+        return cancelled
+
+    def has_disconnect_grace(self) -> bool:
+        return bool(self.disconnect_tasks) and any(not task.done() for task, _ in self.disconnect_tasks.values())
 
     def _active_disconnect_grace(self, grace_seconds: int) -> dict | None:
         """Return the active disconnect_grace entry, or None if none is active."""
-        for user_id, task in self.disconnect_tasks.items():
+        if not self.disconnect_tasks:
+            return None
+        for user_id, (task, started) in self.disconnect_tasks.items():
             if not task.done():
-                started = self.disconnect_started_at.get(user_id)
-                if started is not None:
-                    elapsed = max(0.0, (datetime.utcnow() - started).total_seconds())
-                    remaining = max(0, int(grace_seconds - elapsed))
-                    return {"user_id": user_id, "active": True, "seconds": remaining}
+                elapsed = max(0.0, (datetime.utcnow() - started).total_seconds())
+                remaining = max(0, int(grace_seconds - elapsed))
+                return {"user_id": user_id, "active": True, "seconds": remaining}
         return None
 
+    def clock_remaining_ms(self, now: datetime | None = None) -> int:
+        """Milliseconds left for the side to move, counting time not yet settled."""
+        now = now or datetime.utcnow()
+        elapsed_ms = max(0, int((now - self.last_clock_ts).total_seconds() * 1000))
+        current_ms = self.white_ms if self.board.turn == chess.WHITE else self.black_ms
+        return max(0, current_ms - elapsed_ms)
+
+    def touch(self) -> None:
+        self.last_active = time.monotonic()
+
+    def settle_clock(self, now: datetime | None = None) -> None:
+        """Charge the time elapsed since the last settlement to the side to move."""
+        now = now or datetime.utcnow()
+        elapsed_ms = int((now - self.last_clock_ts).total_seconds() * 1000)
+        self.last_clock_ts = now
+        if elapsed_ms <= 0:
+            return
+
+        if self.board.turn == chess.WHITE:
+            self.white_ms = max(0, self.white_ms - elapsed_ms)
+        else:
+            self.black_ms = max(0, self.black_ms - elapsed_ms)
+
+    def push_move(self, move: chess.Move) -> None:
+        """Play a move, remembering its SAN so the payload never has to pop and re-push."""
+        san = self.board.san(move)
+        self.move_clocks.append(self.white_ms if self.board.turn == chess.WHITE else self.black_ms)
+        self.board.push(move)
+        self._last_move_san = (len(self.board.move_stack), san)
+        self.state_seq += 1
+        self.touch()
+
+    def set_draw_offer(self, user_id: int | None) -> None:
+        self.draw_offered_by = user_id
+        self.state_seq += 1
+        self.touch()
+
+    def add_chat_message(self, message: dict) -> None:
+        if self.chat_messages is None:
+            self.chat_messages = []
+        if len(self.chat_messages) < CHAT_HISTORY_LIMIT:
+            self.chat_messages.append(message)
+        else:
+            self.chat_messages[self.chat_head] = message
+            self.chat_head = (self.chat_head + 1) % CHAT_HISTORY_LIMIT
+        self.chat_version += 1
+        self.touch()
+
+    def chat_history(self) -> list[dict]:
+        """Chat lines oldest first."""
+        if not self.chat_messages:
+            return []
+        if not self.chat_head:
+            return list(self.chat_messages)
+        return self.chat_messages[self.chat_head:] + self.chat_messages[:self.chat_head]
+
     @property
     def last_move_san(self) -> str | None:
         if not self.board.move_stack:
             return None
+        ply, san = self._last_move_san
+        if ply == len(self.board.move_stack):
+            return san
         last_move = self.board.pop()
         san = self.board.san(last_move)
         self.board.push(last_move)
+        self._last_move_san = (len(self.board.move_stack), san)
         return san
 
+    def position_payload(self) -> dict:
+        """
+        Board-derived part of the payload (FEN, legal moves, game-over scan).
+
+        Cached until the move stack or the finished flag changes, so clock
+        ticks, chat and draw offers never re-run move generation.
+        """
+        key = (id(self.board), len(self.board.move_stack), self.finished)
+        if self._position_cache is not None and self._position_cache[0] == key:
+            return self._position_cache[1]
+
+        board = self.board
+        fen = board.fen()
+        position = {
+            "fen": fen,
+            "fen_hash": f"{zlib.crc32(fen.encode()):08x}",
+            "turn": "w" if board.turn == chess.WHITE else "b",
+            "status": "finished" if self.finished or board.is_game_over(claim_draw=True) else "playing",
+            "last_move": board.peek().uci() if board.move_stack else None,
+            "last_move_san": self.last_move_san,
+            "move_count": len(board.move_stack),
+            "is_check": board.is_check(),
+            "legal_moves": [move.uci() for move in board.legal_moves],
+        }
+        self._position_cache = (key, position)
+        return position
+
+    def players_payload(self) -> dict:
+        key = (self.white_id, self.black_id, id(self.white_info), id(self.black_info))
+        if self._players_cache is not None and self._players_cache[0] == key:
+            return self._players_cache[1]
+
+        players = {
+            "white_id": self.white_id,
+            "black_id": self.black_id,
+            "white": self.white_info,
+            "black": self.black_info,
+        }
+        self._players_cache = (key, players)
+        return players
+
+    def clocks_payload(self) -> dict:
+        return {"white_ms": self.white_ms, "black_ms": self.black_ms}
+
     def to_payload(self, grace_seconds: int = 30) -> dict:
+        position = self.position_payload()
         return {
             "game_id": self.game_id,
-            "fen": self.board.fen(),
-            "turn": "w" if self.board.turn == chess.WHITE else "b",
-            "status": "finished" if self.finished or self.board.is_game_over(claim_draw=True) else "playing",
-            "last_move": self.board.peek().uci() if self.board.move_stack else None,
-            "last_move_san": self.last_move_san,
-            "move_count": len(self.board.move_stack),
-            "is_check": self.board.is_check(),
+            "seq": self.state_seq,
+            "fen": position["fen"],
+            "fen_hash": position["fen_hash"],
+            "turn": position["turn"],
+            "status": position["status"],
+            "last_move": position["last_move"],
+            "last_move_san": position["last_move_san"],
+            "move_count": position["move_count"],
+            "is_check": position["is_check"],
             "draw_offered_by": self.draw_offered_by,
-            "legal_moves": [move.uci() for move in self.board.legal_moves],
-            "players": {
-                "white_id": self.white_id,
-                "black_id": self.black_id,
-                "white": self.white_info,
-                "black": self.black_info,
-            },
-            "clocks": {"white_ms": self.white_ms, "black_ms": self.black_ms},
+            "legal_moves": position["legal_moves"],
+            "players": self.players_payload(),
+            "clocks": self.clocks_payload(),
             "time_control_minutes": self.time_control_minutes,
             "is_ai": self.is_ai,
-            "chat_messages": self.chat_messages,
+            "chat_messages": self.chat_history(),
             "disconnect_grace": self._active_disconnect_grace(grace_seconds),
         }
 
+    def move_delta(self) -> dict:
+        position = self.position_payload()
+        return {
+            "type": "MOVE_APPLIED",
+            "seq": self.state_seq,
+            "move": position["last_move"],
+            "san": position["last_move_san"],
+            "fen_hash": position["fen_hash"],
+            "turn": position["turn"],
+            "status": position["status"],
+            "is_check": position["is_check"],
+            "move_count": position["move_count"],
+            "draw_offered_by": self.draw_offered_by,
+            "clocks": self.clocks_payload(),
+        }
+
+    def clock_delta(self) -> dict:
+        return {"type": "CLOCK_DELTA", "seq": self.state_seq, "clocks": self.clocks_payload()}
+
+    def draw_delta(self) -> dict:
+        return {"type": "DRAW_STATE", "seq": self.state_seq, "draw_offered_by": self.draw_offered_by}
+
+
+class Connection:
+    """
+    One game-room WebSocket with its own bounded outbound queue.
+
+    Broadcasts only enqueue; a dedicated writer task drains the queue, so a
+    slow socket never stalls the clock scheduler or another player's
+    receive loop. A socket that overflows its queue or times out on a send
+    is evicted and has to reconnect, which resyncs it.
+    """
+
+    def __init__(
+        self,
+        manager: RealtimeManager,
+        game_id: int,
+        user_id: int,
+        websocket: WebSocket,
+        protocol: int,
+    ) -> None:
+        self.manager = manager
+        self.game_id = game_id
+        self.user_id = user_id
+        self.websocket = websocket
+        self.protocol = protocol
+        self.evicted = False
+        self._stopped = False
+        self._queue: deque[tuple[str | None, str]] = deque()
+        self._ready = asyncio.Event()
+        self._writer: asyncio.Task | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._drain())
+
+    def stop(self) -> None:
+        # The flag as well as cancel(): on 3.11 wait_for can swallow a cancel that races a finished send.
+        self._stopped = True
+        self._ready.set()
+        if self._writer is not None and not self._writer.done():
+            self._writer.cancel()
+        self._queue.clear()
+
+    def enqueue(self, frame: str, coalesce_key: str | None = None) -> bool:
+        if self.evicted:
+            return False
+
+        if coalesce_key is not None:
+            for index, (key, _) in enumerate(self._queue):
+                if key == coalesce_key:
+                    del self._queue[index]
+                    frames_dropped.inc(reason="coalesced")
+                    break
+
+        if len(self._queue) >= self.manager.send_queue_limit:
+            frames_dropped.inc(len(self._queue) + 1, reason="evicted")
+            self.manager.evict(self)
+            return False
+
+        self._queue.append((coalesce_key, frame))
+        self._ready.set()
+        return True
+
+    async def _drain(self) -> None:
+        while not self._stopped:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            _, frame = self._queue.popleft()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(frame), self.manager.send_timeout)
+            except asyncio.TimeoutError:
+                self.manager.evict(self)
+                return
+            except (WebSocketDisconnect, RuntimeError):
+                self.manager.forget(self)
+                return
+
 
 class RealtimeManager:
-    def __init__(self) -> None:
-        self._room_connections: dict[int, dict[int, set[WebSocket]]] = defaultdict(lambda: defaultdict(set))
+    def __init__(
+        self,
+        encoder: JsonEncoder | None = None,
+        send_timeout: float = SEND_TIMEOUT_SECONDS,
+        send_queue_limit: int = SEND_QUEUE_LIMIT,
+    ) -> None:
+        self._encode = encoder or default_encoder()
+        self.send_timeout = send_timeout
+        self.send_queue_limit = send_queue_limit
+        # game_id -> the room's connections; a handful per room, so scans beat nested per-user sets.
+        self._room_connections: dict[int, list[Connection]] = {}
         self._user_connections: dict[int, int] = defaultdict(int)
         self._rooms: dict[int, RoomState] = {}
-        self._lock = asyncio.Lock()
+        self._connections: dict[WebSocket, Connection] = {}
+        # game_id -> lock of that room, alive only while someone holds or waits on it.
+        self._room_locks: weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+        # Optional RoomSnapshotStore rooms are restored from after a restart.
+        self.snapshots = None
+        # Cluster that knows which worker owns each room (app.cluster).
+        self.cluster = None
+
+    def room_lock(self, game_id: int) -> asyncio.Lock:
+        """
+        Lock for work on one room that spans awaits, such as loading it.
 
-    async def connect(self, game_id: int, user_id: int, websocket: WebSocket) -> bool:
+        One lock per room, so a slow load never holds up another room. The
+        connection index itself takes no lock: connect, disconnect and
+        forget update it without awaiting, so readers (is_user_in_room,
+        get_connected_count, broadcast) never see it half done.
+        """
+        lock = self._room_locks.get(game_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._room_locks[game_id] = lock
+        return lock
+
+    async def connect(
+        self,
+        game_id: int,
+        user_id: int,
+        websocket: WebSocket,
+        protocol: int = PROTOCOL_FULL_SYNC,
+    ) -> bool:
         await websocket.accept()
         was_reconnecting = False
-        async with self._lock:
-            self._room_connections[game_id][user_id].add(websocket)
-            self._user_connections[user_id] += 1
-
-            room = self._rooms.get(game_id)
-            if room and user_id in room.disconnect_tasks:
-                if not room.disconnect_tasks[user_id].done():
-                    room.disconnect_tasks[user_id].cancel()
-                room.disconnect_tasks.pop(user_id, None)
-                room.disconnect_started_at.pop(user_id, None)
-                was_reconnecting = True
+        connection = Connection(self, game_id, user_id, websocket, protocol)
+        self._room_connections.setdefault(game_id, []).append(connection)
+        self._connections[websocket] = connection
+        self._user_connections[user_id] += 1
+        connection.start()
 
+        room = self._rooms.get(game_id)
+        if room:
+            room.touch()
+            was_reconnecting = room.cancel_disconnect_grace(user_id)
         return was_reconnecting
 
     async def disconnect(self, game_id: int, user_id: int, websocket: WebSocket) -> bool:
-        async with self._lock:
-            room_map = self._room_connections.get(game_id, {})
-            user_sockets = room_map.get(user_id, set())
-            if websocket in user_sockets:
-                user_sockets.remove(websocket)
-            if not user_sockets and user_id in room_map:
-                room_map.pop(user_id, None)
-            if not room_map and game_id in self._room_connections:
-                self._room_connections.pop(game_id, None)
-
-            if user_id in self._user_connections:
-                self._user_connections[user_id] -= 1
-                if self._user_connections[user_id] <= 0:
-                    self._user_connections.pop(user_id, None)
-                    return True
-        return False
+        connection = self._connections.get(websocket)
+        if connection is not None:
+            self.forget(connection)
+        # else: already dropped as a stale or evicted socket.
+        return not self.is_user_connected(user_id)
+
+    def forget(self, connection: Connection) -> None:
+        """Remove a connection from every index and stop its writer."""
+        if self._connections.pop(connection.websocket, None) is None:
+            return
+        connection.stop()
+
+        room_connections = self._room_connections.get(connection.game_id)
+        if room_connections is not None:
+            room_connections.remove(connection)
+            if not room_connections:
+                del self._room_connections[connection.game_id]
+
+        user_id = connection.user_id
+        if user_id in self._user_connections:
+            self._user_connections[user_id] -= 1
+            if self._user_connections[user_id] <= 0:
+                self._user_connections.pop(user_id, None)
+
+    def evict(self, connection: Connection) -> None:
+        """Drop a slow consumer; closing the socket ends its receive loop so the client reconnects."""
+        if connection.evicted:
+            return
+        connection.evicted = True
+        slow_consumers_evicted.inc()
+        self.forget(connection)
+        asyncio.create_task(self._close_quietly(connection.websocket, SLOW_CONSUMER_CLOSE_CODE))
 
     def is_user_connected(self, user_id: int) -> bool:
         return self._user_connections.get(user_id, 0) > 0
 
     def is_user_in_room(self, game_id: int, user_id: int) -> bool:
-        return user_id in self._room_connections.get(game_id, {}) and len(self._room_connections[game_id][user_id]) > 0
+        return any(connection.user_id == user_id for connection in self._room_connections.get(game_id, ()))
 
     def get_or_create_room(
         self,
@@ -139,19 +494,42 @@ class RealtimeManager:
         time_control_minutes: int = 10,
         is_ai: bool = False,
         finished: bool = False,
+        record: tuple[str | None, bytes] | None = None,
     ) -> RoomState:
+        """
+        record is the (start_fen, packed moves) of the game's GameRecord; when
+        given, the board is replayed from it so history and clocks survive a
+        restart. Otherwise the room starts from fen with an empty history.
+        """
         room = self._rooms.get(game_id)
         if room:
+            room.touch()
             room.time_control_minutes = time_control_minutes
             room.is_ai = is_ai
             room.finished = finished or room.finished
             if white_info:
-                room.white_info = white_info
+                room.white_info = intern_player_info(white_info)
             if black_info:
-                room.black_info = black_info
+                room.black_info = intern_player_info(black_info)
             return room
 
-        board = chess.Board(fen) if fen else chess.Board()
+        move_clocks: list[int] = []
+        if record is not None:
+            start_fen = record[0]
+            board, move_clocks = decode_record(start_fen, record[1])
+        else:
+            start_fen = fen if fen and fen != chess.STARTING_FEN else None
+            board = chess.Board(fen) if fen else chess.Board()
+
+        white_ms = black_ms = initial_ms
+        # The last recorded ply was played by the side not to move, the one before by the side to move.
+        for back, clock_ms in enumerate(reversed(move_clocks[-2:])):
+            mover = (not board.turn) if back == 0 else board.turn
+            if mover == chess.WHITE:
+                white_ms = clock_ms
+            else:
+                black_ms = clock_ms
+
         room = RoomState(
             game_id=game_id,
             white_id=white_id,
@@ -159,11 +537,14 @@ class RealtimeManager:
             white_info=white_info,
             black_info=black_info,
             board=board,
-            white_ms=initial_ms,
-            black_ms=initial_ms,
+            white_ms=white_ms,
+            black_ms=black_ms,
             time_control_minutes=time_control_minutes,
             is_ai=is_ai,
             finished=finished,
+            move_clocks=move_clocks,
+            recorded_plies=len(move_clocks),
+            start_fen=start_fen,
         )
         self._rooms[game_id] = room
         return room
@@ -171,39 +552,112 @@ class RealtimeManager:
     def get_room(self, game_id: int) -> RoomState | None:
         return self._rooms.get(game_id)
 
+    def rooms(self) -> list[RoomState]:
+        return list(self._rooms.values())
+
+    def restore_room(self, game_id: int, persisted_plies: int = 0) -> bool:
+        """
+        Make sure the room is live, restoring it from the snapshot file if it
+        has one at least as recent as Postgres. False means the caller has to
+        rebuild it from the database.
+        """
+        if game_id in self._rooms:
+            return True
+        if self.snapshots is None:
+            return False
+        room = self.snapshots.take(game_id, persisted_plies)
+        if room is None:
+            return False
+        self._rooms[game_id] = room
+        return True
+
+    def adopt_room(self, room: RoomState) -> None:
+        """Install a room handed over by its previous owner; it replaces any older local copy."""
+        self._rooms[room.game_id] = room
+
+    def release_room(self, game_id: int) -> RoomState | None:
+        """
+        Forget a room this worker no longer owns. Its sockets stay open until
+        close_room(), so a handoff can finish before the players reconnect.
+        """
+        room = self._rooms.pop(game_id, None)
+        if room is not None:
+            room.cancel_disconnect_grace()
+        return room
+
+    async def close_room(self, game_id: int, close_code: int = SERVICE_RESTART_CLOSE_CODE) -> None:
+        """Close every socket of a room; the players reconnect and are routed to its owner."""
+        connections = list(self._room_connections.get(game_id, ()))
+        for connection in connections:
+            self.forget(connection)
+        await asyncio.gather(
+            *(self._close_quietly(connection.websocket, close_code) for connection in connections)
+        )
+
+    @property
+    def room_count(self) -> int:
+        return len(self._rooms)
+
     def get_connected_count(self, game_id: int) -> int:
-        return len(self._room_connections.get(game_id, {}))
+        """Distinct players with a socket in the room."""
+        connections = self._room_connections.get(game_id)
+        if not connections:
+            return 0
+        return len({connection.user_id for connection in connections})
+
+    def queue_depths(self) -> list[int]:
+        return [connection.queue_depth for connection in self._connections.values()]
 
     async def send_personal(self, websocket: WebSocket, payload: dict) -> None:
+        frame = self._encode(payload)
+        connection = self._connections.get(websocket)
+        if connection is not None:
+            connection.enqueue(frame, COALESCE_KEYS.get(payload.get("type")))
+            return
+
         try:
-            await websocket.send_json(payload)
+            await websocket.send_text(frame)
         except (WebSocketDisconnect, RuntimeError):
             return
 
-    async def broadcast(self, game_id: int, payload: dict) -> None:
-        room_map = self._room_connections.get(game_id, {})
-        stale_sockets: list[tuple[int, WebSocket]] = []
-
-        for user_id, user_sockets in list(room_map.items()):
-            for websocket in list(user_sockets):
-                try:
-                    await websocket.send_json(payload)
-                except (WebSocketDisconnect, RuntimeError):
-                    stale_sockets.append((user_id, websocket))
-
-        if stale_sockets:
-            async with self._lock:
-                target_room = self._room_connections.get(game_id, {})
-                for user_id, websocket in stale_sockets:
-                    user_sockets = target_room.get(user_id, set())
-                    if websocket in user_sockets:
-                        user_sockets.remove(websocket)
-                    if not user_sockets and user_id in target_room:
-                        target_room.pop(user_id, None)
-                    if user_id in self._user_connections:
-                        self._user_connections[user_id] -= 1
-                        if self._user_connections[user_id] <= 0:
-                            self._user_connections.pop(user_id, None)
+    async def broadcast(self, game_id: int, payload: dict, *, delta: dict | None = None) -> None:
+        """
+        Queue payload for every socket in the room; protocol 2 sockets get delta instead when given.
+
+        Each message is encoded once per fan-out and only enqueued here, so
+        the caller never waits on a socket.
+        """
+        connections = self._room_connections.get(game_id)
+        if not connections:
+            return
+
+        frames: dict[bool, tuple[str | None, str]] = {}
+        # A copy: enqueue() may evict a slow consumer, which removes it from the room's list.
+        for connection in list(connections):
+            use_delta = delta is not None and connection.protocol >= PROTOCOL_DELTA
+            if use_delta not in frames:
+                message = delta if use_delta else payload
+                frames[use_delta] = (COALESCE_KEYS.get(message.get("type")), self._encode(message))
+            coalesce_key, frame = frames[use_delta]
+            connection.enqueue(frame, coalesce_key)
+
+    async def _close_quietly(self, websocket: WebSocket, code: int) -> None:
+        try:
+            await asyncio.wait_for(websocket.close(code=code), self.send_timeout)
+        except Exception:
+            pass
 
 
 realtime_manager = RealtimeManager()
+
+metrics.gauge("realtime_rooms_resident", "Rooms held in this worker's memory", lambda: realtime_manager.room_count)
+metrics.gauge(
+    "ws_send_queue_depth",
+    "Frames waiting in all outbound socket queues",
+    lambda: sum(realtime_manager.queue_depths()),
+)
+metrics.gauge(
+    "ws_send_queue_depth_max",
+    "Deepest outbound socket queue",
+    lambda: max(realtime_manager.queue_depths(), default=0),
+)
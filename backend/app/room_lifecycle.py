@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import sys
+import time
+from collections import deque
+from itertools import islice
+from typing import Callable
+
+from app.metrics import metrics
+from app.realtime import RealtimeManager, RoomState
+
+
+rooms_evicted = metrics.counter("realtime_rooms_evicted_total", "Rooms dropped from memory by the reaper")
+
+# Containers and library objects a room owns; anything else (tasks, sockets) is counted shallow.
+_DEEP_TYPES = (dict, list, tuple, set, deque)
+
+
+def _deep_size(obj, seen: set[int]) -> int:
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(key, seen) + _deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, _DEEP_TYPES):
+        size += sum(_deep_size(item, seen) for item in obj)
+    elif type(obj).__module__ in {"chess", "app.realtime"}:
+        if hasattr(obj, "__dict__"):
+            size += _deep_size(vars(obj), seen)
+        for name in getattr(type(obj), "__slots__", ()):
+            size += _deep_size(getattr(obj, name, None), seen)
+    return size
+
+
+def approx_room_bytes(room: RoomState) -> int:
+    """Heap bytes held by one room: board and its move stack, clocks, chat, player info."""
+    return _deep_size(room, set())
+
+
+class RoomReaper:
+    """
+    Keeps the rooms of a worker bounded.
+
+    Rooms are created by joins, state requests, snapshot restores and
+    handoffs, and nothing in the game flow removes them. Every `interval`
+    seconds the reaper evicts rooms nobody is connected to: finished ones
+    after finished_ttl, unfinished ones after idle_ttl without a move, chat
+    or join, and then the least recently active ones while more than
+    max_rooms are resident. A room with a socket, a running disconnect
+    grace or a pinned state (moves not written yet) is never evicted; an
+    evicted room is rebuilt from Postgres on the next join.
+    """
+
+    def __init__(
+        self,
+        realtime: RealtimeManager,
+        *,
+        finished_ttl: float = 60.0,
+        idle_ttl: float = 3600.0,
+        max_rooms: int = 20_000,
+        interval: float = 10.0,
+        pinned: Callable[[RoomState], bool] | None = None,
+        on_evict: Callable[[RoomState], None] | None = None,
+    ) -> None:
+        self.realtime = realtime
+        self.finished_ttl = finished_ttl
+        self.idle_ttl = idle_ttl
+        self.max_rooms = max_rooms
+        self.interval = interval
+        self._pinned = pinned
+        self._on_evict = on_evict
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception:
+                pass
+
+    def _evictable(self, room: RoomState) -> bool:
+        if self.realtime.get_connected_count(room.game_id):
+            return False
+        if room.has_disconnect_grace():
+            return False
+        return self._pinned is None or not self._pinned(room)
+
+    def sweep(self, now: float | None = None) -> int:
+        """Evict expired rooms, then the least recently active over the cap; returns the number evicted."""
+        now = time.monotonic() if now is None else now
+        idle: list[RoomState] = []
+        evicted = 0
+        for room in self.realtime.rooms():
+            if not self._evictable(room):
+                continue
+            ttl = self.finished_ttl if room.finished else self.idle_ttl
+            if now - room.last_active >= ttl:
+                self._evict(room, "finished" if room.finished else "idle")
+                evicted += 1
+            else:
+                idle.append(room)
+
+        excess = self.realtime.room_count - self.max_rooms
+        if excess > 0:
+            for room in heapq.nsmallest(excess, idle, key=lambda room: room.last_active):
+                self._evict(room, "capacity")
+                evicted += 1
+        return evicted
+
+    def _evict(self, room: RoomState, reason: str) -> None:
+        self.realtime.release_room(room.game_id)
+        rooms_evicted.inc(reason=reason)
+        if self._on_evict is not None:
+            self._on_evict(room)
+
+    def average_room_bytes(self, sample: int = 32) -> int:
+        rooms = list(islice(reversed(self.realtime.rooms()), sample))
+        if not rooms:
+            return 0
+        return sum(map(approx_room_bytes, rooms)) // len(rooms)
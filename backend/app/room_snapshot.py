@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import struct
+import zlib
+from typing import Callable
+
+from app.game_record import decode_record, pack_plies
+from app.metrics import metrics
+from app.realtime import CHAT_HISTORY_LIMIT, RoomState
+
+
+FILE_MAGIC = b"RSNAP1\n"
+FRAME_ROOM = 1
+
+# kind, payload length, crc32(payload)
+FRAME_HEADER = struct.Struct(">BII")
+# game_id, white_id, black_id, draw_offered_by (-1 = None), white_ms, black_ms,
+# state_seq, chat_version, time_control_minutes, flags
+ROOM_HEADER = struct.Struct(">qqqqiiIIHB")
+BLOB_LENGTH = struct.Struct(">I")
+
+_FLAG_AI = 1
+_FLAG_FINISHED = 2
+_FLAG_CLOCK_STARTED = 4
+
+# Running clocks change every tick; only rewrite a room when they moved by this much (or on shutdown).
+CLOCK_GRANULARITY_MS = 10_000
+
+snapshot_frames_total = metrics.counter("room_snapshot_frames_total", "Room frames appended to the snapshot file")
+snapshot_restored_total = metrics.counter("room_snapshot_restored_total", "Rooms restored from the snapshot file")
+
+
+def _opt(value: int | None) -> int:
+    return -1 if value is None else value
+
+
+def _unopt(value: int) -> int | None:
+    return None if value == -1 else value
+
+
+def _json_blob(value) -> bytes:
+    return b"" if value is None else json.dumps(value, separators=(",", ":")).encode()
+
+
+def encode_room(room: RoomState) -> bytes:
+    flags = (
+        (_FLAG_AI if room.is_ai else 0)
+        | (_FLAG_FINISHED if room.finished else 0)
+        | (_FLAG_CLOCK_STARTED if room.clock_started else 0)
+    )
+    parts = [
+        ROOM_HEADER.pack(
+            room.game_id,
+            _opt(room.white_id),
+            _opt(room.black_id),
+            _opt(room.draw_offered_by),
+            room.white_ms,
+            room.black_ms,
+            room.state_seq,
+            room.chat_version,
+            room.time_control_minutes,
+            flags,
+        )
+    ]
+    blobs = (
+        (room.start_fen or "").encode(),
+        pack_plies(room.board.move_stack, room.move_clocks),
+        _json_blob(room.white_info),
+        _json_blob(room.black_info),
+        _json_blob(room.chat_history()) if room.chat_messages else b"",
+    )
+    for blob in blobs:
+        parts.append(BLOB_LENGTH.pack(len(blob)))
+        parts.append(blob)
+    return b"".join(parts)
+
+
+def decode_room(payload: bytes) -> RoomState:
+    (
+        game_id, white_id, black_id, draw_offered_by, white_ms, black_ms,
+        state_seq, chat_version, time_control_minutes, flags,
+    ) = ROOM_HEADER.unpack_from(payload)
+    offset = ROOM_HEADER.size
+    blobs: list[bytes] = []
+    for _ in range(5):
+        (length,) = BLOB_LENGTH.unpack_from(payload, offset)
+        offset += BLOB_LENGTH.size
+        blobs.append(payload[offset:offset + length])
+        offset += length
+    start_fen_raw, moves, white_info, black_info, chat = blobs
+
+    start_fen = start_fen_raw.decode() or None
+    board, move_clocks = decode_record(start_fen, moves)
+    return RoomState(
+        game_id=game_id,
+        white_id=_unopt(white_id),
+        black_id=_unopt(black_id),
+        white_info=json.loads(white_info) if white_info else None,
+        black_info=json.loads(black_info) if black_info else None,
+        board=board,
+        white_ms=white_ms,
+        black_ms=black_ms,
+        time_control_minutes=time_control_minutes,
+        is_ai=bool(flags & _FLAG_AI),
+        finished=bool(flags & _FLAG_FINISHED),
+        clock_started=bool(flags & _FLAG_CLOCK_STARTED),
+        chat_messages=json.loads(chat)[-CHAT_HISTORY_LIMIT:] if chat else None,
+        draw_offered_by=_unopt(draw_offered_by),
+        chat_version=chat_version,
+        state_seq=state_seq,
+        move_clocks=move_clocks,
+        # Set by RoomSnapshotStore.take from what Postgres already holds.
+        recorded_plies=0,
+        start_fen=start_fen,
+    )
+
+
+def _frame(payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(FRAME_ROOM, len(payload), zlib.crc32(payload)) + payload
+
+
+class RoomSnapshotStore:
+    """
+    Append-only file of RoomState frames, one per room change.
+
+    A background task appends a frame for every room that changed since its
+    last frame; shutdown appends every room. On startup load() only indexes
+    the newest frame per game (a torn tail from a crash is ignored), and
+    take() decodes a room the first time a player or a state request asks
+    for it. Once stale frames make up most of the file it is rewritten with
+    just the newest frame of each room.
+    """
+
+    def __init__(self, path: str, interval: float = 5.0, compact_ratio: float = 3.0) -> None:
+        self.path = path
+        self._interval = interval
+        self._compact_ratio = compact_ratio
+        # File contents as of load(), and game_id -> (offset, length) of rooms not restored yet.
+        self._data = b""
+        self._index: dict[int, tuple[int, int]] = {}
+        # game_id -> newest frame of every room this process has restored or written.
+        self._live: dict[int, bytes] = {}
+        # game_id -> change key at its newest frame.
+        self._written: dict[int, tuple] = {}
+        self._file_size = 0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending_restore_count(self) -> int:
+        return len(self._index)
+
+    def load(self) -> int:
+        """Index the newest frame of every game in the file; returns the number of restorable rooms."""
+        try:
+            with open(self.path, "rb") as source:
+                data = source.read()
+        except FileNotFoundError:
+            data = b""
+
+        index: dict[int, tuple[int, int]] = {}
+        offset = len(FILE_MAGIC) if data.startswith(FILE_MAGIC) else len(data)
+        while offset + FRAME_HEADER.size <= len(data):
+            kind, length, crc = FRAME_HEADER.unpack_from(data, offset)
+            start = offset + FRAME_HEADER.size
+            end = start + length
+            if kind != FRAME_ROOM or end > len(data) or zlib.crc32(data[start:end]) != crc:
+                break
+            (game_id,) = struct.unpack_from(">q", data, start)
+            index[game_id] = (offset, end - offset)
+            offset = end
+
+        self._data = data
+        self._index = index
+        self._file_size = len(data)
+        if offset < len(data) or not data.startswith(FILE_MAGIC):
+            # Torn tail or foreign file: keep only the frames that checked out.
+            self._file_size = self._replace(self._compacted())
+        return len(index)
+
+    def take(self, game_id: int, persisted_plies: int = 0) -> RoomState | None:
+        """
+        Decode the snapshot of a game. persisted_plies is the game's move_count
+        in Postgres: an older snapshot (crash between frames) is discarded so
+        the caller rebuilds the room from game_records instead.
+        """
+        entry = self._index.pop(game_id, None)
+        if entry is None:
+            return None
+        offset, length = entry
+        frame = self._data[offset:offset + length]
+        if not self._index:
+            self._data = b""
+
+        room = decode_room(frame[FRAME_HEADER.size:])
+        if len(room.board.move_stack) < persisted_plies:
+            return None
+        room.recorded_plies = persisted_plies
+        self._live[game_id] = frame
+        self._written[game_id] = self._change_key(room)
+        snapshot_restored_total.inc()
+        return room
+
+    def forget(self, game_id: int) -> None:
+        """Stop carrying an evicted room; its frames leave the file at the next compaction."""
+        self._live.pop(game_id, None)
+        self._written.pop(game_id, None)
+
+    def start(self, get_rooms: Callable[[], list[RoomState]]) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(get_rooms))
+
+    async def _run(self, get_rooms: Callable[[], list[RoomState]]) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            frames = self._encode_changed(get_rooms(), force=False)
+            try:
+                if frames:
+                    self._file_size = await asyncio.to_thread(self._append, frames)
+                if self._needs_compaction():
+                    self._file_size = await asyncio.to_thread(self._replace, self._compacted())
+            except OSError:
+                # Write the same rooms again next round.
+                self._written.clear()
+
+    def snapshot_all(self, rooms: list[RoomState]) -> None:
+        """Append every room synchronously (shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        frames = self._encode_changed(rooms, force=True)
+        if frames:
+            self._file_size = self._append(frames)
+
+    @staticmethod
+    def _change_key(room: RoomState) -> tuple:
+        return (
+            room.state_seq,
+            room.chat_version,
+            room.finished,
+            room.white_ms // CLOCK_GRANULARITY_MS,
+            room.black_ms // CLOCK_GRANULARITY_MS,
+        )
+
+    def _encode_changed(self, rooms: list[RoomState], force: bool) -> list[bytes]:
+        frames: list[bytes] = []
+        for room in rooms:
+            key = self._change_key(room)
+            if not force and self._written.get(room.game_id) == key:
+                continue
+            frame = _frame(encode_room(room))
+            self._written[room.game_id] = key
+            self._live[room.game_id] = frame
+            frames.append(frame)
+        return frames
+
+    def _needs_compaction(self) -> bool:
+        live_size = sum(map(len, self._live.values())) + sum(length for _, length in self._index.values())
+        return self._file_size > self._compact_ratio * live_size + 1024 * 1024
+
+    def _compacted(self) -> bytes:
+        frames = [self._data[offset:offset + length] for offset, length in self._index.values()]
+        frames.extend(self._live.values())
+        return b"".join(frames)
+
+    def _append(self, frames: list[bytes]) -> int:
+        with open(self.path, "ab") as out:
+            if out.tell() == 0:
+                out.write(FILE_MAGIC)
+            out.write(b"".join(frames))
+            out.flush()
+            os.fsync(out.fileno())
+            size = out.tell()
+        snapshot_frames_total.inc(len(frames))
+        return size
+
+    def _replace(self, frames: bytes) -> int:
+        """Atomically swap the file for one holding just `frames`."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(FILE_MAGIC)
+            out.write(frames)
+            out.flush()
+            os.fsync(out.fileno())
+            size = out.tell()
+        os.replace(tmp_path, self.path)
+        return size
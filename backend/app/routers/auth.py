@@ -5,8 +5,10 @@ from sqlalchemy.orm import Session
 from app.auth import create_token, decode_token, hash_password, verify_password
 from app.core_config import settings
 from app.db import get_db
+from app.leaderboard import leaderboard
 from app.models import User
 from app.schemas import LoginRequest, RefreshRequest, RegisterRequest, TokenResponse
+from app.user_search import user_search
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -31,6 +33,8 @@ def register(payload: RegisterRequest, db: Session = Depends(get_db)):
     db.add(user)
     db.commit()
     db.refresh(user)
+    leaderboard.publish(user.id, user.username, user.display_name, user.elo)
+    user_search.publish(user.id, user.username, user.display_name)
 
     access_token = create_token(str(user.id), settings.access_token_expire_minutes, "access")
     refresh_token = create_token(str(user.id), settings.refresh_token_expire_minutes, "refresh")
@@ -1,18 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import and_, or_, select
+from sqlalchemy import and_, or_, select, union_all
 from sqlalchemy.orm import Session
 
 from app.db import get_db
 from app.deps import get_current_user
+from app.friend_graph import friend_graph
 from app.models import Friendship, User
 from app.presence import is_online
 from app.schemas import FriendOut, FriendRequestOut, UserSearchOut
+from app.user_loader import UserLoader, UserProjection, get_user_loader
+from app.user_search import user_search
 
 
 router = APIRouter(prefix="/friends", tags=["friends"])
 
 
-def _user_search_out(user: User) -> UserSearchOut:
+def _user_search_out(user: User | UserProjection) -> UserSearchOut:
     return UserSearchOut(
         id=user.id,
         username=user.username,
@@ -33,41 +36,47 @@ def _relation_between(db: Session, user_a: int, user_b: int) -> Friendship | Non
     )
 
 
+def _friend_requests_out(requests: list[Friendship], users: UserLoader, current_user: User) -> list[FriendRequestOut]:
+    users.prime(current_user)
+    loaded = users.load(user_id for relation in requests for user_id in (relation.requester_id, relation.addressee_id))
+    result: list[FriendRequestOut] = []
+    for relation in requests:
+        requester = loaded.get(relation.requester_id)
+        addressee = loaded.get(relation.addressee_id)
+        result.append(
+            FriendRequestOut(
+                id=relation.id,
+                requester_id=relation.requester_id,
+                addressee_id=relation.addressee_id,
+                status=relation.status,
+                created_at=relation.created_at,
+                requester=_user_search_out(requester) if requester else None,
+                addressee=_user_search_out(addressee) if addressee else None,
+            )
+        )
+    return result
+
+
 @router.get("/search", response_model=list[UserSearchOut])
 def search_users(
     q: str = Query(min_length=2, max_length=80),
     db: Session = Depends(get_db),
+    users: UserLoader = Depends(get_user_loader),
     current_user: User = Depends(get_current_user),
 ):
-    pattern = f"%{q.strip()}%"
-    relations = db.scalars(
-        select(Friendship).where(
-            or_(Friendship.requester_id == current_user.id, Friendship.addressee_id == current_user.id)
-        )
-    ).all()
-    related_ids = {
-        relation.addressee_id if relation.requester_id == current_user.id else relation.requester_id
-        for relation in relations
-    }
-
-    users = db.scalars(
-        select(User)
-        .where(
-            User.id != current_user.id,
-            User.is_active.is_(True),
-            or_(User.username.ilike(pattern), User.display_name.ilike(pattern)),
+    related_ids = set(
+        db.scalars(
+            union_all(
+                select(Friendship.addressee_id).where(Friendship.requester_id == current_user.id),
+                select(Friendship.requester_id).where(Friendship.addressee_id == current_user.id),
+            )
         )
-        .order_by(User.username.asc())
-        .limit(12)
-    ).all()
-
-    result: list[UserSearchOut] = []
-    for user in users:
-        if user.id in related_ids:
-            continue
-        result.append(_user_search_out(user))
+    )
+    related_ids.add(current_user.id)
 
-    return result
+    ids = user_search.search(q, exclude=related_ids, limit=12)
+    loaded = users.load(ids)
+    return [_user_search_out(loaded[user_id]) for user_id in ids if user_id in loaded]
 
 
 @router.post("/{user_id}")
@@ -97,55 +106,33 @@ def send_friend_request(user_id: int, db: Session = Depends(get_db), current_use
 
 
 @router.get("/requests/incoming", response_model=list[FriendRequestOut])
-def incoming_requests(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def incoming_requests(
+    db: Session = Depends(get_db),
+    users: UserLoader = Depends(get_user_loader),
+    current_user: User = Depends(get_current_user),
+):
     requests = db.scalars(
         select(Friendship)
         .where(Friendship.addressee_id == current_user.id, Friendship.status == "pending")
         .order_by(Friendship.created_at.desc())
     ).all()
 
-    result: list[FriendRequestOut] = []
-    for relation in requests:
-        requester = db.get(User, relation.requester_id)
-        addressee = db.get(User, relation.addressee_id)
-        result.append(
-            FriendRequestOut(
-                id=relation.id,
-                requester_id=relation.requester_id,
-                addressee_id=relation.addressee_id,
-                status=relation.status,
-                created_at=relation.created_at,
-                requester=_user_search_out(requester) if requester else None,
-                addressee=_user_search_out(addressee) if addressee else None,
-            )
-        )
-    return result
+    return _friend_requests_out(requests, users, current_user)
 
 
 @router.get("/requests/outgoing", response_model=list[FriendRequestOut])
-def outgoing_requests(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def outgoing_requests(
+    db: Session = Depends(get_db),
+    users: UserLoader = Depends(get_user_loader),
+    current_user: User = Depends(get_current_user),
+):
     requests = db.scalars(
         select(Friendship)
         .where(Friendship.requester_id == current_user.id, Friendship.status == "pending")
         .order_by(Friendship.created_at.desc())
     ).all()
 
-    result: list[FriendRequestOut] = []
-    for relation in requests:
-        requester = db.get(User, relation.requester_id)
-        addressee = db.get(User, relation.addressee_id)
-        result.append(
-            FriendRequestOut(
-                id=relation.id,
-                requester_id=relation.requester_id,
-                addressee_id=relation.addressee_id,
-                status=relation.status,
-                created_at=relation.created_at,
-                requester=_user_search_out(requester) if requester else None,
-                addressee=_user_search_out(addressee) if addressee else None,
-            )
-        )
-    return result
+    return _friend_requests_out(requests, users, current_user)
 
 
 @router.post("/requests/{requester_id}/accept")
@@ -163,6 +150,7 @@ def accept_request(requester_id: int, db: Session = Depends(get_db), current_use
     relation.status = "accepted"
     db.add(relation)
     db.commit()
+    friend_graph.publish(requester_id, current_user.id)
     return {"message": "Friend request accepted"}
 
 
@@ -194,22 +182,21 @@ def remove_friend(user_id: int, db: Session = Depends(get_db), current_user: Use
 
     db.delete(friendship)
     db.commit()
+    friend_graph.publish(current_user.id, user_id)
     return {"message": "Friend removed"}
 
 
 @router.get("", response_model=list[FriendOut])
-def list_friends(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    relations = db.scalars(
-        select(Friendship).where(
-            or_(Friendship.requester_id == current_user.id, Friendship.addressee_id == current_user.id),
-            Friendship.status == "accepted",
-        )
-    ).all()
-
+def list_friends(
+    db: Session = Depends(get_db),
+    users: UserLoader = Depends(get_user_loader),
+    current_user: User = Depends(get_current_user),
+):
+    friend_ids = sorted(friend_graph.friends(db, current_user.id))
+    loaded = users.load(friend_ids)
     result: list[FriendOut] = []
-    for relation in relations:
-        friend_id = relation.addressee_id if relation.requester_id == current_user.id else relation.requester_id
-        friend = db.get(User, friend_id)
+    for friend_id in friend_ids:
+        friend = loaded.get(friend_id)
         if friend:
             result.append(
                 FriendOut(
@@ -1,15 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db import get_db
+from app.db import get_async_db, get_db
 from app.deps import get_current_user
-from app.models import Game, User
+from app.json_codec import default_encoder
+from app.leaderboard import body_etag, leaderboard
+from app.matchmaking import active_games
+from app.models import Game, GameRecord, User
 from app.realtime import realtime_manager
 from app.schemas import CreateAIGameRequest
 
 
 router = APIRouter(prefix="/games", tags=["games"])
 
+_encode = default_encoder()
+
 
 def _time_minutes_from_mode(mode: str) -> int:
     if mode.startswith("ai:"):
@@ -44,6 +50,7 @@ def create_vs_ai_game(
     db.add(game)
     db.commit()
     db.refresh(game)
+    active_games.started(game)
     return {
         "game_id": game.id,
         "mode": game.mode,
@@ -122,10 +129,32 @@ def game_history(db: Session = Depends(get_db), current_user: User = Depends(get
     return history
 
 
+def _cached_json(request: Request, etag: str, body: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
 @router.get("/leaderboard")
-def leaderboard(db: Session = Depends(get_db), _: User = Depends(get_current_user)):
-    users = db.query(User).order_by(User.elo.desc()).limit(20).all()
-    return [{"id": u.id, "username": u.username, "display_name": u.display_name, "elo": u.elo} for u in users]
+async def leaderboard_top(
+    request: Request,
+    limit: int = Query(default=20, ge=1, le=100),
+    _: User = Depends(get_current_user),
+):
+    etag, body = leaderboard.top(limit)
+    return _cached_json(request, etag, body)
+
+
+@router.get("/leaderboard/me")
+async def leaderboard_me(
+    request: Request,
+    span: int = Query(default=5, ge=0, le=25),
+    current_user: User = Depends(get_current_user),
+):
+    around = leaderboard.around(current_user.id, current_user.username, current_user.display_name, current_user.elo, span)
+    body = _encode({"rank": leaderboard.rank(current_user.elo), "elo": current_user.elo, "around": around})
+    return _cached_json(request, body_etag(body), body)
 
 
 @router.get("/{game_id}")
@@ -170,22 +199,12 @@ def get_game(game_id: int, db: Session = Depends(get_db), current_user: User = D
     }
 
 
-@router.get("/{game_id}/state")
-def get_game_state(game_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    game = db.get(Game, game_id)
-    if not game:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Game not found")
-
-    allowed = current_user.id == game.white_id or current_user.id == game.black_id
-    if game.mode.startswith("ai:") and current_user.id == game.white_id:
-        allowed = True
-    if not allowed:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
-
+async def load_room_state(db: AsyncSession, game: Game) -> dict:
+    """STATE_SYNC payload of a game from this worker's room, loading the room if it is not live."""
     initial_minutes = _time_minutes_from_mode(game.mode)
 
-    white_user = db.get(User, game.white_id) if game.white_id else None
-    black_user = db.get(User, game.black_id) if game.black_id else None
+    white_user = await db.get(User, game.white_id) if game.white_id else None
+    black_user = await db.get(User, game.black_id) if game.black_id else None
 
     def _player_info(u: User | None):
         return {"id": u.id, "username": u.username, "display_name": u.display_name} if u else None
@@ -198,16 +217,56 @@ def get_game_state(game_id: int, db: Session = Depends(get_db), current_user: Us
         difficulty = parts[1] if len(parts) >= 2 else "medium"
         black_info = {"id": None, "username": "ai", "display_name": f"AI ({difficulty.capitalize()})"}
 
-    room = realtime_manager.get_or_create_room(
-        game.id,
-        game.white_id,
-        game.black_id,
-        game.final_fen,
-        white_info=white_info,
-        black_info=black_info,
-        initial_ms=initial_minutes * 60 * 1000,
-        time_control_minutes=initial_minutes,
-        is_ai=game.mode.startswith("ai:"),
-        finished=game.status == "finished",
-    )
+    async with realtime_manager.room_lock(game.id):
+        record = None
+        if not realtime_manager.restore_room(game.id, game.move_count):
+            game_record = await db.get(GameRecord, game.id)
+            if game_record is not None:
+                record = (game_record.start_fen, game_record.moves)
+
+        room = realtime_manager.get_or_create_room(
+            game.id,
+            game.white_id,
+            game.black_id,
+            game.final_fen,
+            white_info=white_info,
+            black_info=black_info,
+            initial_ms=initial_minutes * 60 * 1000,
+            time_control_minutes=initial_minutes,
+            is_ai=game.mode.startswith("ai:"),
+            finished=game.status == "finished",
+            record=record,
+        )
     return room.to_payload()
+
+
+@router.get("/{game_id}/state")
+async def get_game_state(
+    game_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    game = await db.get(Game, game_id)
+    if not game:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Game not found")
+
+    allowed = current_user.id == game.white_id or current_user.id == game.black_id
+    if game.mode.startswith("ai:") and current_user.id == game.white_id:
+        allowed = True
+    if not allowed:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
+
+    # Only the owning worker may hold the room; anywhere else would fork its board.
+    cluster = realtime_manager.cluster
+    if cluster is not None:
+        try:
+            owner = await cluster.owner_of(game_id)
+            if owner != cluster.worker_id:
+                state = await cluster.request_state(owner, game_id)
+                if state is None:
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Game not found")
+                return state
+        except ConnectionError:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Room owner unavailable")
+
+    return await load_room_state(db, game)
@@ -1,101 +1,55 @@
 from __future__ import annotations
 
-from collections import deque
-from random import shuffle
-from threading import Lock
-
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-
-from app.db import get_db
-from app.deps import get_current_user
-from app.models import Game, User
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core_config import settings
+from app.db import get_async_db
+from app.deps import get_current_user, get_current_user_id
+from app.matchmaking import active_games, matchmaking_engine
+from app.models import User
 from app.schemas import MatchmakingJoinRequest
 
 
 router = APIRouter(prefix="/matchmaking", tags=["matchmaking"])
 
-_queues: dict[int, deque[int]] = {5: deque(), 10: deque(), 30: deque()}
-_pending_matches: dict[int, int] = {}
-_lock = Lock()
-
-
-def _remove_from_all_queues(user_id: int) -> None:
-    for key in _queues:
-        _queues[key] = deque(uid for uid in _queues[key] if uid != user_id)
-
 
 @router.post("/join")
-def join_queue(
+async def join_queue(
     payload: MatchmakingJoinRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
-    from fastapi import HTTPException, status
-    queue = _queues[payload.time_minutes]
-    with _lock:
-        active_game = db.query(Game).filter(
-            ((Game.white_id == current_user.id) | (Game.black_id == current_user.id)),
-            Game.status != "finished"
-        ).first()
-        if active_game:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You already have an active game in progress")
-
-        matched_game_id = _pending_matches.pop(current_user.id, None)
-        if matched_game_id:
-            return {"status": "matched", "game_id": matched_game_id}
+    user_id = current_user.id
+    current = matchmaking_engine.status(user_id)
+    if current["status"] == "matched":
+        return current
 
-        for minutes, q in _queues.items():
-            if current_user.id in q:
-                position = list(q).index(current_user.id) + 1
-                if minutes == payload.time_minutes:
-                    return {
-                        "status": "waiting",
-                        "position": position,
-                        "time_minutes": minutes,
-                    }
-                _remove_from_all_queues(current_user.id)
-                break
+    if await active_games.get(db, user_id) is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You already have an active game in progress")
 
-        if queue:
-            opponent_id = queue.popleft()
-            players = [current_user.id, opponent_id]
-            shuffle(players)
-            white_id, black_id = players
+    opponent_id = matchmaking_engine.pair(user_id, payload.time_minutes, current_user.elo)
+    if opponent_id is None:
+        return matchmaking_engine.status(user_id)
 
-            game = Game(mode=f"1v1:{payload.time_minutes}", white_id=white_id, black_id=black_id, status="playing")
-            db.add(game)
-            db.commit()
-            db.refresh(game)
-
-            _pending_matches[opponent_id] = game.id
-            return {"status": "matched", "game_id": game.id, "time_minutes": payload.time_minutes}
-
-        queue.append(current_user.id)
-        return {"status": "waiting", "position": len(queue), "time_minutes": payload.time_minutes}
+    game_id = await matchmaking_engine.start_game(user_id, opponent_id, payload.time_minutes)
+    return {"status": "matched", "game_id": game_id, "time_minutes": payload.time_minutes}
 
 
 @router.delete("/leave")
-def leave_queue(current_user: User = Depends(get_current_user)):
-    with _lock:
-        _remove_from_all_queues(current_user.id)
-        _pending_matches.pop(current_user.id, None)
+async def leave_queue(user_id: int = Depends(get_current_user_id)):
+    matchmaking_engine.leave(user_id)
     return {"status": "left"}
 
 
 @router.get("/status")
-def queue_status(current_user: User = Depends(get_current_user)):
-    with _lock:
-        matched_game_id = _pending_matches.pop(current_user.id, None)
-        if matched_game_id:
-            return {"status": "matched", "game_id": matched_game_id}
-
-        for minutes, q in _queues.items():
-            if current_user.id in q:
-                return {
-                    "status": "waiting",
-                    "position": list(q).index(current_user.id) + 1,
-                    "time_minutes": minutes,
-                }
-
-    return {"status": "idle"}
+async def queue_status(
+    wait: float = Query(default=0, ge=0),
+    user_id: int = Depends(get_current_user_id),
+):
+    """
+    Lobby status. With `wait`, a long poll: the request is held until the
+    player is matched or leaves, or for at most `wait` seconds (capped by
+    settings.matchmaking_max_wait_seconds), and then answers as without it.
+    """
+    return await matchmaking_engine.wait(user_id, min(wait, settings.matchmaking_max_wait_seconds))
@@ -2,12 +2,16 @@ import os
 from uuid import uuid4
 
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db import get_db
+from app.db import get_async_db, get_db
 from app.deps import get_current_user
-from app.models import User, Friendship, Game, UserAchievement
+from app.friend_graph import friend_graph
+from app.leaderboard import leaderboard
+from app.models import User, Game, UserAchievement
 from app.schemas import UserOut, UserUpdateRequest
+from app.user_search import user_search
 
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -27,6 +31,8 @@ def update_me(payload: UserUpdateRequest, db: Session = Depends(get_db), current
     db.add(current_user)
     db.commit()
     db.refresh(current_user)
+    leaderboard.publish(current_user.id, current_user.username, current_user.display_name)
+    user_search.publish(current_user.id, current_user.username, current_user.display_name)
     return current_user
 
 
@@ -39,7 +45,7 @@ def get_user(user_id: int, db: Session = Depends(get_db), _: User = Depends(get_
 
 
 @router.post("/me/avatar", response_model=UserOut)
-async def upload_avatar(file: UploadFile = File(...), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def upload_avatar(file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     if file.content_type not in ALLOWED_MIME_TYPES:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid file type")
 
@@ -55,19 +61,15 @@ async def upload_avatar(file: UploadFile = File(...), db: Session = Depends(get_
     with open(avatar_path, "wb") as out:
         out.write(content)
 
-    current_user.avatar_url = f"/uploads/{avatar_name}"
-    db.add(current_user)
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    user = await db.get(User, current_user.id)
+    user.avatar_url = f"/uploads/{avatar_name}"
+    await db.commit()
+    return user
 
 
 def _get_achievements_for_user(db: Session, user: User):
     # --- Compute live conditions ---
-    has_friend = db.query(Friendship).filter(
-        ((Friendship.requester_id == user.id) | (Friendship.addressee_id == user.id)) &
-        (Friendship.status == "accepted")
-    ).first() is not None
+    has_friend = bool(friend_graph.friends(db, user.id))
 
     high_elo = user.elo > 1250
 
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import Iterable, NamedTuple
+
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app.models import User
+
+
+# Bound parameters per IN list; SQLite builds before 3.32 accept at most 999.
+_IN_BATCH = 900
+
+
+class UserProjection(NamedTuple):
+    id: int
+    username: str
+    display_name: str
+    avatar_url: str | None
+
+
+class UserLoader:
+    """
+    Public user fields by id, fetched in batches.
+
+    load() asks for every id it has not seen yet in one `id IN (...)` query
+    over the columns the friends views show, instead of a db.get per
+    relation. Rows (and ids that matched nothing) stay in the loader's
+    identity cache, so with one loader per request an id that several
+    lookups need is fetched once; pass a shared `cache` to widen that.
+    """
+
+    def __init__(self, db: Session, cache: dict[int, UserProjection | None] | None = None) -> None:
+        self.db = db
+        self._cache: dict[int, UserProjection | None] = {} if cache is None else cache
+
+    def prime(self, user: User) -> None:
+        """Seed the cache with an already loaded user (typically the caller)."""
+        self._cache[user.id] = UserProjection(user.id, user.username, user.display_name, user.avatar_url)
+
+    def load(self, ids: Iterable[int | None]) -> dict[int, UserProjection]:
+        wanted = {user_id for user_id in ids if user_id is not None}
+        missing = [user_id for user_id in wanted if user_id not in self._cache]
+        for start in range(0, len(missing), _IN_BATCH):
+            batch = missing[start:start + _IN_BATCH]
+            rows = self.db.execute(
+                select(User.id, User.username, User.display_name, User.avatar_url).where(User.id.in_(batch))
+            )
+            for row in rows:
+                self._cache[row.id] = UserProjection(*row)
+            for user_id in batch:
+                self._cache.setdefault(user_id, None)
+        return {user_id: user for user_id in wanted if (user := self._cache[user_id]) is not None}
+
+
+def get_user_loader(db: Session = Depends(get_db)) -> UserLoader:
+    return UserLoader(db)
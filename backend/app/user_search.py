@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import json
+import re
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from functools import partial
+from typing import Iterable
+
+import anyio
+
+from app.broker import Broker
+
+
+USER_SEARCH_CHANNEL = "user_search"
+
+# Word starts are posted under this marker plus their first 2 and 3 characters.
+_ANCHOR = "\x00"
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def _fold(text: str) -> str:
+    return text.casefold()
+
+
+def _grams(text: str) -> set[str]:
+    """Bigrams and trigrams of a folded name, plus its anchored word starts."""
+    grams = {text[index:index + 2] for index in range(len(text) - 1)}
+    grams.update(text[index:index + 3] for index in range(len(text) - 2))
+    for word in (text, *_SEPARATORS.split(text)):
+        if len(word) >= 2:
+            grams.add(_ANCHOR + word[:2])
+            grams.add(_ANCHOR + word[:3])
+    return grams
+
+
+def _starts_word(text: str, query: str) -> bool:
+    index = text.find(query)
+    while index > 0 and not _SEPARATORS.match(text[index - 1]):
+        index = text.find(query, index + 1)
+    return index >= 0
+
+
+def encode_users(rows: Iterable[tuple[int, str, str]]) -> bytes:
+    """Broker message for apply(): (id, username, display_name) of new or renamed players."""
+    return json.dumps([list(row) for row in rows], separators=(",", ":")).encode()
+
+
+class UserSearchIndex:
+    """
+    Active players' usernames and display names, searchable by substring.
+
+    Matches rank as usernames starting with the query (alphabetically, so an
+    exact username comes first), then players with a word of either name
+    starting with it, then the query anywhere in either name; the last two
+    in id order. Usernames are kept sorted (case-folded), so the first tier
+    is a bisect. Every bigram and trigram of both names, and the first two
+    and three characters of every word, is posted to an array of ids: the
+    other tiers read one posting list (the shorter of the query's anchored
+    word start and its rarest trigram, or its bigram for two characters)
+    and check candidates against their current names, stopping once the
+    limit is filled, instead of a `%q%` scan of users.
+
+    Built at startup and kept current on register and rename (through the
+    broker, so every worker sees them). Postings are append-only: a rename
+    posts the new grams and leaves stale entries for the check to skip.
+    """
+
+    def __init__(self) -> None:
+        self._names: dict[int, tuple[str, str]] = {}
+        self._postings: dict[str, array] = {}
+        # Folded usernames in order, and the id of each.
+        self._usernames: list[str] = []
+        self._username_ids: list[int] = []
+        self.broker: Broker | None = None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def load(self, rows: Iterable[tuple[int, str, str]]) -> None:
+        """Replace the index with (id, username, display_name) rows."""
+        names = self._names = {}
+        postings: defaultdict[str, array] = defaultdict(partial(array, "i"))
+        for user_id, username, display_name in rows:
+            names[user_id] = (username, display_name)
+            for gram in _grams(_fold(username)) | _grams(_fold(display_name)):
+                postings[gram].append(user_id)
+        self._postings = dict(postings)
+        ordered = sorted((_fold(username), user_id) for user_id, (username, _) in self._names.items())
+        self._usernames = [username for username, _ in ordered]
+        self._username_ids = [user_id for _, user_id in ordered]
+
+    def _post(self, user_id: int, username: str, display_name: str, previous: tuple[str, str] | None) -> None:
+        grams = _grams(_fold(username)) | _grams(_fold(display_name))
+        if previous is not None:
+            grams -= _grams(_fold(previous[0])) | _grams(_fold(previous[1]))
+        self._names[user_id] = (username, display_name)
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = array("i")
+            posting.append(user_id)
+
+    def _unlist(self, user_id: int, username: str) -> None:
+        folded = _fold(username)
+        index = bisect_left(self._usernames, folded)
+        while index < len(self._usernames) and self._usernames[index] == folded:
+            if self._username_ids[index] == user_id:
+                del self._usernames[index]
+                del self._username_ids[index]
+                return
+            index += 1
+
+    def add(self, user_id: int, username: str, display_name: str) -> None:
+        previous = self._names.get(user_id)
+        if previous == (username, display_name):
+            return
+        self._post(user_id, username, display_name, previous)
+        if previous is None or previous[0] != username:
+            if previous is not None:
+                self._unlist(user_id, previous[0])
+            index = bisect_left(self._usernames, _fold(username))
+            self._usernames.insert(index, _fold(username))
+            self._username_ids.insert(index, user_id)
+
+    def remove(self, user_id: int) -> None:
+        names = self._names.pop(user_id, None)
+        if names is not None:
+            self._unlist(user_id, names[0])
+
+    def apply(self, message: bytes) -> None:
+        """Broker handler for USER_SEARCH_CHANNEL."""
+        try:
+            rows = json.loads(message)
+        except ValueError:
+            return
+        for user_id, username, display_name in rows:
+            self.add(user_id, username, display_name)
+
+    def publish(self, user_id: int, username: str, display_name: str) -> None:
+        """
+        Index a committed registration or rename on every worker (this one
+        included). Called from sync endpoints, which run in a worker thread.
+        """
+        message = encode_users([(user_id, username, display_name)])
+        if self.broker is not None:
+            try:
+                anyio.from_thread.run(self.broker.publish, USER_SEARCH_CHANNEL, message)
+                return
+            except Exception:
+                pass
+        self.apply(message)
+
+    def _scan(self, posting: Iterable[int], matches, query: str, skip: set[int], found: list[int], limit: int) -> None:
+        for user_id in posting:
+            if user_id in skip:
+                continue
+            names = self._names.get(user_id)
+            if names is not None and (matches(_fold(names[0]), query) or matches(_fold(names[1]), query)):
+                skip.add(user_id)
+                found.append(user_id)
+                if len(found) >= limit:
+                    return
+
+    def search(self, query: str, exclude: set[int] = frozenset(), limit: int = 12) -> list[int]:
+        """Ids of the best `limit` matches for `query` (2+ characters), skipping `exclude`."""
+        query = _fold(query.strip())
+        if len(query) < 2:
+            return []
+        found: list[int] = []
+        index = bisect_left(self._usernames, query)
+        while len(found) < limit and index < len(self._usernames) and self._usernames[index].startswith(query):
+            if self._username_ids[index] not in exclude:
+                found.append(self._username_ids[index])
+            index += 1
+        if len(found) >= limit:
+            return found
+
+        empty = array("i")
+        grams = [query] if len(query) == 2 else [query[start:start + 3] for start in range(len(query) - 2)]
+        substring = min((self._postings.get(gram, empty) for gram in grams), key=len)
+        # A separator in the first three characters can start a word the anchors do not cover.
+        if _SEPARATORS.search(query[:3]) is None:
+            words = min(self._postings.get(_ANCHOR + query[:3], empty), substring, key=len)
+        else:
+            words = substring
+        skip = {*exclude, *found}
+        self._scan(words, _starts_word, query, skip, found, limit)
+        if len(found) < limit:
+            self._scan(substring, str.__contains__, query, skip, found, limit)
+        return found
+
+
+user_search = UserSearchIndex()
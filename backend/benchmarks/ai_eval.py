@@ -0,0 +1,78 @@
+"""
+Evaluator benchmark: incremental material/PST + attack mobility vs recounting.
+
+Run from the backend directory:
+
+    python -m benchmarks.ai_eval --depth 3
+
+Every position in benchmarks.ai_search.POSITIONS is searched to a fixed depth
+(no time limit, no blunders) by three engines that differ only in their leaf
+evaluation:
+
+* incremental  - the shipped ChessAI (scores kept up to date by _push/_pop)
+* recompute    - same evaluation recomputed from the board at every leaf;
+                 must choose exactly the same moves as incremental
+* legacy-eval  - board.pieces() material recount plus legal-move mobility,
+                 the evaluator used before this change (moves may differ)
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import chess
+
+from app.ai_engine import PIECE_VALUES, ChessAI
+from benchmarks.ai_search import POSITIONS
+
+
+class RecomputeChessAI(ChessAI):
+    def _evaluate_relative(self, board: chess.Board) -> int:
+        score = self._evaluate(board)
+        return score if board.turn == chess.WHITE else -score
+
+
+class LegacyEvalChessAI(ChessAI):
+    def _evaluate_relative(self, board: chess.Board) -> int:
+        score = 0
+        for piece_type, value in PIECE_VALUES.items():
+            score += len(board.pieces(piece_type, chess.WHITE)) * value
+            score -= len(board.pieces(piece_type, chess.BLACK)) * value
+        score += int(0.1 * board.legal_moves.count()) * (1 if board.turn == chess.WHITE else -1)
+        return score if board.turn == chess.WHITE else -score
+
+
+def _run(engine_cls: type[ChessAI], fen: str, depth: int) -> tuple[chess.Move | None, int, float]:
+    engine = engine_cls(depth=depth, blunder_rate=0.0)
+    start = time.perf_counter()
+    move = engine.search(chess.Board(fen))
+    return move, engine.nodes, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=3)
+    args = parser.parse_args()
+
+    engines = (("incremental", ChessAI), ("recompute", RecomputeChessAI), ("legacy-eval", LegacyEvalChessAI))
+    totals = {label: [0, 0.0] for label, _ in engines}
+    mismatches = 0
+    for name, fen in POSITIONS.items():
+        moves = {}
+        for label, engine_cls in engines:
+            move, nodes, elapsed = _run(engine_cls, fen, args.depth)
+            moves[label] = move
+            totals[label][0] += nodes
+            totals[label][1] += elapsed
+            print(f"{name:<11} {label:<12} {move.uci() if move else '-':<6} {nodes:>8} nodes {nodes / elapsed:>9.0f} nps")
+        if moves["incremental"] != moves["recompute"]:
+            mismatches += 1
+
+    print()
+    for label, (nodes, elapsed) in totals.items():
+        print(f"{label:<12} {nodes / elapsed:>9.0f} nps overall")
+    print(f"incremental vs recompute move mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
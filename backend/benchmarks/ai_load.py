@@ -0,0 +1,98 @@
+"""
+Human move-ack latency while N AI games are thinking.
+
+Run from the backend directory:
+
+    python -m benchmarks.ai_load --ai-games 0 2 4 8 --seconds 10 --workers 4
+
+For every AI game count the benchmark keeps that many "hard" searches
+running back to back through AIExecutor, once in thread mode (workers=0,
+the old asyncio.to_thread behaviour) and once with a process pool. A
+simulated human game submits a move every 20 ms; its ack latency is the
+time from the scheduled submit to the encoded STATE_SYNC being ready,
+which is what an event loop starved by the GIL delays.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import chess
+
+from app.ai_executor import AIExecutor
+from app.json_codec import default_encoder
+from app.realtime import RoomState
+
+
+async def _ai_game(executor: AIExecutor, game_id: int, stop: asyncio.Event) -> None:
+    board = chess.Board()
+    while not stop.is_set():
+        move = await executor.choose_move(game_id, board.copy(), "hard")
+        if move is None or board.is_game_over():
+            board = chess.Board()
+            continue
+        board.push(move)
+
+
+async def _human_game(stop: asyncio.Event, latencies: list[float]) -> None:
+    encode = default_encoder()
+    rng = random.Random(7)
+    room = RoomState(game_id=0, white_id=1, black_id=2)
+    interval = 0.02
+    next_at = time.perf_counter()
+    while not stop.is_set():
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        scheduled = next_at
+        if room.board.is_game_over():
+            room = RoomState(game_id=0, white_id=1, black_id=2)
+        room.push_move(rng.choice(list(room.board.legal_moves)))
+        encode({"type": "STATE_SYNC", "state": room.to_payload()})
+        latencies.append(time.perf_counter() - scheduled)
+
+
+async def _measure(workers: int, ai_games: int, seconds: float) -> list[float]:
+    executor = AIExecutor(workers, {"easy": 300, "medium": 1000, "hard": 3000})
+    stop = asyncio.Event()
+    latencies: list[float] = []
+    if workers > 0:
+        # Warm the pool so process start-up is not counted.
+        await asyncio.gather(*(executor.choose_move(-i - 1, chess.Board(), "easy") for i in range(workers)))
+    tasks = [asyncio.create_task(_ai_game(executor, game_id, stop)) for game_id in range(1, ai_games + 1)]
+    tasks.append(asyncio.create_task(_human_game(stop, latencies)))
+    await asyncio.sleep(seconds)
+    stop.set()
+    for game_id in range(1, ai_games + 1):
+        executor.cancel(game_id)
+    await asyncio.gather(*tasks, return_exceptions=True)
+    executor.shutdown()
+    return latencies
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ai-games", type=int, nargs="+", default=[0, 2, 4, 8])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'ai games':>8} {'acks':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for ai_games in args.ai_games:
+        for label, workers in (("thread", 0), ("process", args.workers)):
+            latencies = asyncio.run(_measure(workers, ai_games, args.seconds))
+            print(
+                f"{label:<8} {ai_games:>8} {len(latencies):>6} "
+                f"{statistics.median(latencies) * 1000:>8.2f} {_percentile(latencies, 0.99) * 1000:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
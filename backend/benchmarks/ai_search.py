@@ -0,0 +1,120 @@
+"""
+Search benchmark: nodes per second and time to depth on fixed positions.
+
+Run from the backend directory:
+
+    python -m benchmarks.ai_search --max-depth 4 --time-limit 10
+
+Compares the current ChessAI (iterative deepening, transposition table,
+move ordering, quiescence) with the original fixed-depth minimax engine,
+copied below as LegacyChessAI. Blunders are disabled for both.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import chess
+
+from app.ai_engine import PIECE_VALUES, ChessAI
+
+
+POSITIONS = {
+    "start": chess.STARTING_FEN,
+    "italian": "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "kiwipete": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "middlegame": "r2q1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP2BPPP/R2Q1RK1 w - - 0 10",
+    "endgame": "8/5pk1/6p1/8/3R4/6P1/5PK1/r7 w - - 0 40",
+}
+
+
+class LegacyChessAI:
+    """The engine as it shipped before iterative deepening, with a node counter."""
+
+    def __init__(self, depth: int) -> None:
+        self.depth = depth
+        self.nodes = 0
+
+    def choose_move(self, board: chess.Board) -> chess.Move | None:
+        maximizing = board.turn == chess.WHITE
+        best_score = float("-inf") if maximizing else float("inf")
+        best_move = None
+        for move in list(board.legal_moves):
+            board.push(move)
+            score = self._minimax(board, self.depth - 1, float("-inf"), float("inf"), not maximizing)
+            board.pop()
+            if maximizing and score > best_score or not maximizing and score < best_score:
+                best_score, best_move = score, move
+        return best_move
+
+    def _minimax(self, board, depth, alpha, beta, maximizing):
+        self.nodes += 1
+        if depth == 0 or board.is_game_over(claim_draw=True):
+            return self._evaluate(board)
+        value = float("-inf") if maximizing else float("inf")
+        for move in board.legal_moves:
+            board.push(move)
+            child = self._minimax(board, depth - 1, alpha, beta, not maximizing)
+            board.pop()
+            if maximizing:
+                value = max(value, child)
+                alpha = max(alpha, value)
+            else:
+                value = min(value, child)
+                beta = min(beta, value)
+            if beta <= alpha:
+                break
+        return value
+
+    def _evaluate(self, board):
+        if board.is_checkmate():
+            return -99999 if board.turn == chess.WHITE else 99999
+        if board.is_stalemate() or board.is_insufficient_material() or board.can_claim_draw():
+            return 0
+        score = 0
+        for piece_type, value in PIECE_VALUES.items():
+            score += len(board.pieces(piece_type, chess.WHITE)) * value
+            score -= len(board.pieces(piece_type, chess.BLACK)) * value
+        score += 0.1 * len(list(board.legal_moves)) * (1 if board.turn == chess.WHITE else -1)
+        return score
+
+
+def _legacy_time_to_depth(fen: str, max_depth: int, time_limit: float) -> tuple[list[tuple[int, float]], float]:
+    results, nodes, elapsed_total = [], 0, 0.0
+    for depth in range(1, max_depth + 1):
+        engine = LegacyChessAI(depth)
+        start = time.perf_counter()
+        engine.choose_move(chess.Board(fen))
+        elapsed = time.perf_counter() - start
+        nodes += engine.nodes
+        elapsed_total += elapsed
+        results.append((depth, elapsed))
+        # Fixed-depth search cannot be interrupted; skip a depth that would clearly blow the budget.
+        if elapsed_total + elapsed * 10 >= time_limit:
+            break
+    return results, nodes / elapsed_total
+
+
+def _current_time_to_depth(fen: str, max_depth: int, time_limit: float) -> tuple[list[tuple[int, float]], float]:
+    engine = ChessAI(depth=max_depth, blunder_rate=0.0)
+    start = time.perf_counter()
+    engine.search(chess.Board(fen), time_limit=time_limit)
+    elapsed = time.perf_counter() - start
+    return engine.completed_depths, engine.nodes / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-depth", type=int, default=4)
+    parser.add_argument("--time-limit", type=float, default=10.0, help="per position and engine, in seconds")
+    args = parser.parse_args()
+
+    for name, fen in POSITIONS.items():
+        for label, runner in (("legacy", _legacy_time_to_depth), ("current", _current_time_to_depth)):
+            depths, nps = runner(fen, args.max_depth, args.time_limit)
+            reached = "  ".join(f"d{depth}={elapsed:.2f}s" for depth, elapsed in depths)
+            print(f"{name:<11} {label:<8} {nps:>9.0f} nps  {reached}")
+
+
+if __name__ == "__main__":
+    main()
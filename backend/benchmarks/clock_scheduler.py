@@ -0,0 +1,145 @@
+"""
+Clock driver benchmark: one polling task per room vs the shared ClockScheduler.
+
+Run from the backend directory:
+
+    python -m benchmarks.clock_scheduler --rooms 100 1000 10000 --seconds 5
+
+The legacy mode reproduces the old `_clock_loop` (sleep, SessionLocal(),
+db.get(Game), broadcast) against a throwaway SQLite database; the scheduler
+mode drives the same rooms through `app.clock.ClockScheduler`. Both report
+process CPU seconds per wall second and DB queries per second.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+_TMP_DIR = tempfile.mkdtemp(prefix="clock-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_TMP_DIR}/bench.db")
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_MINUTES", "60")
+
+from sqlalchemy import event  # noqa: E402
+
+from app.clock import ClockScheduler  # noqa: E402
+from app.db import Base, SessionLocal, engine  # noqa: E402
+from app.models import Game  # noqa: E402
+from app.realtime import RealtimeManager  # noqa: E402
+
+
+class _QueryCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *args) -> None:
+        self.count += 1
+
+
+def _seed_games(count: int) -> list[int]:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        games = [Game(mode="1v1:10", status="playing") for _ in range(count)]
+        db.add_all(games)
+        db.commit()
+        return [game.id for game in games]
+    finally:
+        db.close()
+
+
+def _make_manager(game_ids: list[int]) -> RealtimeManager:
+    manager = RealtimeManager()
+    for game_id in game_ids:
+        manager.get_or_create_room(game_id, 1, 2, None)
+    return manager
+
+
+async def _run_legacy(manager: RealtimeManager, game_ids: list[int], seconds: float, sent: list[int]) -> None:
+    async def clock_loop(game_id: int) -> None:
+        while True:
+            await asyncio.sleep(1.0)
+            room = manager.get_room(game_id)
+            db = SessionLocal()
+            try:
+                game = db.get(Game, game_id)
+                if game is None or game.status == "finished":
+                    return
+                room.settle_clock()
+                room.clocks_payload()
+                sent[0] += 1
+            finally:
+                db.close()
+
+    tasks = [asyncio.create_task(clock_loop(game_id)) for game_id in game_ids]
+    await asyncio.sleep(seconds)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _run_scheduler(manager: RealtimeManager, game_ids: list[int], seconds: float, sent: list[int]) -> None:
+    async def on_tick(room) -> None:
+        room.clocks_payload()
+        sent[0] += 1
+
+    async def on_flag(room) -> None:
+        room.finished = True
+
+    scheduler = ClockScheduler(manager.get_room, on_tick=on_tick, on_flag=on_flag)
+    for game_id in game_ids:
+        scheduler.schedule(game_id)
+    await asyncio.sleep(seconds)
+    scheduler._task.cancel()
+
+
+def _measure(mode: str, rooms: int, seconds: float) -> dict:
+    game_ids = _seed_games(rooms)
+    manager = _make_manager(game_ids)
+    counter = _QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    sent = [0]
+    runner = _run_legacy if mode == "legacy" else _run_scheduler
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    asyncio.run(runner(manager, game_ids, seconds, sent))
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    event.remove(engine, "before_cursor_execute", counter)
+
+    return {
+        "mode": mode,
+        "rooms": rooms,
+        "cpu_per_sec": cpu / wall,
+        "queries_per_sec": counter.count / wall,
+        "ticks_per_sec": sent[0] / wall,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--mode", choices=["legacy", "scheduler", "both"], default="both")
+    args = parser.parse_args()
+
+    modes = ["legacy", "scheduler"] if args.mode == "both" else [args.mode]
+    print(f"{'mode':<10} {'rooms':>7} {'cpu/s':>8} {'queries/s':>11} {'ticks/s':>10}")
+    for rooms in args.rooms:
+        for mode in modes:
+            row = _measure(mode, rooms, args.seconds)
+            print(
+                f"{row['mode']:<10} {row['rooms']:>7} {row['cpu_per_sec']:>8.3f} "
+                f"{row['queries_per_sec']:>11.1f} {row['ticks_per_sec']:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
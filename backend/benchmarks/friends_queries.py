@@ -0,0 +1,147 @@
+"""
+Queries per friends-page request: per-relation db.get vs the batched UserLoader.
+
+Run from the backend directory:
+
+    python -m benchmarks.friends_queries --friends 300 --incoming 100 --outgoing 100
+
+Builds a SQLite database (or uses DATABASE_URL) with one player who has
+--friends accepted friendships and the given pending requests, then calls
+list_friends and the incoming/outgoing request endpoints the way FastAPI
+would (one session and one UserLoader per request). The previous
+per-relation loops are replayed for comparison. Reports the statements each
+request sent and its time; the loader keeps every endpoint at two
+statements (relations, then users) whatever the number of relations, and
+the script exits non-zero if that regresses; tests/test_friends_queries.py
+asserts the same bound under pytest.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+_TMP_DIR = tempfile.mkdtemp(prefix="friends-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_TMP_DIR}/bench.db")
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_MINUTES", "60")
+
+from sqlalchemy import event, or_, select  # noqa: E402
+
+from app.db import Base, SessionLocal, engine  # noqa: E402
+from app.models import Friendship, User  # noqa: E402
+from app.routers.friends import _user_search_out, incoming_requests, list_friends, outgoing_requests  # noqa: E402
+from app.user_loader import UserLoader  # noqa: E402
+
+
+EXPECTED_STATEMENTS = 2
+
+
+class _Statements:
+    def __init__(self) -> None:
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args) -> None:
+        self.count += 1
+
+
+def _seed(friends: int, incoming: int, outgoing: int) -> int:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        total = 1 + friends + incoming + outgoing
+        db.add_all(
+            User(email=f"u{index}@bench", username=f"u{index}", password_hash="x", display_name=f"User {index}")
+            for index in range(total)
+        )
+        db.commit()
+        me, *others = [user.id for user in db.scalars(select(User).order_by(User.id))]
+        relations = [Friendship(requester_id=me, addressee_id=user_id, status="accepted") for user_id in others[:friends]]
+        relations += [
+            Friendship(requester_id=user_id, addressee_id=me, status="pending")
+            for user_id in others[friends:friends + incoming]
+        ]
+        relations += [
+            Friendship(requester_id=me, addressee_id=user_id, status="pending")
+            for user_id in others[friends + incoming:]
+        ]
+        db.add_all(relations)
+        db.commit()
+        return me
+
+
+def _legacy_list_friends(db, current_user):
+    relations = db.scalars(
+        select(Friendship).where(
+            or_(Friendship.requester_id == current_user.id, Friendship.addressee_id == current_user.id),
+            Friendship.status == "accepted",
+        )
+    ).all()
+    result = []
+    for relation in relations:
+        friend_id = relation.addressee_id if relation.requester_id == current_user.id else relation.requester_id
+        friend = db.get(User, friend_id)
+        if friend:
+            result.append(_user_search_out(friend))
+    return result
+
+
+def _legacy_requests(column):
+    def endpoint(db, current_user):
+        requests = db.scalars(
+            select(Friendship).where(column == current_user.id, Friendship.status == "pending")
+        ).all()
+        result = []
+        for relation in requests:
+            requester = db.get(User, relation.requester_id)
+            addressee = db.get(User, relation.addressee_id)
+            result.append((requester and _user_search_out(requester), addressee and _user_search_out(addressee)))
+        return result
+
+    return endpoint
+
+
+def _request(statements: _Statements, me: int, endpoint, batched: bool) -> tuple[int, float, int]:
+    with SessionLocal() as db:
+        current_user = db.get(User, me)  # get_current_user, outside the count
+        statements.count = 0
+        started = time.perf_counter()
+        if batched:
+            rows = endpoint(db=db, users=UserLoader(db), current_user=current_user)
+        else:
+            rows = endpoint(db, current_user)
+        return statements.count, time.perf_counter() - started, len(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--friends", type=int, default=300)
+    parser.add_argument("--incoming", type=int, default=100)
+    parser.add_argument("--outgoing", type=int, default=100)
+    args = parser.parse_args()
+
+    me = _seed(args.friends, args.incoming, args.outgoing)
+    statements = _Statements()
+    endpoints = (
+        ("list_friends", _legacy_list_friends, list_friends),
+        ("incoming_requests", _legacy_requests(Friendship.addressee_id), incoming_requests),
+        ("outgoing_requests", _legacy_requests(Friendship.requester_id), outgoing_requests),
+    )
+    print(f"{'endpoint':<18} {'rows':>5} {'per-row stmts':>13} {'ms':>7} {'batched stmts':>13} {'ms':>7}")
+    regressions = []
+    for name, legacy, batched in endpoints:
+        legacy_count, legacy_seconds, rows = _request(statements, me, legacy, batched=False)
+        count, seconds, _ = _request(statements, me, batched, batched=True)
+        print(f"{name:<18} {rows:>5} {legacy_count:>13} {legacy_seconds * 1000:>7.1f} {count:>13} {seconds * 1000:>7.1f}")
+        if count > EXPECTED_STATEMENTS:
+            regressions.append(f"{name} sent {count} statements, expected at most {EXPECTED_STATEMENTS}")
+    if regressions:
+        sys.exit("\n".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
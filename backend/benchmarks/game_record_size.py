@@ -0,0 +1,111 @@
+"""
+Storage footprint and decode time: packed GameRecord rows vs PGN text.
+
+Run from the backend directory:
+
+    python -m benchmarks.game_record_size --games 10000
+
+Each game is a seeded random playout of up to --max-plies plies with a
+made-up clock per ply. The benchmark reports the bytes needed for 10k games
+as packed records (app.game_record, 4 bytes per ply), as bare PGN movetext,
+and as PGN movetext with [%clk] comments (the PGN equivalent of what the
+record holds), plus the time to rebuild a Board with full history from each.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import time
+
+import chess
+import chess.pgn
+
+from app.game_record import decode_record, pack_plies
+
+
+def _random_game(rng: random.Random, max_plies: int) -> tuple[list[chess.Move], list[int]]:
+    board = chess.Board()
+    clocks = [10 * 60 * 1000, 10 * 60 * 1000]
+    moves: list[chess.Move] = []
+    move_clocks: list[int] = []
+    target = rng.randint(max_plies // 3, max_plies)
+    while len(moves) < target and not board.is_game_over():
+        side = 0 if board.turn == chess.WHITE else 1
+        clocks[side] = max(0, clocks[side] - rng.randint(200, 15_000))
+        move = rng.choice(list(board.legal_moves))
+        moves.append(move)
+        move_clocks.append(clocks[side])
+        board.push(move)
+    return moves, move_clocks
+
+
+def _pgn(moves: list[chess.Move], clocks: list[int] | None) -> str:
+    game = chess.pgn.Game()
+    node = game
+    for index, move in enumerate(moves):
+        node = node.add_variation(move)
+        if clocks is not None:
+            node.set_clock(clocks[index] / 1000)
+    exporter = chess.pgn.StringExporter(headers=False, variations=False, comments=clocks is not None)
+    return game.accept(exporter)
+
+
+def _format_bytes(value: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--max-plies", type=int, default=160)
+    parser.add_argument("--decode-sample", type=int, default=1000, help="games used for the decode timing")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    games = [_random_game(rng, args.max_plies) for _ in range(args.games)]
+    plies = sum(len(moves) for moves, _ in games)
+
+    records = [pack_plies(moves, clocks) for moves, clocks in games]
+    movetext = [_pgn(moves, None) for moves, _ in games]
+    movetext_clk = [_pgn(moves, clocks) for moves, clocks in games]
+
+    scale = 10_000 / args.games
+    sizes = {
+        "packed record": sum(len(record) for record in records),
+        "pgn movetext": sum(len(text.encode()) for text in movetext),
+        "pgn + [%clk]": sum(len(text.encode()) for text in movetext_clk),
+    }
+    print(f"{args.games} games, {plies} plies ({plies / args.games:.1f} per game)")
+    print(f"{'format':<15} {'per 10k games':>15} {'bytes/ply':>10}")
+    for name, size in sizes.items():
+        print(f"{name:<15} {_format_bytes(size * scale):>15} {size / plies:>10.2f}")
+
+    sample = range(min(args.decode_sample, args.games))
+    started = time.perf_counter()
+    for index in sample:
+        board, _ = decode_record(None, records[index])
+    record_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for index in sample:
+        game = chess.pgn.read_game(io.StringIO(movetext_clk[index]))
+        board = game.end().board()
+    pgn_seconds = time.perf_counter() - started
+
+    for index in sample:
+        board, _ = decode_record(None, records[index])
+        assert board.move_stack == games[index][0]
+
+    count = len(sample)
+    print(f"decode to Board with history: record {record_seconds / count * 1000:.3f} ms/game, "
+          f"pgn {pgn_seconds / count * 1000:.3f} ms/game")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Leaderboard queries: SQL per request vs the in-memory Leaderboard.
+
+Run from the backend directory:
+
+    python -m benchmarks.leaderboard --users 100000 1000000
+
+Fills a SQLite users table (ratings from N(1200, 200)) and times, per
+request: the previous ORDER BY elo DESC LIMIT 20 without and with the
+users.elo index, and a player's rank as a COUNT(*) of higher ratings; then
+the Leaderboard built from the startup query: load time, top 20 (cached
+body and re-rendered after a change reaches the top), rank, 5 players
+around a player, and one rating update. SQLite in-process is a lower bound
+for the SQL side, which on Postgres adds a round trip per query.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sqlite3
+import time
+
+from app.leaderboard import Leaderboard
+
+
+def _per_op_us(operation, count: int) -> float:
+    started = time.perf_counter()
+    for index in range(count):
+        operation(index)
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def _fill(users: int, rng: random.Random) -> tuple[sqlite3.Connection, list[int]]:
+    db = sqlite3.connect(":memory:")
+    db.execute(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, display_name TEXT, elo INTEGER NOT NULL)"
+    )
+    ratings = [max(100, int(rng.gauss(1200, 200))) for _ in range(users)]
+    db.executemany(
+        "INSERT INTO users VALUES (?, ?, ?, ?)",
+        ((user_id, f"user{user_id}", f"User {user_id}", elo) for user_id, elo in enumerate(ratings, start=1)),
+    )
+    return db, ratings
+
+
+def _run(users: int, ops: int, seed: int) -> list[tuple[str, float]]:
+    rng = random.Random(seed)
+    db, ratings = _fill(users, rng)
+    results = []
+
+    top_sql = "SELECT id, username, display_name, elo FROM users ORDER BY elo DESC LIMIT 20"
+    rank_sql = "SELECT COUNT(*) FROM users WHERE elo > ?"
+    sql_ops = max(5, ops // 100)
+    results.append(("sql top 20, no index", _per_op_us(lambda _: db.execute(top_sql).fetchall(), sql_ops)))
+    results.append(("sql rank, no index", _per_op_us(lambda i: db.execute(rank_sql, (ratings[i],)).fetchone(), sql_ops)))
+    db.execute("CREATE INDEX ix_users_elo ON users (elo)")
+    results.append(("sql top 20, index", _per_op_us(lambda _: db.execute(top_sql).fetchall(), ops)))
+    results.append(("sql rank, index", _per_op_us(lambda i: db.execute(rank_sql, (ratings[i],)).fetchone(), ops)))
+
+    board = Leaderboard()
+    started = time.perf_counter()
+    board.load(db.execute("SELECT id, username, display_name, elo FROM users ORDER BY elo DESC, id"))
+    results.append(("memory load (ms)", (time.perf_counter() - started) * 1e3))
+    results.append(("memory top 20, cached", _per_op_us(lambda _: board.top(20), ops)))
+
+    leader = max(range(users), key=ratings.__getitem__) + 1
+
+    def top_after_change(index: int) -> None:
+        board.set(leader, f"user{leader}", f"User {leader}", 3000 + index % 2)
+        board.top(20)
+
+    results.append(("memory top 20, changed", _per_op_us(top_after_change, ops)))
+    results.append(("memory rank", _per_op_us(lambda i: board.rank(ratings[i % users]), ops)))
+    results.append((
+        "memory around, span 5",
+        _per_op_us(lambda i: board.around(i % users + 1, "me", None, ratings[i % users], 5), ops),
+    ))
+
+    def update(index: int) -> None:
+        user_id = rng.randint(1, users)
+        board.set(user_id, f"user{user_id}", f"User {user_id}", max(100, int(rng.gauss(1200, 200))))
+
+    results.append(("memory rating update", _per_op_us(update, ops)))
+    return results
+
+
+def _main(args: argparse.Namespace) -> None:
+    runs = {users: _run(users, args.ops, args.seed) for users in args.users}
+    names = [name for name, _ in next(iter(runs.values()))]
+    print("us per request (load in ms)")
+    print(f"{'':<24}" + "".join(f"{users:>12}" for users in runs))
+    for row, name in enumerate(names):
+        print(f"{name:<24}" + "".join(f"{runs[users][row][1]:>12.1f}" for users in runs))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    _main(args)
+
+
+if __name__ == "__main__":
+    main()
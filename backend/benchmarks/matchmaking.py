@@ -0,0 +1,259 @@
+"""
+Matchmaking under load: the lock-and-poll queue vs MatchmakingEngine.
+
+Run from the backend directory:
+
+    python -m benchmarks.matchmaking --users 10000 --db-ms 2 --db-pool 30
+
+Lobby: every user joins a 1v1 queue at once (spread over the three time
+controls, all rated alike so Elo windows play no part; see
+benchmarks.matchmaking_elo) and waits until it knows its game. Postgres is a fixed
+per-query latency behind a semaphore the size of the async pool.
+
+    polling  the previous router: one global lock held across the active
+             game query and the game insert (commit + refresh), sync
+             endpoints on a 40 thread pool, waiting clients poll /status
+             every 1.5 s
+    engine   MatchmakingEngine with the ActiveGameCache (cold, so one
+             query per user) and the insert outside any lock; waiting
+             clients hold one long poll on /status?wait=25
+
+Reports the time until every user knows its game, the delay between a
+game being created and its waiting player learning about it, and the
+requests and queries spent. Then, with --depth users sitting in one queue,
+the cost of the status, leave and join operations themselves, which is what
+the two structures do differently once queues get deep.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import deque
+
+_TMP_DIR = tempfile.mkdtemp(prefix="matchmaking-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_TMP_DIR}/bench.db")
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_MINUTES", "60")
+
+from app.matchmaking import TIME_CONTROLS, ActiveGameCache, MatchmakingEngine, _Ticket  # noqa: E402
+from benchmarks.multi_worker import _percentile  # noqa: E402
+
+
+POLL_SECONDS = 1.5
+THREADPOOL = 40
+
+
+def _time_control(user_id: int) -> int:
+    # By pairs of ids, so every queue gets an even number of users and everybody is matched.
+    return TIME_CONTROLS[(user_id - 1) // 2 % len(TIME_CONTROLS)]
+
+
+class _Db:
+    def __init__(self, latency: float, pool: int) -> None:
+        self.latency = latency
+        self.queries = 0
+        self._pool = asyncio.Semaphore(pool)
+        self._next_id = 0
+
+    async def query(self) -> None:
+        async with self._pool:
+            self.queries += 1
+            await asyncio.sleep(self.latency)
+
+    async def scalar(self, statement) -> None:
+        await self.query()
+        return None
+
+    async def insert_game(self) -> int:
+        await self.query()
+        self._next_id += 1
+        return self._next_id
+
+
+class _Report:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.created: dict[int, float] = {}
+        self.notify: list[float] = []
+
+
+async def _polling(users: int, db: _Db) -> _Report:
+    report = _Report()
+    queues = {minutes: deque() for minutes in TIME_CONTROLS}
+    pending: dict[int, int] = {}
+    lock = asyncio.Lock()
+    threads = asyncio.Semaphore(THREADPOOL)
+
+    async def status(user_id: int) -> int | None:
+        async with threads:
+            report.requests += 1
+            async with lock:
+                game_id = pending.pop(user_id, None)
+                if game_id is None:
+                    for queue in queues.values():
+                        if user_id in queue:
+                            list(queue).index(user_id)
+                return game_id
+
+    async def join(user_id: int, minutes: int) -> int | None:
+        async with threads:
+            report.requests += 1
+            async with lock:
+                await db.query()
+                queue = queues[minutes]
+                if queue:
+                    opponent_id = queue.popleft()
+                    game_id = await db.insert_game()
+                    await db.query()
+                    pending[opponent_id] = game_id
+                    report.created[game_id] = time.perf_counter()
+                    return game_id
+                queue.append(user_id)
+                return None
+
+    async def client(user_id: int) -> None:
+        if await join(user_id, _time_control(user_id)) is not None:
+            return
+        while True:
+            await asyncio.sleep(POLL_SECONDS)
+            game_id = await status(user_id)
+            if game_id is not None:
+                report.notify.append(time.perf_counter() - report.created[game_id])
+                return
+
+    await asyncio.gather(*(client(user_id) for user_id in range(1, users + 1)))
+    return report
+
+
+async def _engine(users: int, db: _Db) -> _Report:
+    report = _Report()
+    active = ActiveGameCache()
+
+    async def create_game(white_id: int, black_id: int, minutes: int) -> int:
+        game_id = await db.insert_game()
+        active.set(white_id, game_id)
+        active.set(black_id, game_id)
+        report.created[game_id] = time.perf_counter()
+        return game_id
+
+    engine = MatchmakingEngine(create_game=create_game)
+
+    async def join(user_id: int, minutes: int) -> int | None:
+        report.requests += 1
+        if await active.get(db, user_id) is not None:
+            return None
+        opponent_id = engine.pair(user_id, minutes, 1200)
+        if opponent_id is None:
+            return None
+        return await engine.start_game(user_id, opponent_id, minutes)
+
+    async def client(user_id: int) -> None:
+        if await join(user_id, _time_control(user_id)) is not None:
+            return
+        while True:
+            report.requests += 1
+            status = await engine.wait(user_id, 25.0)
+            if status["status"] == "matched":
+                report.notify.append(time.perf_counter() - report.created[status["game_id"]])
+                return
+
+    await asyncio.gather(*(client(user_id) for user_id in range(1, users + 1)))
+    return report
+
+
+def _per_op_us(operation, count: int) -> float:
+    started = time.perf_counter()
+    for index in range(count):
+        operation(index)
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def _depth(depth: int, ops: int) -> dict[str, tuple[float, float]]:
+    """Microseconds per status / leave+rejoin / join with `depth` users already queued."""
+    legacy = {minutes: deque() for minutes in TIME_CONTROLS}
+    legacy[10].extend(range(1, depth + 1))
+
+    def legacy_status(index: int) -> None:
+        user_id = depth - index % depth
+        for queue in legacy.values():
+            if user_id in queue:
+                list(queue).index(user_id)
+
+    def legacy_leave(index: int) -> None:
+        user_id = 1 + index * 7919 % depth
+        for minutes in legacy:
+            legacy[minutes] = deque(uid for uid in legacy[minutes] if uid != user_id)
+        legacy[10].append(user_id)
+
+    def legacy_join(index: int) -> None:
+        user_id = depth + 1 + index
+        for queue in legacy.values():
+            if user_id in queue:
+                break
+        legacy[5].append(user_id)
+
+    engine = MatchmakingEngine()
+    for user_id in range(1, depth + 1):
+        engine._add(_Ticket(user_id, 10, 1200, user_id, 0.0))
+    engine._seq = depth
+
+    def engine_status(index: int) -> None:
+        engine.status(depth - index % depth)
+
+    def engine_leave(index: int) -> None:
+        user_id = 1 + index * 7919 % depth
+        engine.leave(user_id)
+        engine._seq += 1
+        engine._add(_Ticket(user_id, 10, 1200, engine._seq, 0.0))
+
+    def engine_join(index: int) -> None:
+        engine._seq += 1
+        engine._add(_Ticket(depth + 1 + index, 5, 1200, engine._seq, 0.0))
+
+    return {
+        "status": (_per_op_us(legacy_status, ops), _per_op_us(engine_status, ops)),
+        "leave+rejoin": (_per_op_us(legacy_leave, ops), _per_op_us(engine_leave, ops)),
+        "join": (_per_op_us(legacy_join, ops), _per_op_us(engine_join, ops)),
+    }
+
+
+async def _main(args: argparse.Namespace) -> None:
+    args.users += args.users % 2
+    print(f"{args.users} users, db {args.db_ms} ms per query, pool {args.db_pool}")
+    print(f"{'variant':<8} {'all matched s':>13} {'notify p50 ms':>13} {'notify p99 ms':>13} "
+          f"{'requests':>9} {'queries':>8}")
+    for name, run in (("polling", _polling), ("engine", _engine)):
+        db = _Db(args.db_ms / 1000, args.db_pool)
+        started = time.perf_counter()
+        report = await run(args.users, db)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{name:<8} {elapsed:>13.2f} {_percentile(report.notify, 0.5) * 1000:>13.1f} "
+            f"{_percentile(report.notify, 0.99) * 1000:>13.1f} {report.requests:>9} {db.queries:>8}"
+        )
+
+    print()
+    print(f"queue ops with {args.depth} users queued, us per op")
+    print(f"{'op':<13} {'polling':>9} {'engine':>9}")
+    for op, (legacy, engine) in _depth(args.depth, args.ops).items():
+        print(f"{op:<13} {legacy:>9.1f} {engine:>9.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--db-ms", type=float, default=2.0)
+    parser.add_argument("--db-pool", type=int, default=30)
+    parser.add_argument("--depth", type=int, default=10_000)
+    parser.add_argument("--ops", type=int, default=2_000)
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Elo-window matchmaking simulation: match latency and rating spread.
+
+Run from the backend directory:
+
+    python -m benchmarks.matchmaking_elo --waiting 1000 10000 50000 --seconds 30
+
+One MatchmakingEngine on a simulated clock. Each run starts with --waiting
+players already queued (ratings drawn from N(1500, 350), waits of up to
+30 s so far, spread over the three time controls); every simulated second
+another waiting/30 players join through pair() and match_pass() runs once.
+Matches are written instantly. Reported per run: how long matched players
+had waited (simulated seconds), the Elo difference of each match, how many
+are still queued at the end, and the wall time of match_pass per queued
+player.
+
+Two reference rows per size: "fifo" pairs players in arrival order, as the
+queue did before (no wait beyond the next arrival, but the spread of two
+random players), and "scan" is one pass of the same window rule with a
+linear nearest-rating search instead of the RatingIndex, run only up to
+--scan-max players since it is quadratic.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+_TMP_DIR = tempfile.mkdtemp(prefix="matchmaking-elo-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_TMP_DIR}/bench.db")
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_MINUTES", "60")
+
+from app.matchmaking import TIME_CONTROLS, MatchmakingEngine, _Ticket  # noqa: E402
+from benchmarks.multi_worker import _percentile  # noqa: E402
+
+
+def _rating(rng: random.Random) -> int:
+    return min(3000, max(100, int(rng.gauss(1500, 350))))
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _seed(engine: MatchmakingEngine, clock: _Clock, waiting: int, rng: random.Random) -> int:
+    for user_id in range(1, waiting + 1):
+        engine._seq += 1
+        ticket = _Ticket(user_id, rng.choice(TIME_CONTROLS), _rating(rng), engine._seq, clock.now - rng.uniform(0, 30))
+        engine._add(ticket)
+    return waiting
+
+
+def _simulate(waiting: int, seconds: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    clock = _Clock()
+    engine = MatchmakingEngine(clock=clock)
+    next_id = _seed(engine, clock, waiting, rng) + 1
+    waits: list[float] = []
+    spreads: list[int] = []
+    pass_seconds = 0.0
+    passed_tickets = 0
+
+    def record(user_id: int, opponent_id: int, game_id: int) -> None:
+        for player_id in (user_id, opponent_id):
+            ticket = engine._pairing[player_id]
+            waits.append(clock.now - ticket.queued_at if ticket.seq else 0.0)
+        spreads.append(abs(engine._pairing[user_id].rating - engine._pairing[opponent_id].rating))
+        engine.matched(user_id, opponent_id, game_id)
+        engine._matched.clear()
+
+    for second in range(1, seconds + 1):
+        clock.now = float(second)
+        for _ in range(max(1, waiting // 30)):
+            user_id, next_id = next_id, next_id + 1
+            minutes = rng.choice(TIME_CONTROLS)
+            opponent_id = engine.pair(user_id, minutes, _rating(rng))
+            if opponent_id is not None:
+                record(user_id, opponent_id, next_id)
+
+        passed_tickets += engine.queued_count
+        started = time.perf_counter()
+        pairs = engine.match_pass()
+        pass_seconds += time.perf_counter() - started
+        for user_id, opponent_id, _ in pairs:
+            record(user_id, opponent_id, next_id)
+
+    return {
+        "matched": len(waits),
+        "wait_p50": _percentile(waits, 0.5),
+        "wait_p99": _percentile(waits, 0.99),
+        "spread_mean": sum(spreads) / max(1, len(spreads)),
+        "spread_p99": _percentile(spreads, 0.99),
+        "left": engine.queued_count,
+        "pass_us": pass_seconds / max(1, passed_tickets) * 1e6,
+    }
+
+
+def _fifo(waiting: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    ratings = [_rating(rng) for _ in range(waiting)]
+    spreads = [abs(ratings[index] - ratings[index + 1]) for index in range(0, waiting - 1, 2)]
+    return {"spread_mean": sum(spreads) / len(spreads), "spread_p99": _percentile(spreads, 0.99)}
+
+
+def _scan_pass_us(waiting: int, seed: int) -> float:
+    """One match pass with a linear nearest-rating search, microseconds per queued player."""
+    rng = random.Random(seed)
+    clock = _Clock()
+    engine = MatchmakingEngine(clock=clock)
+    _seed(engine, clock, waiting, rng)
+    queued = engine.queued_count
+    started = time.perf_counter()
+    for queue in engine._queues.values():
+        for ticket in list(queue.values()):
+            if ticket.user_id not in queue:
+                continue
+            best = None
+            for other in queue.values():
+                if other is not ticket and (best is None or abs(other.rating - ticket.rating) < abs(best.rating - ticket.rating)):
+                    best = other
+            if best is not None and abs(best.rating - ticket.rating) <= max(
+                engine.window(ticket, clock.now), engine.window(best, clock.now)
+            ):
+                del queue[ticket.user_id]
+                del queue[best.user_id]
+    return (time.perf_counter() - started) / queued * 1e6
+
+
+def _main(args: argparse.Namespace) -> None:
+    print(f"{args.seconds} simulated seconds, window 50 Elo + 10/s up to 400")
+    print(f"{'waiting':>8} {'variant':<7} {'matched':>8} {'wait p50 s':>10} {'wait p99 s':>10} "
+          f"{'spread avg':>10} {'spread p99':>10} {'left':>7} {'us/player':>9}")
+    for waiting in args.waiting:
+        report = _simulate(waiting, args.seconds, args.seed)
+        print(
+            f"{waiting:>8} {'index':<7} {report['matched']:>8} {report['wait_p50']:>10.1f} {report['wait_p99']:>10.1f} "
+            f"{report['spread_mean']:>10.1f} {report['spread_p99']:>10.0f} {report['left']:>7} {report['pass_us']:>9.2f}"
+        )
+        fifo = _fifo(waiting, args.seed)
+        print(f"{waiting:>8} {'fifo':<7} {'':>8} {'':>10} {'':>10} {fifo['spread_mean']:>10.1f} {fifo['spread_p99']:>10.0f}")
+        if waiting <= args.scan_max:
+            print(f"{waiting:>8} {'scan':<7} {'':>8} {'':>10} {'':>10} {'':>10} {'':>10} {'':>7} "
+                  f"{_scan_pass_us(waiting, args.seed):>9.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--waiting", type=int, nargs="+", default=[1000, 5000, 10_000, 50_000])
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--scan-max", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    _main(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Multi-worker load test: games split across worker processes through the broker.
+
+Run from the backend directory:
+
+    python -m benchmarks.multi_worker --games 2000 --plies 40 --workers 2 4
+
+Starts the RESP stand-in (benchmarks/resp_server.py) and, for each worker
+count, that many processes each running a RealtimeManager and a Cluster on
+a RespBroker. The two players of every game connect to different workers
+and the room lives on its ring owner, so at least one of them is relayed.
+Players are in-memory sockets replaying a seeded playout as fast as the
+room accepts moves. A single in-process worker is run first as the
+baseline.
+
+Reports move throughput, submit-to-confirmation latency, relayed sockets,
+and checks that every player saw every move in playout order.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+
+import chess
+from starlette.websockets import WebSocketDisconnect
+
+from app.broker import InProcessBroker, RespBroker
+from app.cluster import Cluster, relayed_connections
+from app.realtime import PROTOCOL_DELTA, SERVICE_RESTART_CLOSE_CODE, RealtimeManager
+from benchmarks.resp_server import RespServer
+
+
+def _playout(game_id: int, plies: int) -> list[str]:
+    rng = random.Random(game_id)
+    board = chess.Board()
+    moves: list[str] = []
+    while len(moves) < plies and not board.is_game_over():
+        move = rng.choice(list(board.legal_moves))
+        moves.append(move.uci())
+        board.push(move)
+    return moves
+
+
+class _Player:
+    """Client side of one in-memory game socket."""
+
+    def __init__(self, game_id: int, color: int, moves: list[str]) -> None:
+        self.game_id = game_id
+        self.user_id = game_id * 2 + color
+        self.color = color
+        self.moves = moves
+        self.socket = _Socket(self)
+        self.move_count = -1
+        self.submitted_at: float | None = None
+        self.latencies: list[float] = []
+        self.out_of_order = 0
+        self.reconnects = 0
+        self.done = asyncio.Event()
+
+    def reconnect(self) -> None:
+        """Fresh socket after the server closed the last one; the next STATE_SYNC resyncs."""
+        self.socket = _Socket(self)
+        self.move_count = -1
+        self.submitted_at = None
+        self.reconnects += 1
+
+    def _act(self) -> None:
+        if self.move_count >= len(self.moves):
+            self.socket.incoming.put_nowait(None)
+            self.done.set()
+            return
+        if self.move_count % 2 == self.color and self.submitted_at is None:
+            self.submitted_at = time.perf_counter()
+            self.socket.incoming.put_nowait({"type": "MOVE_SUBMIT", "move": self.moves[self.move_count]})
+
+    def on_frame(self, frame: str) -> None:
+        message = json.loads(frame)
+        kind = message.get("type")
+        if kind == "STATE_SYNC":
+            self.move_count = message["state"]["move_count"]
+        elif kind == "MOVE_APPLIED":
+            count = message["move_count"]
+            if count != self.move_count + 1 or message["move"] != self.moves[count - 1]:
+                self.out_of_order += 1
+            self.move_count = count
+            if self.submitted_at is not None and count % 2 != self.color:
+                self.latencies.append(time.perf_counter() - self.submitted_at)
+                self.submitted_at = None
+        else:
+            return
+        self._act()
+
+    def on_close(self) -> None:
+        # Like a browser answering the close handshake: the server's receive loop ends.
+        self.socket.incoming.put_nowait(None)
+
+
+class _Socket:
+    """The WebSocket methods the game handler and Cluster.relay call, backed by a _Player."""
+
+    def __init__(self, player: _Player) -> None:
+        self.player = player
+        self.incoming: asyncio.Queue[dict | None] = asyncio.Queue()
+
+    async def accept(self) -> None:
+        pass
+
+    async def receive_json(self) -> dict:
+        event = await self.incoming.get()
+        if event is None:
+            raise WebSocketDisconnect(code=1000)
+        return event
+
+    async def send_text(self, frame: str) -> None:
+        self.player.on_frame(frame)
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        self.player.on_close()
+
+
+def _make_serve(realtime: RealtimeManager):
+    async def serve(game_id: int, user_id: int, websocket, protocol: int) -> None:
+        """The move path of main._serve_game without the database."""
+        await realtime.connect(game_id, user_id, websocket, protocol)
+        room = realtime.get_or_create_room(game_id, game_id * 2, game_id * 2 + 1, None)
+        try:
+            await realtime.send_personal(websocket, {"type": "STATE_SYNC", "state": room.to_payload()})
+            while True:
+                incoming = await websocket.receive_json()
+                if realtime.get_room(game_id) is not room:
+                    await websocket.close(code=SERVICE_RESTART_CLOSE_CODE)
+                    break
+                turn_user = room.white_id if room.board.turn == chess.WHITE else room.black_id
+                move = chess.Move.from_uci(incoming["move"])
+                if turn_user != user_id or move not in room.board.legal_moves:
+                    await realtime.send_personal(websocket, {"type": "MOVE_REJECTED", "reason": "Illegal move"})
+                    continue
+                room.push_move(move)
+                await realtime.broadcast(
+                    game_id,
+                    {"type": "STATE_SYNC", "state": room.to_payload()},
+                    delta=room.move_delta(),
+                )
+        except WebSocketDisconnect:
+            pass
+        finally:
+            await realtime.disconnect(game_id, user_id, websocket)
+
+    async def room_state(game_id: int) -> dict | None:
+        return realtime.get_or_create_room(game_id, game_id * 2, game_id * 2 + 1, None).to_payload()
+
+    return serve, room_state
+
+
+async def play(cluster: Cluster, serve, player: _Player) -> None:
+    """Connect through the cluster like websocket_game, reconnecting until the playout is done."""
+    while True:
+        owner = await cluster.owner_of(player.game_id)
+        if owner != cluster.worker_id:
+            await cluster.relay(owner, player.game_id, player.user_id, player.socket, PROTOCOL_DELTA)
+        else:
+            await serve(player.game_id, player.user_id, player.socket, PROTOCOL_DELTA)
+        if player.done.is_set():
+            return
+        player.reconnect()
+
+
+async def _worker_main(index: int, workers: int, port: int | None, games: int, plies: int, barrier, results) -> None:
+    realtime = RealtimeManager()
+    serve, room_state = _make_serve(realtime)
+    broker = RespBroker(f"redis://127.0.0.1:{port}") if port else InProcessBroker()
+    cluster = Cluster(broker, realtime, worker_id=f"w{index}")
+    await cluster.start(serve, room_state)
+    await asyncio.to_thread(barrier.wait)
+    # Every worker has heard every other one before the first game is placed on the ring.
+    await asyncio.sleep(0.5)
+
+    players = [
+        _Player(game_id, color, _playout(game_id, plies))
+        for game_id in range(1, games + 1)
+        for color in (0, 1)
+        if (game_id + color) % workers == index
+    ]
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(play(cluster, serve, player)) for player in players]
+    await asyncio.gather(*(player.done.wait() for player in players))
+    elapsed = time.perf_counter() - started
+    relayed = int(relayed_connections.value())
+
+    # Rooms owned here may still serve players of other workers.
+    await asyncio.to_thread(barrier.wait)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await cluster.close()
+    # Let cancelled socket writers unwind before the loop closes.
+    await asyncio.sleep(0.1)
+    results.put(
+        {
+            "elapsed": elapsed,
+            "latencies": [value for player in players for value in player.latencies],
+            "out_of_order": sum(player.out_of_order for player in players),
+            "unfinished": sum(1 for player in players if player.move_count < len(player.moves)),
+            "relayed": relayed,
+        }
+    )
+
+
+def _worker(index: int, workers: int, port: int | None, games: int, plies: int, barrier, results) -> None:
+    asyncio.run(_worker_main(index, workers, port, games, plies, barrier, results))
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def _run(workers: int, port: int | None, games: int, plies: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(index, workers, port, games, plies, barrier, results))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [await asyncio.to_thread(results.get) for _ in processes]
+    for process in processes:
+        await asyncio.to_thread(process.join)
+
+    latencies = [value for report in reports for value in report["latencies"]]
+    return {
+        "elapsed": max(report["elapsed"] for report in reports),
+        "moves": len(latencies),
+        "p50": _percentile(latencies, 0.50),
+        "p99": _percentile(latencies, 0.99),
+        "relayed": sum(report["relayed"] for report in reports),
+        "out_of_order": sum(report["out_of_order"] for report in reports),
+        "unfinished": sum(report["unfinished"] for report in reports),
+    }
+
+
+async def _main(args: argparse.Namespace) -> None:
+    server = RespServer()
+    port = await server.start()
+
+    runs = [("in-process", 1, None)] + [("resp", workers, port) for workers in args.workers]
+    print(f"{args.games} games x {args.plies} plies")
+    print(f"{'broker':<11} {'workers':>7} {'moves/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'relayed':>8} {'bad order':>9}")
+    for name, workers, run_port in runs:
+        report = await _run(workers, run_port, args.games, args.plies)
+        assert report["unfinished"] == 0, report
+        print(
+            f"{name:<11} {workers:>7} {report['moves'] / report['elapsed']:>9.0f} "
+            f"{report['p50'] * 1000:>8.2f} {report['p99'] * 1000:>8.2f} "
+            f"{report['relayed']:>8} {report['out_of_order']:>9}"
+        )
+    await server.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--plies", type=int, default=40)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Reconnect storm: every client of every room rejoins at once.
+
+Run from the backend directory:
+
+    python -m benchmarks.reconnect_storm --rooms 500 5000 --db-ms 2 --db-pool 30
+
+Mirrors the join path of main._serve_game against one RealtimeManager:
+load the game and both players, make the room live (snapshot or
+GameRecord) and join it, then wait for the STATE_SYNC frame. Postgres is
+a fixed per-query latency behind a semaphore the size of the async pool
+(db_pool_size + db_max_overflow). Rooms start out not live, as after a
+worker restart. Variants:
+
+    unlocked  the previous join: each player of a room loads its record
+    global    one lock for every room (what a manager-wide lock around
+              the load would do)
+    sharded   rooms hashed over 256 locks
+    per-room  RealtimeManager.room_lock, one lock per room (current)
+
+Reports the time until the last client is resynced, per-client p50/p99
+and the number of queries.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import time
+
+from app.realtime import PROTOCOL_DELTA, RealtimeManager
+from benchmarks.multi_worker import _percentile
+
+
+class _Db:
+    def __init__(self, latency: float, pool: int) -> None:
+        self.latency = latency
+        self.queries = 0
+        self._pool = asyncio.Semaphore(pool)
+
+    async def get(self) -> None:
+        async with self._pool:
+            self.queries += 1
+            await asyncio.sleep(self.latency)
+
+
+class _Socket:
+    def __init__(self, started: float) -> None:
+        self.started = started
+        self.resynced: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, frame: str) -> None:
+        if not self.resynced.done() and '"STATE_SYNC"' in frame:
+            self.resynced.set_result(time.perf_counter() - self.started)
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        pass
+
+
+def _lock_for(realtime: RealtimeManager, variant: str):
+    if variant == "unlocked":
+        return lambda game_id: contextlib.nullcontext()
+    if variant == "global":
+        lock = asyncio.Lock()
+        return lambda game_id: lock
+    if variant == "sharded":
+        shards = [asyncio.Lock() for _ in range(256)]
+        return lambda game_id: shards[game_id % len(shards)]
+    return realtime.room_lock
+
+
+async def _join(realtime: RealtimeManager, db: _Db, lock_for, game_id: int, user_id: int, started: float) -> float:
+    socket = _Socket(started)
+    await db.get()  # Game
+    await db.get()  # white User
+    await db.get()  # black User
+    async with lock_for(game_id):
+        if realtime.get_room(game_id) is None:
+            await db.get()  # GameRecord
+        room = realtime.get_or_create_room(game_id, game_id * 2, game_id * 2 + 1, None)
+    await realtime.connect(game_id, user_id, socket, PROTOCOL_DELTA)
+    await realtime.send_personal(socket, {"type": "STATE_SYNC", "state": room.to_payload()})
+    return await socket.resynced
+
+
+async def _storm(rooms: int, variant: str, latency: float, pool: int) -> dict:
+    realtime = RealtimeManager()
+    lock_for = _lock_for(realtime, variant)
+    db = _Db(latency, pool)
+    started = time.perf_counter()
+    latencies = await asyncio.gather(
+        *(
+            _join(realtime, db, lock_for, game_id, game_id * 2 + color, started)
+            for game_id in range(1, rooms + 1)
+            for color in (0, 1)
+        )
+    )
+    elapsed = time.perf_counter() - started
+    for connection in list(realtime._connections.values()):
+        realtime.forget(connection)
+    return {
+        "elapsed": elapsed,
+        "p50": _percentile(latencies, 0.5),
+        "p99": _percentile(latencies, 0.99),
+        "queries": db.queries,
+    }
+
+
+async def _main(args: argparse.Namespace) -> None:
+    print(f"db {args.db_ms} ms per query, pool {args.db_pool}")
+    print(f"{'rooms':>6} {'variant':<9} {'all synced ms':>13} {'p50 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for rooms in args.rooms:
+        for variant in ("unlocked", "global", "sharded", "per-room"):
+            report = await _storm(rooms, variant, args.db_ms / 1000, args.db_pool)
+            print(
+                f"{rooms:>6} {variant:<9} {report['elapsed'] * 1000:>13.0f} {report['p50'] * 1000:>8.1f} "
+                f"{report['p99'] * 1000:>8.1f} {report['queries']:>8}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, nargs="+", default=[500, 5000])
+    parser.add_argument("--db-ms", type=float, default=2.0)
+    parser.add_argument("--db-pool", type=int, default=30)
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Minimal Redis-compatible server: the local stand-in for the broker.
+
+Run from the backend directory:
+
+    python -m benchmarks.resp_server --port 6390
+
+Implements only what app.broker.RespBroker sends (PING, AUTH, SELECT,
+PUBLISH, SUBSCRIBE, UNSUBSCRIBE, SET with NX/XX/PX/EX, GET, DEL) with a
+single in-memory keyspace, so the multi-worker benchmark runs without a
+Redis install. BROKER_URL=redis://127.0.0.1:6390 points the app at it.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+
+from app.broker import encode_command
+
+
+def _bulk(value: bytes | None) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class RespServer:
+    def __init__(self) -> None:
+        # key -> (value, expires_at monotonic or None)
+        self._keys: dict[bytes, tuple[bytes, float | None]] = {}
+        self._subscribers: dict[bytes, set[asyncio.StreamWriter]] = defaultdict(set)
+        self._server: asyncio.AbstractServer | None = None
+        self._clients: set[asyncio.StreamWriter] = set()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._client, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._clients):
+            writer.close()
+        # Client handlers see EOF and return instead of being cancelled at loop shutdown.
+        await asyncio.sleep(0.05)
+
+    def _get(self, key: bytes) -> bytes | None:
+        entry = self._keys.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._keys[key]
+            return None
+        return value
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> list[bytes] | None:
+        line = await reader.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def _set(self, args: list[bytes]) -> bytes:
+        key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+        expires_at = None
+        for index, option in enumerate(options):
+            if option == b"PX":
+                expires_at = time.monotonic() + int(options[index + 1]) / 1000
+            elif option == b"EX":
+                expires_at = time.monotonic() + int(options[index + 1])
+        exists = self._get(key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return b"$-1\r\n"
+        self._keys[key] = (value, expires_at)
+        return b"+OK\r\n"
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        channels: set[bytes] = set()
+        self._clients.add(writer)
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                name, args = args[0].upper(), args[1:]
+                if name in {b"PING", b"AUTH", b"SELECT"}:
+                    writer.write(b"+PONG\r\n" if name == b"PING" else b"+OK\r\n")
+                elif name == b"PUBLISH":
+                    receivers = self._subscribers.get(args[0], ())
+                    message = encode_command(b"message", args[0], args[1])
+                    for subscriber in receivers:
+                        if not subscriber.is_closing():
+                            subscriber.write(message)
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif name == b"SUBSCRIBE":
+                    for channel in args:
+                        channels.add(channel)
+                        self._subscribers[channel].add(writer)
+                        writer.write(b"*3\r\n$9\r\nsubscribe\r\n" + _bulk(channel) + b":%d\r\n" % len(channels))
+                elif name == b"UNSUBSCRIBE":
+                    for channel in args:
+                        channels.discard(channel)
+                        self._subscribers[channel].discard(writer)
+                        writer.write(b"*3\r\n$11\r\nunsubscribe\r\n" + _bulk(channel) + b":%d\r\n" % len(channels))
+                elif name == b"SET":
+                    writer.write(self._set(args))
+                elif name == b"GET":
+                    writer.write(_bulk(self._get(args[0])))
+                elif name == b"DEL":
+                    removed = sum(1 for key in args if self._keys.pop(key, None) is not None)
+                    writer.write(b":%d\r\n" % removed)
+                else:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % name)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in channels:
+                self._subscribers[channel].discard(writer)
+            self._clients.discard(writer)
+            writer.close()
+
+
+async def _serve(host: str, port: int) -> None:
+    server = RespServer()
+    port = await server.start(host, port)
+    print(f"listening on {host}:{port}")
+    await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Room ownership across workers: ring balance, state lookups and shutdown handoff.
+
+Run from the backend directory:
+
+    python -m benchmarks.room_handoff --games 600 --plies 40 --workers 3
+
+Runs several Clusters (each with its own RealtimeManager) in one process
+against the RESP stand-in. Games are played through them as in
+benchmarks/multi_worker.py; halfway through, worker w0 shuts down and
+hands its live rooms to their ring successors while its players
+reconnect to the remaining workers. Reports how games spread over the
+ring, the latency of owner state lookups (the /games/{id}/state path),
+the handoff time, and checks that every game finished with exactly its
+playout in order.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from app.broker import RespBroker
+from app.cluster import Cluster, rooms_handed_off
+from app.realtime import PROTOCOL_DELTA, RealtimeManager
+from benchmarks.multi_worker import _make_serve, _percentile, _Player, _playout
+from benchmarks.resp_server import RespServer
+
+
+async def _play(workers: list[Cluster], serves: dict[str, object], stopped: set[str], player: _Player, home: int) -> None:
+    index = home
+    while True:
+        while workers[index].worker_id in stopped:
+            index = (index + 1) % len(workers)
+        cluster = workers[index]
+        owner = await cluster.owner_of(player.game_id)
+        if owner != cluster.worker_id:
+            await cluster.relay(owner, player.game_id, player.user_id, player.socket, PROTOCOL_DELTA)
+        else:
+            await serves[owner](player.game_id, player.user_id, player.socket, PROTOCOL_DELTA)
+        if player.done.is_set():
+            return
+        player.reconnect()
+
+
+async def _main(args: argparse.Namespace) -> None:
+    server = RespServer()
+    port = await server.start()
+
+    managers: list[RealtimeManager] = []
+    workers: list[Cluster] = []
+    serves = {}
+    for index in range(args.workers):
+        realtime = RealtimeManager()
+        serve, room_state = _make_serve(realtime)
+        cluster = Cluster(RespBroker(f"redis://127.0.0.1:{port}"), realtime, worker_id=f"w{index}")
+        await cluster.start(serve, room_state)
+        managers.append(realtime)
+        workers.append(cluster)
+        serves[cluster.worker_id] = serve
+    await asyncio.sleep(0.3)
+
+    spread = Counter(workers[0].ring.node_for(game_id) for game_id in range(1, args.games + 1))
+    print(f"{args.games} games on {args.workers} workers: " + ", ".join(f"{w}={n}" for w, n in sorted(spread.items())))
+
+    stopped: set[str] = set()
+    players = [
+        _Player(game_id, color, _playout(game_id, args.plies))
+        for game_id in range(1, args.games + 1)
+        for color in (0, 1)
+    ]
+    total_moves = sum(len(player.moves) for player in players[::2])
+    tasks = [
+        asyncio.create_task(_play(workers, serves, stopped, player, (player.game_id + player.color) % args.workers))
+        for player in players
+    ]
+
+    while sum(max(player.move_count, 0) for player in players[::2]) < total_moves // 2:
+        await asyncio.sleep(0.01)
+
+    leaving = workers[0]
+    live_before = len([room for room in managers[0].rooms() if managers[0].get_connected_count(room.game_id)])
+    stopped.add(leaving.worker_id)
+    started = time.perf_counter()
+    await leaving.close()
+    handoff_seconds = time.perf_counter() - started
+
+    # Owner state lookups from a worker that does not own the game, while games are running.
+    lookups: list[float] = []
+    for game_id in range(1, min(args.games, 200) + 1):
+        owner = await workers[1].owner_of(game_id)
+        asker = next(cluster for cluster in workers[1:] if cluster.worker_id != owner)
+        started = time.perf_counter()
+        state = await asker.request_state(owner, game_id)
+        lookups.append(time.perf_counter() - started)
+        assert state is not None and state["game_id"] == game_id
+
+    await asyncio.gather(*(player.done.wait() for player in players))
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    playouts = {player.game_id: player.moves for player in players}
+    for game_id, moves in playouts.items():
+        copies = [realtime.get_room(game_id) for realtime in managers[1:]]
+        copies = [room for room in copies if room is not None]
+        finished = [room for room in copies if [move.uci() for move in room.board.move_stack] == moves]
+        assert finished, f"game {game_id} did not finish with its playout"
+
+    print(f"state lookup via owner: p50 {_percentile(lookups, 0.5) * 1000:.2f} ms, "
+          f"p99 {_percentile(lookups, 0.99) * 1000:.2f} ms")
+    print(f"w0 handed off {int(rooms_handed_off.value())} of {live_before} live rooms in {handoff_seconds * 1000:.1f} ms")
+    print(f"reconnects: {sum(player.reconnects for player in players)}, "
+          f"moves out of order: {sum(player.out_of_order for player in players)}")
+
+    for cluster in workers[1:]:
+        await cluster.close()
+    await server.close()
+    leftover = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in leftover:
+        task.cancel()
+    await asyncio.gather(*leftover, return_exceptions=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=600)
+    parser.add_argument("--plies", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
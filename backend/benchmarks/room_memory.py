@@ -0,0 +1,193 @@
+"""
+Bytes per resident room: the previous RoomState layout vs the slotted one.
+
+Run from the backend directory:
+
+    python -m benchmarks.room_memory --rooms 1000 10000 50000 --plies 20
+
+Builds the same rooms twice under tracemalloc: once as the old plain
+dataclass (two disconnect dicts, chat list, a player-info dict per room,
+nested defaultdict/set connection index) and once through RealtimeManager
+(slotted RoomState, interned player info, chat ring buffer, flat
+connection index). Boards, chat lines and Connection objects are built
+before tracing starts since both layouts share them, so the numbers are
+the per-room overhead of the representation itself; the board cost is
+printed alongside. A third of the games are AI games, which all share
+one AI player entry.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import tracemalloc
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import chess
+
+from app.realtime import Connection, RealtimeManager
+
+
+@dataclass
+class _LegacyRoomState:
+    """RoomState as it was laid out before slots, interning and the ring buffer."""
+
+    game_id: int
+    white_id: int | None
+    black_id: int | None
+    white_info: dict | None = None
+    black_info: dict | None = None
+    board: chess.Board = field(default_factory=chess.Board)
+    white_ms: int = 10 * 60 * 1000
+    black_ms: int = 10 * 60 * 1000
+    time_control_minutes: int = 10
+    is_ai: bool = False
+    finished: bool = False
+    chat_messages: list[dict] = field(default_factory=list)
+    draw_offered_by: int | None = None
+    last_clock_ts: datetime = field(default_factory=datetime.utcnow)
+    clock_started: bool = False
+    disconnect_tasks: dict = field(default_factory=dict)
+    disconnect_started_at: dict = field(default_factory=dict)
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    chat_version: int = 0
+    state_seq: int = 0
+    move_clocks: list[int] = field(default_factory=list)
+    recorded_plies: int = 0
+    start_fen: str | None = None
+    last_active: float = 0.0
+    _last_move_san: tuple = (0, None)
+    _position_cache: tuple | None = None
+    _players_cache: tuple | None = None
+
+
+class _Socket:
+    pass
+
+
+def _prepare(count: int, plies: int, manager: RealtimeManager) -> list[dict]:
+    rng = random.Random(count)
+    games = []
+    for game_id in range(1, count + 1):
+        board = chess.Board()
+        for _ in range(plies):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        is_ai = game_id % 3 == 0
+        white_id, black_id = game_id * 2, None if is_ai else game_id * 2 + 1
+        sockets = {user_id: _Socket() for user_id in (white_id, black_id) if user_id is not None}
+        games.append(
+            {
+                "game_id": game_id,
+                "white_id": white_id,
+                "black_id": black_id,
+                "is_ai": is_ai,
+                "board": board,
+                "move_clocks": [600_000] * len(board.move_stack),
+                "chat": [{"user_id": white_id, "message": "gl hf", "at": "2024-01-01T00:00:00Z"}] * rng.randint(0, 6),
+                "connections": [
+                    Connection(manager, game_id, user_id, socket, 2) for user_id, socket in sockets.items()
+                ],
+            }
+        )
+    return games
+
+
+def _player_info(user_id: int | None, is_ai: bool) -> dict:
+    if user_id is None and is_ai:
+        return {"id": None, "username": "ai", "display_name": "AI (Medium)"}
+    return {"id": user_id, "username": f"user{user_id}", "display_name": None}
+
+
+def _build_legacy(games: list[dict]) -> tuple:
+    rooms = {}
+    index = defaultdict(lambda: defaultdict(set))
+    for game in games:
+        room = _LegacyRoomState(
+            game_id=game["game_id"],
+            white_id=game["white_id"],
+            black_id=game["black_id"],
+            white_info=_player_info(game["white_id"], game["is_ai"]),
+            black_info=_player_info(game["black_id"], game["is_ai"]),
+            board=game["board"],
+            is_ai=game["is_ai"],
+            move_clocks=list(game["move_clocks"]),
+        )
+        for message in game["chat"]:
+            room.chat_messages.append(message)
+        for connection in game["connections"]:
+            index[game["game_id"]][connection.user_id].add(connection.websocket)
+        rooms[game["game_id"]] = room
+    return rooms, index
+
+
+def _build_current(games: list[dict], manager: RealtimeManager) -> None:
+    for game in games:
+        room = manager.get_or_create_room(
+            game["game_id"],
+            game["white_id"],
+            game["black_id"],
+            None,
+            white_info=_player_info(game["white_id"], game["is_ai"]),
+            black_info=_player_info(game["black_id"], game["is_ai"]),
+            is_ai=game["is_ai"],
+        )
+        room.board = game["board"]
+        room.move_clocks = list(game["move_clocks"])
+        for message in game["chat"]:
+            room.add_chat_message(message)
+        manager._room_connections[game["game_id"]] = list(game["connections"])
+
+
+def _measure(build) -> tuple[int, object]:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    built = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return total, built
+
+
+def _board_bytes(games: list[dict]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    copies = [game["board"].copy() for game in games]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del copies
+    return size
+
+
+def _main(args: argparse.Namespace) -> None:
+    print(f"{args.plies} plies per board; bytes per room excluding the board")
+    print(f"{'rooms':>7} {'legacy':>8} {'slotted':>8} {'saved':>6} {'board':>7}")
+    for count in args.rooms:
+        manager = RealtimeManager()
+        games = _prepare(count, args.plies, manager)
+        legacy, kept = _measure(lambda: _build_legacy(games))
+        del kept
+        current, _ = _measure(lambda: _build_current(games, manager))
+        board = _board_bytes(games)
+        print(
+            f"{count:>7} {legacy / count:>8.0f} {current / count:>8.0f} "
+            f"{1 - current / legacy:>6.0%} {board / count:>7.0f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1000, 10_000, 50_000])
+    parser.add_argument("--plies", type=int, default=20)
+    args = parser.parse_args()
+    _main(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Payload cost per move over a full game: uncached vs cached RoomState.to_payload.
+
+Run from the backend directory:
+
+    python -m benchmarks.room_payload --games 20 --ticks-per-move 5
+
+Each game is a seeded random playout. For every ply the benchmark mirrors
+what the WebSocket handler does: push the move, build the payload three
+times (pre-AI sync, post-commit sync, STATE_SYNC_REQ) and send a number of
+clock ticks before the next move.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+import chess
+
+from app.realtime import RoomState
+
+
+def _legacy_payload(room: RoomState) -> dict:
+    board = room.board
+    last_move_san = None
+    if board.move_stack:
+        last_move = board.pop()
+        last_move_san = board.san(last_move)
+        board.push(last_move)
+    return {
+        "game_id": room.game_id,
+        "fen": board.fen(),
+        "turn": "w" if board.turn == chess.WHITE else "b",
+        "status": "finished" if room.finished or board.is_game_over(claim_draw=True) else "playing",
+        "last_move": board.peek().uci() if board.move_stack else None,
+        "last_move_san": last_move_san,
+        "move_count": len(board.move_stack),
+        "is_check": board.is_check(),
+        "draw_offered_by": room.draw_offered_by,
+        "legal_moves": [move.uci() for move in board.legal_moves],
+        "players": {
+            "white_id": room.white_id,
+            "black_id": room.black_id,
+            "white": room.white_info,
+            "black": room.black_info,
+        },
+        "clocks": {"white_ms": room.white_ms, "black_ms": room.black_ms},
+        "time_control_minutes": room.time_control_minutes,
+        "is_ai": room.is_ai,
+        "chat_messages": room.chat_history(),
+        "disconnect_grace": None,
+    }
+
+
+def _playout(seed: int, max_plies: int = 200) -> list[chess.Move]:
+    rng = random.Random(seed)
+    board = chess.Board()
+    moves = []
+    while not board.is_game_over(claim_draw=True) and len(moves) < max_plies:
+        move = rng.choice(list(board.legal_moves))
+        board.push(move)
+        moves.append(move)
+    return moves
+
+
+def _run(games: list[list[chess.Move]], ticks_per_move: int, cached: bool) -> tuple[float, int]:
+    plies = 0
+    start = time.perf_counter()
+    for moves in games:
+        room = RoomState(game_id=1, white_id=1, black_id=2)
+        for move in moves:
+            if cached:
+                room.push_move(move)
+                for _ in range(3):
+                    room.to_payload()
+                for _ in range(ticks_per_move):
+                    room.clocks_payload()
+            else:
+                room.board.push(move)
+                for _ in range(3):
+                    _legacy_payload(room)
+                for _ in range(ticks_per_move):
+                    _legacy_payload(room)["clocks"]
+            plies += 1
+    return time.perf_counter() - start, plies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--ticks-per-move", type=int, default=5)
+    args = parser.parse_args()
+
+    games = [_playout(seed) for seed in range(args.games)]
+    for label, cached in (("uncached", False), ("cached", True)):
+        elapsed, plies = _run(games, args.ticks_per_move, cached)
+        print(f"{label:<9} {plies:>6} plies  {elapsed * 1e6 / plies:>9.1f} us/move")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Warm restart from the room snapshot file.
+
+Run from the backend directory:
+
+    python -m benchmarks.room_snapshot --rooms 10000 --plies 40
+
+Builds N rooms with seeded random playouts, a few chat messages and both
+clocks running, writes them with RoomSnapshotStore.snapshot_all (the
+shutdown path), then times a fresh store's load() (startup index) and
+take() for every room (lazy restore as players reconnect). No database is
+involved.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import chess
+
+from app.realtime import RoomState
+from app.room_snapshot import RoomSnapshotStore
+
+
+def _build_rooms(count: int, plies: int, seed: int) -> list[RoomState]:
+    rng = random.Random(seed)
+    rooms: list[RoomState] = []
+    for game_id in range(1, count + 1):
+        room = RoomState(
+            game_id=game_id,
+            white_id=game_id * 2,
+            black_id=game_id * 2 + 1,
+            white_info={"id": game_id * 2, "username": f"user{game_id * 2}", "display_name": "White"},
+            black_info={"id": game_id * 2 + 1, "username": f"user{game_id * 2 + 1}", "display_name": "Black"},
+        )
+        for _ in range(rng.randint(plies // 2, plies)):
+            if room.board.is_game_over():
+                break
+            if room.board.turn == chess.WHITE:
+                room.white_ms -= rng.randint(100, 5000)
+            else:
+                room.black_ms -= rng.randint(100, 5000)
+            room.push_move(rng.choice(list(room.board.legal_moves)))
+        for index in range(rng.randint(0, 5)):
+            room.add_chat_message({"user_id": room.white_id, "message": f"message {index}", "at": "2024-01-01T00:00:00Z"})
+        rooms.append(room)
+    return rooms
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=10000)
+    parser.add_argument("--plies", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rooms = _build_rooms(args.rooms, args.plies, args.seed)
+    path = os.path.join(tempfile.mkdtemp(prefix="room-snapshot-bench-"), "rooms.snap")
+
+    writer = RoomSnapshotStore(path)
+    started = time.perf_counter()
+    writer.snapshot_all(rooms)
+    write_seconds = time.perf_counter() - started
+    size = os.path.getsize(path)
+
+    reader = RoomSnapshotStore(path)
+    started = time.perf_counter()
+    indexed = reader.load()
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    restored = [reader.take(room.game_id) for room in rooms]
+    take_seconds = time.perf_counter() - started
+
+    for original, copy in zip(rooms, restored):
+        assert copy is not None
+        assert copy.board.move_stack == original.board.move_stack
+        assert (copy.white_ms, copy.black_ms) == (original.white_ms, original.black_ms)
+        assert copy.chat_history() == original.chat_history()
+
+    print(f"rooms: {args.rooms}  file: {size / 1024 / 1024:.2f} MiB ({size / args.rooms:.0f} B/room)")
+    print(f"snapshot_all: {write_seconds * 1000:.1f} ms")
+    print(f"load (index {indexed} rooms): {load_seconds * 1000:.1f} ms")
+    print(f"take all rooms: {take_seconds * 1000:.1f} ms ({take_seconds / args.rooms * 1e6:.1f} us/room)")
+    print(f"load + restore all: {(load_seconds + take_seconds) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Room memory soak: many short games through one RealtimeManager with the RoomReaper.
+
+Run from the backend directory:
+
+    python -m benchmarks.room_soak --games 100000 --plies 16
+
+Each game creates its room, connects both players (in-memory sockets),
+plays a seeded random playout with some chat, and then either finishes,
+is abandoned mid-game, or (for a share of games) leaves a disconnect
+grace task running a little longer. Another share of rooms is only ever
+created by a state lookup. The reaper sweeps with short TTLs so the run
+covers many eviction generations. Prints resident rooms and process RSS
+(or, with --trace, the tracemalloc heap, about 5x slower) at checkpoints;
+with eviction both stay flat, without it the heap would grow by the
+reported bytes per room for every game.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import tracemalloc
+
+from app.realtime import PROTOCOL_DELTA, RealtimeManager
+from app.room_lifecycle import RoomReaper, approx_room_bytes, rooms_evicted
+
+
+def _memory_mb(trace: bool) -> float:
+    if trace:
+        return tracemalloc.get_traced_memory()[0] / 1e6
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def _evicted() -> int:
+    return int(sum(rooms_evicted.value(reason=reason) for reason in ("finished", "idle", "capacity")))
+
+
+class _Socket:
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, frame: str) -> None:
+        pass
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        pass
+
+
+async def _game(realtime: RealtimeManager, game_id: int, plies: int, rng: random.Random) -> None:
+    white_id, black_id = game_id * 2, game_id * 2 + 1
+    if rng.random() < 0.1:
+        # GET /games/{id}/state for a game nobody joins.
+        realtime.get_or_create_room(game_id, white_id, black_id, None).to_payload()
+        return
+
+    sockets = {white_id: _Socket(), black_id: _Socket()}
+    for user_id, socket in sockets.items():
+        await realtime.connect(game_id, user_id, socket, PROTOCOL_DELTA)
+    room = realtime.get_or_create_room(
+        game_id,
+        white_id,
+        black_id,
+        None,
+        white_info={"id": white_id, "username": f"user{white_id}", "display_name": None},
+        black_info={"id": black_id, "username": f"user{black_id}", "display_name": None},
+    )
+    abandoned = rng.random() < 0.2
+    for ply in range(plies if not abandoned else plies // 2):
+        moves = list(room.board.legal_moves)
+        if not moves:
+            break
+        room.push_move(rng.choice(moves))
+        await realtime.broadcast(game_id, {"type": "CLOCK_DELTA", "seq": room.state_seq, "clocks": room.clocks_payload()})
+        if ply % 8 == 0:
+            room.add_chat_message({"user_id": white_id, "text": "gg" * 10, "ts": time.time()})
+    room.finished = not abandoned
+    await realtime.broadcast(game_id, {"type": "STATE_SYNC", "state": room.to_payload()})
+
+    for user_id, socket in sockets.items():
+        await realtime.disconnect(game_id, user_id, socket)
+    if rng.random() < 0.05:
+        # A disconnect grace still running holds the room until it ends.
+        room.start_disconnect_grace(white_id, asyncio.create_task(asyncio.sleep(0.2)))
+
+
+async def _main(args: argparse.Namespace) -> None:
+    if args.trace:
+        tracemalloc.start()
+    realtime = RealtimeManager()
+    reaper = RoomReaper(
+        realtime,
+        finished_ttl=args.finished_ttl,
+        idle_ttl=args.idle_ttl,
+        max_rooms=args.max_rooms,
+        interval=args.finished_ttl / 2,
+    )
+    reaper.start()
+    rng = random.Random(1)
+    checkpoint = max(1, args.games // 10)
+    sizes: list[int] = []
+    started = time.perf_counter()
+
+    print(f"{args.games} games x {args.plies} plies, finished ttl {args.finished_ttl}s, "
+          f"idle ttl {args.idle_ttl}s, cap {args.max_rooms} rooms")
+    print(f"{'games':>8} {'resident':>9} {'evicted':>8} {'traced MB' if args.trace else 'RSS MB':>10}")
+    for game_id in range(1, args.games + 1):
+        await _game(realtime, game_id, args.plies, rng)
+        if game_id % 200 == 0:
+            # Let socket writers, grace tasks and the reaper run, as a loaded event loop would.
+            await asyncio.sleep(0)
+        if game_id % checkpoint == 0:
+            room = realtime.get_room(game_id)
+            if room is not None:
+                sizes.append(approx_room_bytes(room))
+            print(f"{game_id:>8} {realtime.room_count:>9} {_evicted():>8} {_memory_mb(args.trace):>10.1f}")
+
+    elapsed = time.perf_counter() - started
+    reaper.close()
+    print("evicted by reason: " + ", ".join(
+        f"{reason}={int(rooms_evicted.value(reason=reason))}" for reason in ("finished", "idle", "capacity")
+    ))
+    per_room = sum(sizes) // max(1, len(sizes))
+    print(f"{args.games / elapsed:.0f} games/s; ~{per_room} bytes per room, "
+          f"so ~{per_room * args.games / 1e6:.0f} MB for {args.games} rooms without eviction")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=100_000)
+    parser.add_argument("--plies", type=int, default=16)
+    parser.add_argument("--finished-ttl", type=float, default=0.5)
+    parser.add_argument("--idle-ttl", type=float, default=2.0)
+    parser.add_argument("--max-rooms", type=int, default=5_000)
+    parser.add_argument("--trace", action="store_true", help="measure the Python heap with tracemalloc")
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Player search: ILIKE '%q%' per request vs the in-memory UserSearchIndex.
+
+Run from the backend directory:
+
+    python -m benchmarks.user_search --users 100000 1000000
+
+Fills a SQLite users table with name-like usernames and display names, then
+times the previous query (LIKE on username or display_name, SQLite's
+case-insensitive ILIKE, ORDER BY username LIMIT 12) against
+UserSearchIndex.search with 50 related ids excluded. Queries mix typing
+prefixes of real usernames (2-6 characters), a display-name surname and
+random three-letter strings. Reports p50/p95/p99 and the slowest query, plus the index
+build time and the resident memory it added. SQLite in-process is a lower
+bound for the SQL side, which on Postgres adds a round trip per query.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import resource
+import sqlite3
+import string
+import time
+
+from app.user_search import UserSearchIndex
+from benchmarks.multi_worker import _percentile
+
+
+FIRST = ["alex", "maria", "juan", "sofia", "carlos", "lucia", "david", "elena", "pablo", "laura",
+         "jorge", "ana", "luis", "carmen", "diego", "paula", "mateo", "sara", "hugo", "julia",
+         "ivan", "marta", "adrian", "irene", "leo", "nora", "bruno", "vega", "dario", "alba"]
+LAST = ["garcia", "lopez", "martin", "sanchez", "perez", "gomez", "ruiz", "diaz", "moreno", "alvarez",
+        "romero", "navarro", "torres", "dominguez", "vazquez", "ramos", "gil", "serrano", "blanco", "molina",
+        "castro", "ortiz", "rubio", "marin", "sanz", "iglesias", "nunez", "medina", "garrido", "cortes"]
+
+
+def _names(users: int, rng: random.Random) -> list[tuple[int, str, str]]:
+    rows = []
+    for user_id in range(1, users + 1):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        style = rng.random()
+        if style < 0.4:
+            username = f"{first}{last}{user_id}"
+        elif style < 0.7:
+            username = f"{first}_{rng.choice(string.ascii_lowercase)}{user_id}"
+        else:
+            username = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 8))) + str(user_id)
+        rows.append((user_id, username, f"{first.title()} {last.title()}"))
+    return rows
+
+
+def _queries(rows: list[tuple[int, str, str]], count: int, rng: random.Random) -> list[str]:
+    queries = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.6:
+            username = rng.choice(rows)[1]
+            queries.append(username[:rng.randint(2, 6)])
+        elif kind < 0.8:
+            queries.append(rng.choice(LAST)[:rng.randint(3, 6)])
+        else:
+            queries.append("".join(rng.choices(string.ascii_lowercase, k=3)))
+    return queries
+
+
+def _rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _latencies_ms(search, queries: list[str]) -> list[float]:
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - started) * 1e3)
+    return latencies
+
+
+def _run(users: int, queries: int, seed: int) -> list[tuple[str, float]]:
+    rng = random.Random(seed)
+    rows = _names(users, rng)
+    workload = _queries(rows, queries, rng)
+    exclude = set(rng.sample(range(1, users + 1), 50))
+    results = []
+
+    before = _rss_mb()
+    index = UserSearchIndex()
+    started = time.perf_counter()
+    index.load(rows)
+    results.append(("index build (s)", time.perf_counter() - started))
+    results.append(("index memory (MB)", _rss_mb() - before))
+    index_latencies = _latencies_ms(lambda query: index.search(query, exclude=exclude), workload)
+
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, display_name TEXT)")
+    db.executemany("INSERT INTO users VALUES (?, ?, ?)", rows)
+    sql = (
+        "SELECT id, username, display_name FROM users WHERE username LIKE ? OR display_name LIKE ? "
+        "ORDER BY username LIMIT 12"
+    )
+
+    def sql_search(query: str) -> None:
+        pattern = f"%{query}%"
+        db.execute(sql, (pattern, pattern)).fetchall()
+
+    sql_latencies = _latencies_ms(sql_search, workload[:max(20, queries // 20)])
+    db.close()
+
+    for name, latencies in (("sql like", sql_latencies), ("index", index_latencies)):
+        for percentile in (50, 95, 99):
+            results.append((f"{name} p{percentile} (ms)", _percentile(latencies, percentile / 100)))
+        results.append((f"{name} max (ms)", max(latencies)))
+    return results
+
+
+def _main(args: argparse.Namespace) -> None:
+    runs = {users: _run(users, args.queries, args.seed) for users in args.users}
+    names = [name for name, _ in next(iter(runs.values()))]
+    print(f"{'':<22}" + "".join(f"{users:>12}" for users in runs))
+    for row, name in enumerate(names):
+        print(f"{name:<22}" + "".join(f"{runs[users][row][1]:>12.2f}" for users in runs))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    _main(args)
+
+
+if __name__ == "__main__":
+    main()
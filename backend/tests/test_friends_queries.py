@@ -0,0 +1,58 @@
+"""Statements per friends-page request stay constant however many relations a player has."""
+import pytest
+from sqlalchemy import select
+
+from app.db import db_query_seconds
+from app.friend_graph import friend_graph
+from app.models import Friendship, User
+from app.routers.friends import incoming_requests, list_friends, outgoing_requests
+from app.user_loader import UserLoader
+
+
+# Relations, then the users they point at.
+EXPECTED_STATEMENTS = 2
+
+
+def _seed(db, friends: int, incoming: int, outgoing: int) -> User:
+    db.add_all(
+        User(email=f"u{index}@test", username=f"u{index}", password_hash="x", display_name=f"User {index}")
+        for index in range(1 + friends + incoming + outgoing)
+    )
+    db.commit()
+    me, *others = db.scalars(select(User).order_by(User.id)).all()
+    relations = [Friendship(requester_id=me.id, addressee_id=user.id, status="accepted") for user in others[:friends]]
+    relations += [
+        Friendship(requester_id=user.id, addressee_id=me.id, status="pending")
+        for user in others[friends:friends + incoming]
+    ]
+    relations += [
+        Friendship(requester_id=me.id, addressee_id=user.id, status="pending")
+        for user in others[friends + incoming:]
+    ]
+    db.add_all(relations)
+    db.commit()
+    # Written around the endpoints, so drop what an earlier test cached for this id.
+    friend_graph.invalidate(me.id)
+    return me
+
+
+def _statements(db, endpoint, me: User) -> tuple[int, int]:
+    """(statements the endpoint sent, rows it returned), counted by db._instrument."""
+    db.refresh(me)  # get_current_user's load, outside the count
+    before = db_query_seconds.count(engine="sync")
+    rows = endpoint(db=db, users=UserLoader(db), current_user=me)
+    return db_query_seconds.count(engine="sync") - before, len(rows)
+
+
+@pytest.mark.parametrize("relations", [3, 60])
+@pytest.mark.parametrize(
+    "endpoint, kind",
+    [(list_friends, "friends"), (incoming_requests, "incoming"), (outgoing_requests, "outgoing")],
+)
+def test_friends_endpoints_use_a_fixed_number_of_statements(db, endpoint, kind, relations):
+    me = _seed(db, friends=relations, incoming=relations, outgoing=relations)
+
+    statements, rows = _statements(db, endpoint, me)
+
+    assert rows == relations
+    assert statements <= EXPECTED_STATEMENTS, f"{kind} sent {statements} statements for {relations} relations"
@@ -2,6 +2,8 @@ import { useEffect } from 'react';
 
 import { getAccessToken, getPresenceSocketUrl } from '../api';
 
+export const PRESENCE_EVENT = 'presence';
+
 export function usePresenceHeartbeat(isAuthed)
 {
 	useEffect(() => {
@@ -30,6 +32,21 @@ export function usePresenceHeartbeat(isAuthed)
 				}, 30000);
 			};
 
+			socket.onmessage = (event) => {
+				let message = null;
+
+				try
+				{
+					message = JSON.parse(event.data);
+				}
+				catch (_err)
+				{
+					return;
+				}
+
+				window.dispatchEvent(new CustomEvent(PRESENCE_EVENT, { detail: message }));
+			};
+
 			socket.onclose = () => {
 				clearInterval(heartbeatId);
 
@@ -55,6 +72,7 @@ export function usePresenceHeartbeat(isAuthed)
 
 			ws.onclose = null;
 			ws.onerror = null;
+			ws.onmessage = null;
 
 			if (ws.readyState === WebSocket.CONNECTING)
 			{
@@ -1,6 +1,7 @@
 import { useEffect, useState } from 'react';
 
 import { getApiErrorMessage } from '../../../api';
+import { PRESENCE_EVENT } from '../../../hooks/usePresenceHeartbeat';
 import { useScopedTimedMessage } from '../../../hooks/useTimedMessage';
 import {
 	acceptFriendRequest,
@@ -287,6 +288,36 @@ export function useFriends()
 		refresh();
 	}, []);
 
+	useEffect(() => {
+		/*
+			handlePresence → Aplica los cambios de conexión que el servidor
+			envía por el socket de presencia, sin volver a pedir /friends.
+
+			event → Evento con el mensaje PRESENCE o PRESENCE_SYNC.
+		*/
+		function handlePresence(event)
+		{
+			const message = event.detail;
+
+			if (message?.type === 'PRESENCE')
+			{
+				setFriends((prev) => prev.map((friend) => (
+					friend.id === message.user_id ? { ...friend, online: message.online } : friend
+				)));
+			}
+			else if (message?.type === 'PRESENCE_SYNC')
+			{
+				const online = new Set(message.online);
+
+				setFriends((prev) => prev.map((friend) => ({ ...friend, online: online.has(friend.id) })));
+			}
+		}
+
+		window.addEventListener(PRESENCE_EVENT, handlePresence);
+
+		return () => window.removeEventListener(PRESENCE_EVENT, handlePresence);
+	}, []);
+
 	return {
 		friends,
 		incomingRequests,
@@ -4,6 +4,9 @@ import { useNavigate } from 'react-router-dom';
 import { api, getAccessToken, getApiErrorMessage, getGameSocketUrl } from '../../../api';
 import { GAME_ROOM_EVENTS } from '../../../gameRoomContract';
 
+const MATCH_WAIT_SECONDS = 25;
+const RETRY_DELAY_MS = 1500;
+
 export function useLobby()
 {
 	const navigate = useNavigate();
@@ -20,11 +23,7 @@ export function useLobby()
 
 	function clearPolling()
 	{
-		if (pollRef.current)
-		{
-			clearInterval(pollRef.current);
-			pollRef.current = null;
-		}
+		pollRef.current = null;
 	}
 
 	async function recoverActiveGame()
@@ -91,27 +90,47 @@ export function useLobby()
 		}
 	}
 
-	async function pollStatus()
+	async function waitForMatch()
 	{
-		try
+		const poll = {};
+		pollRef.current = poll;
+
+		while (pollRef.current === poll)
 		{
-			const response = await api.get('/matchmaking/status');
-			const data = response.data;
+			try
+			{
+				const response = await api.get('/matchmaking/status', {
+					params: { wait: MATCH_WAIT_SECONDS },
+					timeout: (MATCH_WAIT_SECONDS + 10) * 1000
+				});
+				const data = response.data;
 
-			if (data.status === 'matched' && data.game_id)
+				if (pollRef.current !== poll)
+					return;
+
+				if (data.status === 'matched' && data.game_id)
+				{
+					clearPolling();
+					sessionStorage.setItem('active_game_id', String(data.game_id));
+					navigate(`/games/${data.game_id}`);
+					return;
+				}
+
+				setStatus(data.status || 'idle');
+				setPosition(data.position ?? null);
+				if (data.status !== 'waiting')
+				{
+					clearPolling();
+					return;
+				}
+			}
+			catch (err)
 			{
-				clearPolling();
-				sessionStorage.setItem('active_game_id', String(data.game_id));
-				navigate(`/games/${data.game_id}`);
-				return;
+				if (pollRef.current !== poll)
+					return;
+				setError(getApiErrorMessage(err, 'Unable to check queue status'));
+				await new Promise((resolve) => setTimeout(resolve, RETRY_DELAY_MS));
 			}
-
-			setStatus(data.status || 'idle');
-			setPosition(data.position ?? null);
-		}
-		catch (err)
-		{
-			setError(getApiErrorMessage(err, 'Unable to check queue status'));
 		}
 	}
 
@@ -138,7 +157,7 @@ export function useLobby()
 			setStatus(data.status || 'waiting');
 			setPosition(data.position ?? null);
 			clearPolling();
-			pollRef.current = setInterval(pollStatus, 1500);
+			waitForMatch();
 			setActionState('idle');
 		}
 		catch (err)